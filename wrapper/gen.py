@@ -1,4 +1,27 @@
+import textwrap
 
+def is_date(var):
+  return "date" in var and not var == 'updated_by'
+
+def gen_slots(var_list):
+  # Instances store their attributes in slots rather than a per-instance
+  # __dict__, which matters once there are many thousands of entries.
+  # Date properties keep their parsed value in a slot of their own.
+  names = ["'_%s'" % x for x in var_list]
+  names += ["'_parsed_%s'" % x for x in var_list if is_date(x)]
+  names = ', '.join(names)
+  final = "__slots__ = (%s)" % names
+  
+  print '\n'.join(textwrap.wrap(final, 76, subsequent_indent=' ' * 13))
+
+def gen_pickling():
+  # Pickle protocols 0 and 1 can't save slotted instances on their own
+  print '''def __getstate__(self):
+  return _GetSlotState(self)
+
+def __setstate__(self, state):
+  _SetSlotState(self, state)
+'''
 
 def gen_init(var_list):
 
@@ -49,12 +72,16 @@ def %(x)s(self):
   date_format_string = '''
 @property
 def %(x)s(self):
-  return dateutil.parser.parse(self._%(x)s)
+  try:
+    return self._parsed_%(x)s
+  except AttributeError:
+    self._parsed_%(x)s = _ParseDate(self._%(x)s)
+    return self._parsed_%(x)s
 '''
   
   final = ""
   for x in var_list:
-    if "date" in x and not x == 'updated_by':
+    if is_date(x):
       final += date_format_string % {"x": x}
     else:
       final += format_string % {"x": x}
@@ -81,6 +108,8 @@ if __name__ == "__main__":
                'description']
   form_json_vars = ['StartDate', 'LinkEntries', 'EndDate', 'Name', 'Language', 'Url', 'RedirectMessage', 'IsPublic', 'DateCreated', 'LinkFields', 'EntryLimit', 'Hash', 'DateUpdated', 'Email', 'LinkEntriesCount', 'Description']
           
+  # gen_slots(form_vars)
+  # gen_pickling()
   # gen_AsDict(form_vars)
   # gen_NewFromJsonDict('Form', form_vars, form_json_vars)
   # gen_properties(form_vars)
@@ -88,7 +117,9 @@ if __name__ == "__main__":
   report_vars = ['link_entries', 'hash', 'name', 'url', 'is_public', 'date_created', 'link_fields', 'link_widgets', 'date_updated', 'link_entries_count', 'description']
   report_json_vars = ['LinkEntries', 'Hash', 'Name', 'Url', 'IsPublic', 'DateCreated', 'LinkFields', 'LinkWidgets', 'DateUpdated', 'LinkEntriesCount', 'Description']
   
+  # gen_slots(report_vars)
   # gen_init(report_vars)
+  # gen_pickling()
   # gen_AsDict(report_vars)
   # gen_NewFromJsonDict('Report', report_vars, report_json_vars)
   # gen_properties(report_vars)
@@ -96,7 +127,9 @@ if __name__ == "__main__":
   entry_vars = ['entry_id', 'date_created', 'created_by', 'date_updated', 'updated_by', 'status', 'purchase_total', 'ip', 'last_page', 'currency', 'transaction_id', 'complete_submission', 'merchant_type']
   entry_json_vars = ['EntryId', 'DateCreated', 'CreatedBy', 'DateUpdated', 'UpdatedBy', 'Status', 'PurchaseTotal', 'IP', 'LastPage', 'Currency', 'TransactionId', 'CompleteSubmission', 'MerchantType']
   
+  #gen_slots(['fields', 'data'] + entry_vars + ['comments'])
   #gen_init(entry_vars)
+  #gen_pickling()
   #gen_AsDict(entry_vars)
   #gen_NewFromJsonDict('Entry', entry_vars, entry_json_vars)
   #gen_properties(entry_vars)
@@ -104,28 +137,36 @@ if __name__ == "__main__":
 
   user_vars = ['api_key', 'hash', 'is_account_owner', 'image', 'company', 'link_forms', 'create_themes', 'link_reports', 'user', 'create_reports', 'time_zone', 'create_forms', 'admin_access', 'email']
   user_json_vars = ['ApiKey', 'Hash', 'IsAccountOwner', 'Image', 'Company', 'LinkForms', 'CreateThemes', 'LinkReports', 'User', 'CreateReports', 'TimeZone', 'CreateForms', 'AdminAccess', 'Email']
+  # gen_slots(user_vars)
   # gen_init(user_vars)
+  # gen_pickling()
   # gen_AsDict(user_vars)
   # gen_NewFromJsonDict('User', user_vars, user_json_vars)
   # gen_properties(user_vars)
   
   widget_vars = ['type', 'type_desc', 'hash', 'name', 'size']
   widget_json_vars = ['Type', 'TypeDesc', 'Hash', 'Name', 'Size']
+  # gen_slots(['subdomain'] + widget_vars)
   # gen_init(widget_vars)
+  # gen_pickling()
   # gen_properties(widget_vars)
   # gen_AsDict(widget_vars)
   # gen_NewFromJsonDict('Widget', widget_vars, widget_json_vars)
   
   comment_vars = ['commented_by', 'comment_id', 'date_created', 'entry_id', 'text']
   comment_json_vars = ['CommentedBy', 'CommentId', 'DateCreated', 'EntryId', 'Text']
+  # gen_slots(comment_vars)
   # gen_init(comment_vars)
+  # gen_pickling()
   # gen_properties(comment_vars)
   # gen_AsDict(comment_vars)
   # gen_NewFromJsonDict('Comment', comment_vars, comment_json_vars)
   
   field_vars = ['type', 'id', 'title', 'is_required', 'subfields', 'label', 'score', 'choices']
   field_json_vars = ['Type', 'ID', 'Title', 'IsRequired', 'SubFields', 'Label', 'Score', 'Choices']
+  gen_slots(field_vars)
   gen_init(field_vars)
+  gen_pickling()
   gen_properties(field_vars)
   gen_AsDict(field_vars)
   gen_NewFromJsonDict('Field', field_vars, field_json_vars)
\ No newline at end of file
@@ -0,0 +1,141 @@
+'''End-to-end benchmarks of wufoo.Api against the local fake server.
+
+Run from the tests directory with the wrapper on the path:
+
+  PYTHONPATH=..:../.. python bench.py --entries 2000 --latency 0.02
+
+Each benchmark prints the number of operations, the wall time and the
+50th/90th/99th percentile latencies of a single operation.
+'''
+
+import optparse
+import sys
+import time
+
+import wufoo
+import fakewufoo
+
+API_KEY = 'XXXX-XXXX-XXXX-XXXX'
+
+def Timed(histogram, func, *args, **kwargs):
+  start = time.time()
+  try:
+    return func(*args, **kwargs)
+  finally:
+    histogram.Add(time.time() - start)
+
+def Report(name, histogram, elapsed):
+  def ms(seconds):
+    if seconds is None:
+      return '-'
+    return '%.1fms' % (seconds * 1000)
+  print '%-28s %6d ops %8.3fs  p50 %8s  p90 %8s  p99 %8s' % (
+    name, histogram.count, elapsed,
+    ms(histogram.Percentile(50)), ms(histogram.Percentile(90)), ms(histogram.Percentile(99)))
+
+def BenchGetEntries(api, server, options):
+  form_hash = server.forms[0]['Hash']
+  histogram = wufoo.LatencyHistogram()
+  start = time.time()
+  for i in range(options.repeat):
+    Timed(histogram, api.GetEntriesForForm, form_hash, page_size=100)
+  Report('GetEntriesForForm', histogram, time.time() - start)
+
+def BenchPagination(api, server, options):
+  form_hash = server.forms[0]['Hash']
+  for workers in (None, options.workers):
+    histogram = wufoo.LatencyHistogram()
+    start = time.time()
+    entries = Timed(histogram, list, api.IterEntriesForForm(form_hash, workers=workers))
+    assert len(entries) == options.entries
+    Report('IterEntriesForForm x%d' % (workers or 1), histogram, time.time() - start)
+
+def BenchSync(api, server, options):
+  form_hash = server.forms[0]['Hash']
+  store = wufoo.EntryStore()
+
+  histogram = wufoo.LatencyHistogram()
+  start = time.time()
+  Timed(histogram, store.SyncForm, api, form_hash)
+  Report('EntryStore.SyncForm initial', histogram, time.time() - start)
+
+  # Touch a tenth of the entries and add as many again
+  entries = server.entries[form_hash]
+  for entry in entries[::10]:
+    entry['DateUpdated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+  for n in range(len(entries) / 10):
+    entries.append(server.MakeEntry(form_hash, len(entries) + 1))
+
+  histogram = wufoo.LatencyHistogram()
+  start = time.time()
+  Timed(histogram, store.SyncForm, api, form_hash)
+  Report('EntryStore.SyncForm delta', histogram, time.time() - start)
+  assert store.GetEntryCount(form_hash) == len(entries)
+  store.Close()
+
+def BenchPost(api, server, options):
+  form_hash = server.forms[0]['Hash']
+  histogram = wufoo.LatencyHistogram()
+  start = time.time()
+  for i in range(options.repeat):
+    Timed(histogram, api.PostEntry, form_hash, {'Field10': 'bench %d' % i})
+  Report('PostEntry', histogram, time.time() - start)
+
+def BenchBulkPost(api, server, options):
+  form_hash = server.forms[0]['Hash']
+  rows = ({'Field10': 'bulk %d' % i} for i in xrange(options.entries))
+  histogram = wufoo.LatencyHistogram()
+  start = last = time.time()
+  failed = 0
+  for result in api.PostEntries(form_hash, rows, workers=options.workers, retry_delay=0.01):
+    # Rows are posted in parallel, so time the gaps between results
+    now = time.time()
+    histogram.Add(now - last)
+    last = now
+    if not result.ok:
+      failed += 1
+  Report('PostEntries x%d (%d failed)' % (options.workers, failed), histogram, time.time() - start)
+
+BENCHMARKS = [('entries', BenchGetEntries),
+              ('pagination', BenchPagination),
+              ('sync', BenchSync),
+              ('post', BenchPost),
+              ('bulk', BenchBulkPost)]
+
+def main(argv):
+  parser = optparse.OptionParser(usage='%prog [options] [benchmark ...]')
+  parser.add_option('--entries', type='int', default=1000,
+                    help='entries per form [default: %default]')
+  parser.add_option('--fields', type='int', default=8,
+                    help='fields per form [default: %default]')
+  parser.add_option('--latency', type='float', default=0.01,
+                    help='seconds added to every request [default: %default]')
+  parser.add_option('--repeat', type='int', default=50,
+                    help='operations per repeated benchmark [default: %default]')
+  parser.add_option('--workers', type='int', default=4,
+                    help='workers for parallel pagination [default: %default]')
+  parser.add_option('--error-rate', type='float', default=0.0,
+                    help='fraction of requests answered with a 500 [default: %default]')
+  parser.add_option('--throttle-rate', type='float', default=0.0,
+                    help='fraction of requests answered with a 429 [default: %default]')
+  options, names = parser.parse_args(argv)
+  names = names or [name for name, func in BENCHMARKS]
+
+  for name, func in BENCHMARKS:
+    if name not in names:
+      continue
+    server = fakewufoo.FakeWufooServer(forms=1, entries=options.entries,
+                                       fields=options.fields, latency=options.latency,
+                                       error_rate=options.error_rate,
+                                       throttle_rate=options.throttle_rate)
+    server.Start()
+    api = wufoo.Api('fake', API_KEY, base_url=server.url)
+    api.SetRateLimiter(None)
+    try:
+      func(api, server, options)
+    finally:
+      api.GetConnectionPool().Clear()
+      server.Stop()
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
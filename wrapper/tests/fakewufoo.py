@@ -0,0 +1,395 @@
+'''A local stand-in for the Wufoo API, for tests and benchmarks.
+
+Serves synthetic forms, fields, entries, comments and counts over HTTP on
+localhost, with configurable latency, page sizes and error injection.
+Point a wufoo.Api at it with base_url:
+
+  server = FakeWufooServer(entries=1000, latency=0.02)
+  server.Start()
+  w = wufoo.Api('fake', 'XXXX-XXXX-XXXX-XXXX', base_url=server.url)
+  ...
+  server.Stop()
+
+'''
+
+import BaseHTTPServer
+import cgi
+import random
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import urlparse
+
+import simplejson
+
+FIELD_TYPES = ['text', 'number', 'money', 'date', 'checkbox', 'radio', 'email', 'textarea']
+
+class FakeWufoo(object):
+  '''The data and request handling of the fake API, without the HTTP server'''
+
+  def __init__(self, forms=2, entries=250, fields=8, comments=50,
+               latency=0.0, max_page_size=100, error_rate=0.0,
+               throttle_rate=0.0, seed=0):
+    '''
+    Args:
+      forms: Number of forms to generate
+      entries: Number of entries per form
+      fields: Number of fields per form
+      comments: Number of comments per form
+      latency: Seconds every request is delayed by
+      max_page_size: Largest pageSize honoured for entries and comments
+      error_rate: Fraction of requests answered with a 500
+      throttle_rate: Fraction of requests answered with a 429
+      seed: Seed for the generated data and the injected errors
+    '''
+    self.latency = latency
+    self.max_page_size = max_page_size
+    self.error_rate = error_rate
+    self.throttle_rate = throttle_rate
+    self.random = random.Random(seed)
+    self.lock = threading.Lock()
+    self.requests = 0
+    self.failures = []
+
+    self.forms = []
+    self.fields = {}
+    self.entries = {}
+    self.comments = {}
+    for i in range(forms):
+      hash = 'f%05d' % i
+      self.forms.append({'Hash': hash,
+                         'Name': 'Form %d' % i,
+                         'Url': 'form-%d' % i,
+                         'Description': 'A generated form',
+                         'IsPublic': '1',
+                         'Language': 'english',
+                         'StartDate': '2000-01-01 00:00:00',
+                         'EndDate': '2030-01-01 00:00:00',
+                         'EntryLimit': '0',
+                         'DateCreated': '2010-01-01 00:00:00',
+                         'DateUpdated': '2010-01-02 00:00:00'})
+      self.fields[hash] = self.MakeFields(fields)
+      self.entries[hash] = [self.MakeEntry(hash, n) for n in range(1, entries + 1)]
+      self.comments[hash] = [self.MakeComment(n, entries) for n in range(1, comments + 1)]
+    self.reports = [{'Hash': 'r%05d' % i,
+                     'Name': 'Report %d' % i,
+                     'Form': f['Hash'],
+                     'DateCreated': '2010-01-01 00:00:00',
+                     'DateUpdated': '2010-01-02 00:00:00'}
+                    for i, f in enumerate(self.forms)]
+
+  def MakeFields(self, count):
+    fields = [{'ID': 'EntryId', 'Title': 'Entry Id', 'Type': 'text', 'IsRequired': '0'}]
+    for i in range(1, count + 1):
+      type = FIELD_TYPES[(i - 1) % len(FIELD_TYPES)]
+      field = {'ID': 'Field%d' % (i * 10), 'Title': '%s %d' % (type.title(), i),
+               'Type': type, 'IsRequired': '0'}
+      if type == 'checkbox':
+        field['SubFields'] = [{'ID': 'Field%d' % (i * 10 + n), 'Label': 'Option %d' % n}
+                              for n in range(1, 4)]
+      if type == 'radio':
+        field['Choices'] = [{'Label': 'Choice %d' % n, 'Score': n} for n in range(1, 4)]
+      fields.append(field)
+    fields.append({'ID': 'DateCreated', 'Title': 'Date Created', 'Type': 'date', 'IsRequired': '0'})
+    return fields
+
+  def MakeValue(self, field):
+    type = field['Type']
+    if type == 'number':
+      return str(self.random.randint(0, 1000))
+    if type == 'money':
+      return '%.2f' % (self.random.random() * 100)
+    if type == 'date':
+      return '2010%02d%02d' % (self.random.randint(1, 12), self.random.randint(1, 28))
+    if type == 'radio':
+      return self.random.choice(field['Choices'])['Label']
+    if type == 'email':
+      return 'user%d@example.com' % self.random.randint(1, 10000)
+    if type == 'textarea':
+      return ' '.join(self.random.choice(['cheese', 'cheddar', 'brie', 'gouda', 'sharp', 'mild', 'aged'])
+                      for i in range(12))
+    return 'text %d' % self.random.randint(1, 10000)
+
+  def MakeEntry(self, hash, entry_id):
+    created = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(1262304000 + entry_id * 3600))
+    entry = {'EntryId': str(entry_id),
+             'DateCreated': created,
+             'CreatedBy': 'public',
+             'DateUpdated': '',
+             'UpdatedBy': None}
+    for field in self.fields[hash][1:-1]:
+      if 'SubFields' in field:
+        for sub in field['SubFields']:
+          entry[sub['ID']] = self.random.choice(['', sub['Label']])
+      else:
+        entry[field['ID']] = self.MakeValue(field)
+    return entry
+
+  def MakeComment(self, comment_id, entries):
+    return {'CommentId': str(comment_id),
+            'EntryId': str(self.random.randint(1, max(entries, 1))),
+            'CommentedBy': 'admin',
+            'DateCreated': '2010-06-01 12:00:00',
+            'Text': 'Comment %d about the cheese' % comment_id}
+
+  def FailNext(self, code=500, count=1, retry_after=None):
+    '''Answer the next requests with an error status'''
+    self.lock.acquire()
+    try:
+      self.failures.extend([(code, retry_after)] * count)
+    finally:
+      self.lock.release()
+
+  def Handle(self, method, path, query, body):
+    '''Answer a request.
+
+    Returns:
+      A tuple of (status, reason, dict to send as JSON, extra headers)
+    '''
+    self.lock.acquire()
+    try:
+      self.requests += 1
+      failure = None
+      if self.failures:
+        failure = self.failures.pop(0)
+      elif self.error_rate and self.random.random() < self.error_rate:
+        failure = (500, None)
+      elif self.throttle_rate and self.random.random() < self.throttle_rate:
+        failure = (429, 1)
+    finally:
+      self.lock.release()
+
+    if self.latency:
+      time.sleep(self.latency)
+    if failure:
+      code, retry_after = failure
+      headers = {}
+      if retry_after is not None:
+        headers['Retry-After'] = str(retry_after)
+      return code, 'Injected error', {'HTTPCode': code, 'Text': 'Injected error'}, headers
+
+    if path.startswith('/api/v3/'):
+      path = path[len('/api/v3/'):]
+    if path.endswith('.json'):
+      path = path[:-len('.json')]
+    parts = path.strip('/').split('/')
+
+    self.lock.acquire()
+    try:
+      return self.Route(method, parts, query, body)
+    finally:
+      self.lock.release()
+
+  def Route(self, method, parts, query, body):
+    if parts == ['forms']:
+      return 200, 'OK', {'Forms': self.forms}, {}
+    if parts == ['reports']:
+      return 200, 'OK', {'Reports': self.reports}, {}
+    if parts == ['users']:
+      return 200, 'OK', {'Users': [{'User': 'admin', 'Email': 'admin@example.com',
+                                    'Hash': 'u00000', 'IsAccountOwner': '1'}]}, {}
+
+    collection, hash, rest = parts[0], parts[1], parts[2:]
+    if collection == 'reports':
+      report = [r for r in self.reports if r['Hash'] == hash]
+      if not report:
+        if not rest:
+          return 200, 'OK', {'Reports': [None]}, {}
+        return 404, 'Invalid identifier.', {}, {}
+      if not rest:
+        return 200, 'OK', {'Reports': report}, {}
+      if rest == ['widgets']:
+        return 200, 'OK', {'Widgets': [{'Hash': 'w00000', 'Name': 'Chart',
+                                        'Type': 'chart', 'TypeDesc': 'Pie', 'Size': 'large'}]}, {}
+      hash = report[0]['Form']
+    elif collection == 'forms':
+      # Forms can be fetched by their URL name too
+      for form in self.forms:
+        if form['Url'] == hash:
+          hash = form['Hash']
+      if hash not in self.entries:
+        return 404, 'Invalid identifier.', {}, {}
+      if not rest:
+        return 200, 'OK', {'Forms': [f for f in self.forms if f['Hash'] == hash]}, {}
+
+    if rest == ['fields']:
+      return 200, 'OK', {'Fields': self.fields[hash]}, {}
+    if rest == ['entries', 'count']:
+      return 200, 'OK', {'EntryCount': str(len(self.FilterEntries(hash, query)))}, {}
+    if rest == ['entries'] and method == 'POST':
+      return self.PostEntry(hash, body)
+    if rest == ['entries']:
+      entries = self.FilterEntries(hash, query)
+      return 200, 'OK', {'Entries': self.Page(entries, query)}, {}
+    if rest == ['comments', 'count']:
+      return 200, 'OK', {'Count': str(len(self.FilterComments(hash, query)))}, {}
+    if rest == ['comments']:
+      comments = self.FilterComments(hash, query)
+      return 200, 'OK', {'Comments': self.Page(comments, query)}, {}
+    if rest == ['webhooks']:
+      return 200, 'OK', {'WebHookPutResult': {'Hash': 'h00000'}}, {}
+    return 404, 'Not Found', {}, {}
+
+  def Page(self, items, query):
+    start = int(query.get('pageStart', ['0'])[0])
+    size = min(int(query.get('pageSize', ['25'])[0]), self.max_page_size)
+    return items[start:start + size]
+
+  def PostEntry(self, hash, body):
+    values = cgi.parse_qs(body or '')
+    entries = self.entries[hash]
+    if not values:
+      return 200, 'OK', {'Success': 0, 'ErrorText': 'Errors have been highlighted below.',
+                         'FieldErrors': []}, {}
+    entry_id = int(entries[-1]['EntryId']) + 1 if entries else 1
+    entry = {'EntryId': str(entry_id),
+             'DateCreated': time.strftime('%Y-%m-%d %H:%M:%S'),
+             'CreatedBy': 'public',
+             'DateUpdated': ''}
+    for key, value in values.items():
+      entry[key] = value[0]
+    entries.append(entry)
+    return 201, 'Created', {'Success': 1, 'EntryId': entry_id,
+                            'EntryLink': '/api/v3/forms/%s/entries.json?Filter1=EntryId+Is_equal_to+%d' % (hash, entry_id)}, {}
+
+  def FilterComments(self, hash, query):
+    comments = self.comments[hash]
+    if 'entryId' in query:
+      comments = [c for c in comments if c['EntryId'] == query['entryId'][0]]
+    return comments
+
+  def FilterEntries(self, hash, query):
+    entries = ApplyFilters(self.entries[hash], query)
+    sort = query.get('sort', [None])[0]
+    if sort:
+      def key(entry):
+        value = entry.get(sort) or ''
+        try:
+          return (0, float(value), value)
+        except ValueError:
+          return (1, 0, value)
+      entries.sort(key=key, reverse=query.get('sortDirection', ['DESC'])[0] == 'DESC')
+    return entries
+
+def ApplyFilters(entries, query):
+  '''Select the entries matching the Filter and match parameters of a query'''
+  tests = []
+  for name, values in query.items():
+    if name.startswith('Filter'):
+      field, op, value = (values[0].split(' ', 2) + [None])[:3]
+      tests.append((field, op.lower(), value))
+
+  if query.get('match', ['AND'])[0] == 'OR':
+    combine = any
+  else:
+    combine = all
+  return [e for e in entries
+          if not tests or combine([Matches(e.get(f), op, v) for f, op, v in tests])]
+
+def Matches(actual, op, value):
+  '''Evaluate a Wufoo filter operator against one value'''
+  actual = actual or ''
+  if op == 'is_not_null':
+    return actual != ''
+  if op in ('is_less_than', 'is_greater_than'):
+    try:
+      a, v = float(actual), float(value)
+    except ValueError:
+      a, v = actual, value
+    if op == 'is_less_than':
+      return a < v
+    return a > v
+  if op in ('is_before', 'is_after', 'is_on'):
+    if not actual:
+      return False
+    if op == 'is_on':
+      return actual[:10] == value[:10]
+    if op == 'is_before':
+      return actual < value
+    return actual > value
+  actual, value = actual.lower(), (value or '').lower()
+  if op == 'contains':
+    return value in actual
+  if op == 'does_not_contain':
+    return value not in actual
+  if op == 'begins_with':
+    return actual.startswith(value)
+  if op == 'ends_with':
+    return actual.endswith(value)
+  if op == 'is_equal_to':
+    return actual == value
+  if op == 'is_not_equal_to':
+    return actual != value
+  raise ValueError('Unknown operator ' + op)
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  # Send each response in one write rather than a packet per header
+  wbufsize = -1
+
+  def do_GET(self):
+    self.Respond('GET')
+
+  def do_POST(self):
+    self.Respond('POST')
+
+  def do_PUT(self):
+    self.Respond('PUT')
+
+  def Respond(self, method):
+    (scheme, netloc, path, params, query, fragment) = urlparse.urlparse(self.path)
+    body = None
+    length = int(self.headers.getheader('Content-Length') or 0)
+    if length:
+      body = self.rfile.read(length)
+
+    status, reason, data, headers = self.server.wufoo.Handle(method, path, cgi.parse_qs(query), body)
+    payload = simplejson.dumps(data)
+    self.send_response(status, reason)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(payload)))
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def log_message(self, *args):
+    pass
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def handle_error(self, request, client_address):
+    # Clients closing idle kept-alive connections are not errors
+    if not isinstance(sys.exc_info()[1], socket.error):
+      BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+class FakeWufooServer(FakeWufoo):
+  '''FakeWufoo served over HTTP on localhost'''
+
+  def __init__(self, port=0, **kwargs):
+    FakeWufoo.__init__(self, **kwargs)
+    self.server = _Server(('127.0.0.1', port), _Handler)
+    self.server.wufoo = self
+    self.thread = None
+
+  @property
+  def url(self):
+    return 'http://127.0.0.1:%d/api/v3' % self.server.server_address[1]
+
+  def Start(self):
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.setDaemon(True)
+    self.thread.start()
+
+  def Stop(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+if __name__ == '__main__':
+  server = FakeWufooServer(port=8080)
+  print 'Serving a fake Wufoo API at %s' % server.url
+  server.server.serve_forever()
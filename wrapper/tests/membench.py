@@ -0,0 +1,104 @@
+'''Memory used per model instance, with and without __slots__.
+
+Run from the tests directory with the wrapper on the path:
+
+  PYTHONPATH=..:../.. python membench.py --count 10000
+
+Models are built from JSON the way wufoo.Api builds them. The "dict"
+column measures the same classes without their __slots__, with each
+Entry keeping the decoder's own copy of its Field keys. Sizes count
+every object reachable from the instances once, so strings shared
+between instances are only paid for once.
+'''
+
+import optparse
+import sys
+
+import simplejson
+
+import wufoo
+import fakewufoo
+
+def Unslotted(cls):
+  '''A copy of a model class without __slots__'''
+  namespace = dict([(k, v) for k, v in vars(cls).items()
+                    if k not in cls.__slots__ and k != '__slots__'])
+  return type(cls.__name__, (object,), namespace)
+
+def AsUnslotted(obj):
+  copy = Unslotted(type(obj))()
+  for name in type(obj).__slots__:
+    # Caches such as the parsed dates stay unset until first read
+    if hasattr(obj, name):
+      setattr(copy, name, getattr(obj, name))
+  return copy
+
+def DeepSize(objects):
+  '''Bytes used by objects and everything they reference, counted once'''
+  seen = set()
+  size = 0
+  stack = list(objects)
+  while stack:
+    obj = stack.pop()
+    if id(obj) in seen or isinstance(obj, type):
+      continue
+    seen.add(id(obj))
+    size += sys.getsizeof(obj)
+    if isinstance(obj, dict):
+      stack.extend(obj.keys())
+      stack.extend(obj.values())
+    elif isinstance(obj, (list, tuple)):
+      stack.extend(obj)
+    elif hasattr(type(obj), '__slots__'):
+      stack.extend([getattr(obj, name, None) for name in type(obj).__slots__])
+    elif hasattr(obj, '__dict__'):
+      stack.append(obj.__dict__)
+  return size
+
+def Measure(name, models, count):
+  # The dict layout keeps the decoder's keys, one set per instance
+  before = DeepSize([AsUnslotted(x) for x in models(False)]) / count
+  after = DeepSize(models(True)) / count
+  print '%-8s %8d %8d bytes per instance  (%d%%)' % (
+    name, before, after, 100 * after / before)
+
+def main(argv):
+  parser = optparse.OptionParser(usage='%prog [options]')
+  parser.add_option('--count', type='int', default=10000,
+                    help='instances of each model [default: %default]')
+  parser.add_option('--fields', type='int', default=20,
+                    help='fields per form [default: %default]')
+  options, args = parser.parse_args(argv)
+  count = options.count
+
+  fake = fakewufoo.FakeWufoo(forms=1, entries=count, fields=options.fields, comments=count)
+  form_hash = fake.forms[0]['Hash']
+
+  def Decoded(items):
+    # A round trip gives every item its own key strings, as the API does
+    return simplejson.loads(simplejson.dumps(items))
+
+  def Entries(shared):
+    entries = [wufoo.Entry.NewFromJsonDict(x) for x in Decoded(fake.entries[form_hash])]
+    if not shared:
+      for entry, data in zip(entries, Decoded(fake.entries[form_hash])):
+        entry._fields = dict([(k, v) for k, v in data.items() if k.startswith('Field')])
+    return entries
+
+  def Comments(shared):
+    return [wufoo.Comment.NewFromJsonDict(x) for x in Decoded(fake.comments[form_hash])]
+
+  def Fields(shared):
+    return [wufoo.Field.NewFromJsonDict(x) for x in Decoded(fake.fields[form_hash] * (count / len(fake.fields[form_hash])))]
+
+  def Forms(shared):
+    return [wufoo.Form.NewFromJsonDict(x) for x in Decoded(fake.forms * count)]
+
+  print '%-8s %8s %8s' % ('model', 'dict', 'slots')
+  Measure('Entry', Entries, count)
+  Measure('Comment', Comments, count)
+  Measure('Field', Fields, (count / len(fake.fields[form_hash])) * len(fake.fields[form_hash]))
+  Measure('Form', Forms, count)
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -19,7 +19,17 @@ What to test?
 import unittest
 import sys
 import os
+import pickle
+import cgi
+import httplib
+import socket
+import StringIO
+import tempfile
+import threading
+import time
+import urlparse
 import wufoo
+import fakewufoo
 from wufoo import WufooError, Filter
 import urllib2
 import simplejson
@@ -158,6 +168,1418 @@ class wufoo_Filtertests(unittest.TestCase):
     entries = w.GetEntriesForForm('m7x3p9', filters=[f1, f2])    
     self.assertEqual(len(entries), 0)
       
+class FakeResponse(StringIO.StringIO):
+  def __init__(self, body, headers=None):
+    StringIO.StringIO.__init__(self, body)
+    self.headers = headers or {}
+    
+  def info(self):
+    return self
+    
+  def getheader(self, name, default=None):
+    return self.headers.get(name, default)
+
+class PatchedOpener:
+  '''Serves canned responses in place of urllib2.OpenerDirector.open'''
+  
+  def __init__(self, entries=None, forms=None):
+    self.entries = entries or []
+    self.forms = forms or []
+    self.fields = []
+    self.etag = None
+    self.urls = []
+    self.headers = []
+    self.delays = {}
+    self.failing_pages = set()
+    self.throttled = []
+    self.retry_after = None
+    self.count = None
+    self.active = 0
+    self.max_active = 0
+    self.lock = threading.Lock()
+    
+  def install(self):
+    self.original_open = wufoo.urllib2.OpenerDirector.open
+    fake = self
+    def open(opener, url, data=None, *args, **kwargs):
+      return fake.open(url, data, dict(opener.addheaders))
+    wufoo.urllib2.OpenerDirector.open = open
+    
+  def uninstall(self):
+    wufoo.urllib2.OpenerDirector.open = self.original_open
+    
+  def open(self, url, data=None, headers=None):
+    self.lock.acquire()
+    self.active += 1
+    self.max_active = max(self.active, self.max_active)
+    self.lock.release()
+    try:
+      return self.respond(url, data, headers or {})
+    finally:
+      self.lock.acquire()
+      self.active -= 1
+      self.lock.release()
+    
+  def respond(self, url, data, headers):
+    if not isinstance(url, basestring):
+      url = url.get_full_url()
+    self.urls.append(url)
+    self.headers.append(headers)
+    if self.throttled:
+      code = self.throttled.pop(0)
+      raise urllib2.HTTPError(url, code, 'Too Many Requests', 
+                              {'Retry-After': self.retry_after}, None)
+    (scheme, netloc, path, params, query, fragment) = urlparse.urlparse(url)
+    query = cgi.parse_qs(query)
+    if path.endswith('/entries/count.json'):
+      count = self.count
+      if count is None:
+        count = len(self.filter_entries(query))
+      response = {'EntryCount': str(count)}
+    elif path.endswith('/entries.json'):
+      start = int(query.get('pageStart', [0])[0])
+      size = int(query.get('pageSize', [25])[0])
+      time.sleep(self.delays.get(start, 0))
+      if start in self.failing_pages:
+        raise urllib2.URLError('connection reset')
+      entries = self.filter_entries(query)
+      response = {'Entries': entries[start:start + size]}
+    elif path.endswith('/fields.json'):
+      response = {'Fields': self.fields}
+    elif '/forms/' in path:
+      response = {'Forms': [f for f in self.forms if f['Hash'] in path]}
+    elif path.endswith('/forms.json'):
+      if self.etag and headers.get('If-None-Match') == self.etag:
+        raise urllib2.HTTPError(url, 304, 'Not Modified', {}, None)
+      response = {'Forms': self.forms}
+    else:
+      response = {}
+    return FakeResponse(simplejson.dumps(response), {'ETag': self.etag})
+
+  def filter_entries(self, query):
+    entries = fakewufoo.ApplyFilters(self.entries, query)
+    if 'sort' in query:
+      entries.sort(key=lambda e: int(e[query['sort'][0]]),
+                   reverse=query.get('sortDirection') == ['DESC'])
+    return entries
+
+def make_entries(count):
+  return [{'EntryId': str(i), 'Field1': 'value %d' % i, 
+           'DateCreated': '2010-06-%02d 10:00:00' % (i % 28 + 1)}
+          for i in range(1, count + 1)]
+
+class wufoo_Paginationtests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(25))
+    self.fake.install()
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def test1(self):
+    w = wufoo.Api(my_subdomain, my_api_key)
+    f1 = Filter('EntryId', 'is_greater_than', 0)
+    entries = w.IterEntriesForForm('m7x3p9', filters=[f1], sort_id='EntryId', sort_direction='ASC', page_size=10)
+    
+    # Nothing is fetched until the iteration starts
+    self.assertEqual(len(self.fake.urls), 0)
+    self.assertEqual(entries.next().entry_id, '1')
+    self.assertEqual(len(self.fake.urls), 1)
+    
+    self.assertEqual([e.entry_id for e in entries], 
+                     [str(i) for i in range(2, 26)])
+    self.assertEqual(len(self.fake.urls), 3)
+    
+    # Filters and sorting are kept on every page
+    for url in self.fake.urls:
+      self.assertTrue('Filter0=EntryId+Is_greater_than+0' in url)
+      self.assertTrue('sort=EntryId' in url)
+      
+  def test2(self):
+    # A last page that is exactly full needs one more (empty) request
+    w = wufoo.Api(my_subdomain, my_api_key)
+    entries = list(w.IterEntriesForReport('r9x5r6', page_size=5))
+    self.assertEqual(len(entries), 25)
+    self.assertEqual(len(self.fake.urls), 6)
+
+  def test3(self):
+    # Parallel pages still come back in the server's order
+    self.fake.delays[0] = 0.05
+    w = wufoo.Api(my_subdomain, my_api_key)
+    entries = list(w.IterEntriesForForm('m7x3p9', page_size=10, workers=3))
+    
+    self.assertEqual([e.entry_id for e in entries], 
+                     [str(i) for i in range(1, 26)])
+    self.assertTrue(self.fake.urls[0].endswith('/entries/count.json'))
+    self.assertEqual(len(self.fake.urls), 4)
+    
+  def test4(self):
+    # Entries added after the count are still walked
+    self.fake.count = 15
+    w = wufoo.Api(my_subdomain, my_api_key)
+    entries = list(w.IterEntriesForForm('m7x3p9', page_size=10, workers=3))
+    self.assertEqual(len(entries), 25)
+    self.assertEqual(len(self.fake.urls), 4)
+    
+  def test5(self):
+    # Filtered form entries are counted with the same filters and paged
+    # in parallel; report counts ignore filters, so those are walked
+    # serially
+    w = wufoo.Api(my_subdomain, my_api_key)
+    f1 = Filter('EntryId', 'is_greater_than', 6)
+    entries = list(w.IterEntriesForForm('m7x3p9', filters=[f1], page_size=10, workers=3))
+    self.assertEqual(len(entries), 19)
+    self.assertTrue('Filter0=EntryId+Is_greater_than+6' in self.fake.urls[0])
+    self.assertTrue('/entries/count.json' in self.fake.urls[0])
+    self.assertEqual(len(self.fake.urls), 3)
+    
+    del self.fake.urls[:]
+    entries = list(w.IterEntriesForReport('r9x5r6', filters=[f1], page_size=10, workers=3))
+    self.assertEqual(len(entries), 19)
+    self.assertFalse([url for url in self.fake.urls if 'count.json' in url])
+
+class wufoo_AsyncApitests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(25))
+    self.fake.install()
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def test1(self):
+    w = wufoo.AsyncApi(my_subdomain, my_api_key)
+    count = w.GetFormEntryCount('m7x3p9')
+    entries = w.GetEntriesForForm('m7x3p9', page_size=5)
+    
+    self.assertEqual(count.Result(), 25)
+    self.assertEqual([e.entry_id for e in entries.Result()], 
+                     ['1', '2', '3', '4', '5'])
+    self.assertTrue(entries.Done())
+    
+    done = []
+    entries.AddDoneCallback(done.append)
+    self.assertEqual(done, [entries])
+    w.Close()
+    
+  def test2(self):
+    # No more than max_concurrency requests are in flight
+    self.fake.delays[0] = 0.02
+    w = wufoo.AsyncApi(my_subdomain, my_api_key, max_concurrency=2)
+    futures = [w.GetEntriesForForm('m7x3p9') for i in range(6)]
+    for f in futures:
+      f.Result()
+    self.assertEqual(self.fake.max_active, 2)
+    w.Close()
+    
+  def test3(self):
+    # Errors are raised from Result
+    w = wufoo.AsyncApi(my_subdomain, my_api_key)
+    self.assertRaises(KeyError, w.GetUsers().Result)
+    w.Close()
+
+  def test4(self):
+    # A slow call holds up its result, but not the calls behind it
+    finished = []
+    def call(n):
+      if n == 0:
+        time.sleep(0.1)
+      finished.append(n)
+      return n
+    results = wufoo._MapInOrder(call, range(12), 2, window=8)
+    self.assertEqual(results.next(), 0)
+    self.assertTrue(len(finished) >= 7)
+    self.assertEqual(list(results), range(1, 12))
+
+class wufoo_SharedApitests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(30))
+    self.fake.install()
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def test1(self):
+    # One Api hammered by many threads while its settings change
+    w = wufoo.Api(my_subdomain, 'AAAA-AAAA')
+    w.SetCache(wufoo.ResponseCache())
+    w.SetCacheTimeout('forms/{hash}/entries/count', 60)
+    w.SetUserAgent('agent')
+    keys = ['AAAA-AAAA', 'BBBB-BBBB']
+    valid = ['Basic ' + 'AAAA-AAAA:foo'.encode('base64').strip(), 
+             'Basic ' + 'BBBB-BBBB:foo'.encode('base64').strip()]
+    errors = []
+    done = threading.Event()
+    
+    def worker(n):
+      try:
+        for i in range(40):
+          start = (n + i) % 3 * 10
+          entries = w.GetEntriesForForm('m7x3p9', page_start=start, page_size=10)
+          self.assertEqual([e.entry_id for e in entries], 
+                           [str(x) for x in range(start + 1, start + 11)])
+          self.assertEqual(w.GetFormEntryCount('m7x3p9'), 30)
+      except Exception, e:
+        errors.append(e)
+        
+    def meddler():
+      i = 0
+      while not done.isSet():
+        w.SetCredentials(keys[i % 2])
+        w.SetUserAgent('agent %d' % i)
+        i += 1
+        
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    other = threading.Thread(target=meddler)
+    other.start()
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    done.set()
+    other.join()
+    
+    self.assertEqual(errors, [])
+    self.assertTrue(len(self.fake.headers) >= 320)
+    for headers in self.fake.headers:
+      self.assertTrue(headers['Authorization'] in valid)
+      self.assertTrue(headers['User-Agent'].startswith('agent'))
+    # The shared headers never carry per-request state
+    self.assertFalse('Authorization' in w._request_headers)
+    
+  def test2(self):
+    # The header is built once per key, and cleared with it
+    w = wufoo.Api(my_subdomain, 'A' * 60)
+    w.GetFormEntryCount('m7x3p9')
+    self.assertEqual(self.fake.headers[-1]['Authorization'], 
+                     'Basic ' + ('A' * 60 + ':foo').encode('base64').replace('\n', ''))
+    w.ClearCredentials()
+    w.GetFormEntryCount('m7x3p9')
+    self.assertFalse('Authorization' in self.fake.headers[-1])
+
+class wufoo_Coalescingtests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(forms=[{'Hash': 'm7x3p9', 'Name': 'Cheese'}])
+    self.fake.fields = [{'ID': 'Field1', 'Title': 'Name', 'Type': 'text'}]
+    self.fake.install()
+    # Keep every request in flight long enough for the others to arrive
+    respond = self.fake.respond
+    def slow_respond(url, data, headers):
+      time.sleep(0.05)
+      return respond(url, data, headers)
+    self.fake.respond = slow_respond
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def run_together(self, *calls):
+    results = [None] * len(calls)
+    def run(i, func, args):
+      try:
+        results[i] = func(*args)
+      except Exception, e:
+        results[i] = e
+    threads = [threading.Thread(target=run, args=(i, call[0], call[1:]))
+               for i, call in enumerate(calls)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    return results
+    
+  def test1(self):
+    # Identical calls share one request, but each builds its own models
+    w = wufoo.Api(my_subdomain, my_api_key)
+    stats = []
+    w.AddRequestHook(stats.append)
+    results = self.run_together(*([(w.GetFieldsForForm, 'm7x3p9')] * 5 + 
+                                  [(w.GetForm, 'm7x3p9')] * 3))
+    self.assertEqual(len(self.fake.urls), 2)
+    self.assertEqual(len(stats), 2)
+    self.assertEqual([[f.id for f in x] for x in results[:5]], [['Field1']] * 5)
+    self.assertFalse(results[0][0] is results[1][0])
+    self.assertEqual([x.name for x in results[5:]], ['Cheese'] * 3)
+    
+    # Later calls send a request of their own
+    w.GetForm('m7x3p9')
+    self.assertEqual(len(self.fake.urls), 3)
+    
+  def test2(self):
+    # Errors are shared too
+    w = wufoo.Api(my_subdomain, my_api_key)
+    self.fake.throttled = [429]
+    results = self.run_together((w.GetFormEntryCount, 'm7x3p9'), 
+                                (w.GetFormEntryCount, 'm7x3p9'))
+    self.assertEqual(len(self.fake.urls), 1)
+    self.assertTrue(isinstance(results[0], urllib2.HTTPError))
+    self.assertTrue(results[0] is results[1])
+    
+  def test3(self):
+    w = wufoo.Api(my_subdomain, my_api_key, coalesce=False)
+    self.run_together(*[(w.GetFieldsForForm, 'm7x3p9')] * 4)
+    self.assertEqual(len(self.fake.urls), 4)
+
+class wufoo_Cachetests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(5), forms=[{'Hash': 'm7x3p9'}])
+    self.fake.install()
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def test1(self):
+    cache = wufoo.ResponseCache()
+    w = wufoo.Api(my_subdomain, my_api_key, cache=cache)
+    self.assertEqual(w.GetForms()[0].hash, 'm7x3p9')
+    self.assertEqual(w.GetForms()[0].hash, 'm7x3p9')
+    self.assertEqual(len(self.fake.urls), 1)
+    
+    # Entries aren't cached by default
+    w.GetEntriesForForm('m7x3p9')
+    w.GetEntriesForForm('m7x3p9')
+    self.assertEqual(len(self.fake.urls), 3)
+    
+    # Responses are only shared with the same API key
+    other = wufoo.Api(my_subdomain, 'YYYY-YYYY-YYYY-YYYY', cache=cache)
+    other.GetForms()
+    self.assertEqual(len(self.fake.urls), 4)
+    
+  def test2(self):
+    # Expired responses are revalidated with their ETag
+    self.fake.etag = '"v1"'
+    w = wufoo.Api(my_subdomain, my_api_key, cache=wufoo.ResponseCache())
+    w.SetCacheTimeout('forms', -1)
+    w.GetForms()
+    self.fake.forms = []
+    self.assertEqual(len(w.GetForms()), 1)
+    self.assertEqual(self.fake.headers[1]['If-None-Match'], '"v1"')
+    
+    self.fake.etag = '"v2"'
+    self.assertEqual(len(w.GetForms()), 0)
+    
+  def test3(self):
+    # The least recently used responses are evicted first
+    cache = wufoo.ResponseCache(max_bytes=10)
+    cache.Set('a', wufoo.CachedResponse('1234'))
+    cache.Set('b', wufoo.CachedResponse('1234'))
+    cache.Get('a')
+    cache.Set('c', wufoo.CachedResponse('1234'))
+    self.assertEqual(cache.Get('b'), None)
+    self.assertEqual(cache.Get('a').body, '1234')
+    self.assertEqual(cache.size, 8)
+    
+    cache.Set('d', wufoo.CachedResponse('12345678901'))
+    self.assertEqual(cache.Get('d'), None)
+
+  def wait_for_revalidation(self, api):
+    for i in range(100):
+      if not api._revalidating:
+        return
+      time.sleep(0.01)
+    
+  def test4(self):
+    # Expired responses are served while they are revalidated
+    self.fake.etag = '"v1"'
+    w = wufoo.Api(my_subdomain, my_api_key, cache=wufoo.ResponseCache())
+    w.SetCacheTimeout('forms', -1)
+    w.SetStaleWhileRevalidate(60)
+    stats = []
+    w.AddRequestHook(stats.append)
+    w.GetForms()
+    self.fake.etag = '"v2"'
+    self.fake.forms = []
+    
+    self.assertEqual(len(w.GetForms()), 1)
+    self.assertTrue(stats[-1].stale)
+    self.wait_for_revalidation(w)
+    self.assertEqual(self.fake.headers[1]['If-None-Match'], '"v1"')
+    self.assertEqual(len(w.GetForms()), 0)
+    self.wait_for_revalidation(w)
+    
+    # Entries are never served stale
+    w.SetCacheTimeout('forms/{hash}/entries', -1)
+    w.GetEntriesForForm('m7x3p9')
+    w.GetEntriesForForm('m7x3p9')
+    self.assertFalse(stats[-1].stale)
+    
+  def test5(self):
+    # Past the bound, the call waits for the revalidation
+    w = wufoo.Api(my_subdomain, my_api_key, cache=wufoo.ResponseCache())
+    w.SetCacheTimeout('forms', -100)
+    w.SetStaleWhileRevalidate(60)
+    w.GetForms()
+    self.fake.forms = []
+    self.assertEqual(len(w.GetForms()), 0)
+    self.assertEqual(len(self.fake.urls), 2)
+
+  def test6(self):
+    # Only the most recently used invalid identifiers are kept
+    negative = wufoo.NegativeCache(max_items=2)
+    negative.Add('a')
+    negative.Add('b')
+    self.assertTrue(negative.Contains('a'))
+    negative.Add('c')
+    self.assertEqual([negative.Contains(x) for x in 'abc'], [True, False, True])
+    negative.Remove('a')
+    self.assertFalse(negative.Contains('a'))
+
+class wufoo_EntrySynctests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(5))
+    self.fake.install()
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def test1(self):
+    w = wufoo.Api(my_subdomain, my_api_key)
+    sync = wufoo.EntrySync(w)
+    self.assertEqual(len(list(sync.SyncForm('m7x3p9'))), 5)
+    self.assertEqual(sync.GetCheckpoints().Get('m7x3p9'), (5, None))
+    
+    # Nothing changed
+    self.assertEqual(list(sync.SyncForm('m7x3p9')), [])
+    self.assertTrue('Filter0=EntryId+Is_greater_than+5' in self.fake.urls[-1])
+    
+    # A new entry and an updated one
+    self.fake.entries.append({'EntryId': '6'})
+    self.fake.entries[1]['DateUpdated'] = '2010-07-01 12:00:00'
+    self.assertEqual([e.entry_id for e in sync.SyncForm('m7x3p9')], ['2', '6'])
+    self.assertEqual(sync.GetCheckpoints().Get('m7x3p9'), 
+                     (6, '2010-07-01 12:00:00'))
+    
+    self.assertEqual(sync.CountChanges('m7x3p9'), 0)
+    self.assertEqual(list(sync.SyncForm('m7x3p9')), [])
+    
+    # Entries already handed out at the mark second aren't again
+    self.fake.entries[3]['DateUpdated'] = '2010-07-02 12:00:00'
+    self.assertEqual([e.entry_id for e in sync.SyncForm('m7x3p9')], ['4'])
+    
+    # But one updated later in that second isn't missed
+    self.fake.entries[2]['DateUpdated'] = '2010-07-02 12:00:00'
+    self.assertEqual(sync.CountChanges('m7x3p9'), 1)
+    self.assertEqual([e.entry_id for e in sync.SyncForm('m7x3p9')], ['3'])
+    self.assertTrue('Filter1=DateUpdated+Is_after+2010-07-02+11%3A59%3A59' in self.fake.urls[-1])
+    self.assertEqual(sync.CountChanges('m7x3p9'), 0)
+    
+    # Checkpoints without GetUpdatedAtMark are kept on the EntrySync
+    class Marks(object):
+      def __init__(self, marks):
+        self.marks = marks
+      def Get(self, form_hash):
+        return self.marks.get(form_hash, (None, None))
+      def Set(self, form_hash, entry_id, date_updated):
+        self.marks[form_hash] = (entry_id, date_updated)
+    sync = wufoo.EntrySync(w, checkpoints=Marks({}))
+    self.assertEqual(len(list(sync.SyncForm('m7x3p9'))), 6)
+    self.assertEqual(sync.CountChanges('m7x3p9'), 0)
+    
+  def test2(self):
+    # A sync stopped half way resumes after the last entry consumed
+    w = wufoo.Api(my_subdomain, my_api_key)
+    sync = wufoo.EntrySync(w)
+    entries = sync.SyncForm('m7x3p9', page_size=2)
+    entries.next()
+    entries.next()
+    entries.next()
+    self.assertEqual(sync.GetCheckpoints().Get('m7x3p9'), (2, None))
+    self.assertEqual([e.entry_id for e in sync.SyncForm('m7x3p9')], 
+                     ['3', '4', '5'])
+
+class wufoo_EntryStoretests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(5), forms=[{'Hash': 'm7x3p9', 'Name': 'Cheese'}])
+    self.fake.fields = [{'ID': 'Field1', 'Title': 'Price', 'Type': 'money',
+                         'SubFields': [{'ID': 'Field2', 'Label': 'Cents'}]}]
+    self.fake.install()
+    self.path = tempfile.mktemp(suffix='.db')
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    if os.path.exists(self.path):
+      os.remove(self.path)
+    
+  def test1(self):
+    w = wufoo.Api(my_subdomain, my_api_key)
+    store = wufoo.EntryStore(self.path)
+    self.assertEqual(store.SyncForm(w, 'm7x3p9'), 5)
+    store.Close()
+    
+    # Records come back as the model classes
+    store = wufoo.EntryStore(self.path)
+    self.assertEqual(store.GetForm('m7x3p9').name, 'Cheese')
+    fields = store.GetFields('m7x3p9')
+    self.assertEqual(fields[0].title, 'Price')
+    self.assertEqual(fields[0].subfields[0].label, 'Cents')
+    entries = list(store.GetEntries('m7x3p9'))
+    self.assertEqual([e.entry_id for e in entries], ['1', '2', '3', '4', '5'])
+    self.assertEqual(entries[0].fields['Field1'], 'value 1')
+    self.assertEqual(store.GetEntry('m7x3p9', 3).date_created.day, 4)
+    
+    # Only the delta is fetched the next time
+    self.fake.entries.append({'EntryId': '6'})
+    self.assertEqual(store.SyncForm(w, 'm7x3p9'), 1)
+    self.assertEqual(store.GetEntryCount('m7x3p9'), 6)
+    self.fake.entries[1]['DateUpdated'] = '2010-07-01 12:00:00'
+    self.assertEqual(store.SyncForm(w, 'm7x3p9'), 1)
+    store.Close()
+    
+    # The entries synced at the mark second are remembered too
+    store = wufoo.EntryStore(self.path)
+    self.assertEqual(store.SyncForm(w, 'm7x3p9'), 0)
+    store.Close()
+    
+  def test2(self):
+    # An interrupted sync resumes from the last committed batch
+    w = wufoo.Api(my_subdomain, my_api_key)
+    store = wufoo.EntryStore(self.path, commit_every=2)
+    self.fake.failing_pages.add(2)
+    self.assertRaises(urllib2.URLError, store.SyncForm, w, 'm7x3p9', page_size=2)
+    store._connection.close()
+    
+    store = wufoo.EntryStore(self.path)
+    self.assertEqual(store.GetEntryCount('m7x3p9'), 2)
+    self.fake.failing_pages.clear()
+    self.fake.urls = []
+    self.assertEqual(store.SyncForm(w, 'm7x3p9', page_size=2), 4)
+    self.assertTrue('Filter0=EntryId+Is_greater_than+1' in self.fake.urls[2])
+    self.assertEqual(store.GetEntryCount('m7x3p9'), 5)
+    
+  def test3(self):
+    store = wufoo.EntryStore()
+    comment = wufoo.Comment.NewFromJsonDict({'CommentId': '1', 'EntryId': '2', 'Text': 'Hi'})
+    store.SaveComment('m7x3p9', comment)
+    self.assertEqual(store.GetComments('m7x3p9', entry_id=2)[0].text, 'Hi')
+    self.assertEqual(store.GetComments('m7x3p9', entry_id=3), [])
+
+class wufoo_RateLimitertests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(5))
+    self.fake.install()
+    self.now = 0
+    self.sleeps = []
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def limiter(self, **kwargs):
+    limiter = wufoo.RateLimiter(**kwargs)
+    limiter._clock = lambda: self.now
+    limiter._sleep = self.sleeps.append
+    limiter._random = lambda: 1.0
+    return limiter
+    
+  def test1(self):
+    # Requests beyond the burst are spaced out at the rate
+    limiter = self.limiter(rate=2, burst=2, budgets={'other': (1, 1)})
+    for i in range(4):
+      limiter.Acquire('test')
+    self.assertEqual(self.sleeps, [0.5, 1.0])
+    
+    # Each subdomain has its own budget
+    del self.sleeps[:]
+    limiter.Acquire('other')
+    limiter.Acquire('other')
+    self.assertEqual(self.sleeps, [1.0])
+    
+  def test2(self):
+    # Throttled requests back off, slow down and are retried
+    limiter = self.limiter(rate=4, burst=10)
+    w = wufoo.Api(my_subdomain, my_api_key, rate_limiter=limiter)
+    self.fake.throttled = [429, 429]
+    self.assertEqual(w.GetFormEntryCount('m7x3p9'), 5)
+    self.assertEqual(len(self.fake.urls), 3)
+    self.assertEqual(self.sleeps, [1.0, 2.0])
+    self.assertEqual(limiter.GetRate(my_subdomain), 1.25)
+    
+    # The rate climbs back with successful requests
+    for i in range(11):
+      w.GetFormEntryCount('m7x3p9')
+    self.assertEqual(limiter.GetRate(my_subdomain), 4)
+    
+  def test3(self):
+    # Retry-After is honoured, and retries are bounded
+    limiter = self.limiter(max_retries=1)
+    w = wufoo.Api(my_subdomain, my_api_key, rate_limiter=limiter)
+    self.fake.retry_after = '7'
+    self.fake.throttled = [429, 429]
+    self.assertRaises(urllib2.HTTPError, w.GetFormEntryCount, 'm7x3p9')
+    self.assertEqual(self.sleeps, [7])
+    
+  def test4(self):
+    # POSTs are only sent again after a 429
+    w = wufoo.Api(my_subdomain, my_api_key, rate_limiter=self.limiter())
+    url = 'https://test.wufoo.com/api/v3/forms/m7x3p9/entries.json'
+    self.fake.throttled = [429]
+    w._FetchUrl(url, post_data={'Field1': 'brie'})
+    self.assertEqual(len(self.fake.urls), 2)
+    self.fake.throttled = [503]
+    self.assertRaises(urllib2.HTTPError, w._FetchUrl, url, post_data={'Field1': 'brie'})
+    self.assertEqual(len(self.fake.urls), 3)
+    self.fake.throttled = [503]
+    w.GetFormEntryCount('m7x3p9')
+    self.assertEqual(len(self.fake.urls), 5)
+
+class TrickleFile:
+  '''A file that never returns more than a few bytes per read'''
+  def __init__(self, data, step=3):
+    self.fp = StringIO.StringIO(data)
+    self.step = step
+    self.reads = 0
+    
+  def read(self, size=-1):
+    self.reads += 1
+    return self.fp.read(min(size, self.step))
+
+class wufoo_JsonStreamtests(unittest.TestCase):
+
+  def test1(self):
+    data = {'Other': [1, {'a': '}]'}], 'Count': 12345,
+            'Entries': [{'EntryId': '1', 'Field1': u'caf\xe9 [x]'}, 
+                        {'EntryId': '2', 'Field2': 1.5e3}, []],
+            'After': None}
+    fp = TrickleFile(simplejson.dumps(data))
+    self.assertEqual(list(wufoo._IterJsonArray(fp, 'Entries')), data['Entries'])
+    
+    fp = TrickleFile(' { "Count" : 12345 , "Entries" : [ ] } ')
+    self.assertEqual(list(wufoo._IterJsonArray(fp, 'Entries')), [])
+    
+  def test2(self):
+    # Items are decoded before the rest of the document is read
+    fp = TrickleFile('{"Entries": [{"EntryId": "1"}, {"EntryId": "2"}, ', step=100)
+    entries = wufoo._IterJsonArray(fp, 'Entries')
+    self.assertEqual(entries.next(), {'EntryId': '1'})
+    self.assertEqual(entries.next(), {'EntryId': '2'})
+    self.assertRaises(ValueError, entries.next)
+    
+    self.assertRaises(KeyError, list, wufoo._IterJsonArray(TrickleFile('{}'), 'Entries'))
+    self.assertRaises(KeyError, list, wufoo._IterJsonArray(TrickleFile('{"Forms": []}'), 'Entries'))
+    self.assertRaises(ValueError, list, wufoo._IterJsonArray(TrickleFile('{"Entries": [1 2]}'), 'Entries'))
+
+class wufoo_Instrumentationtests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(5), forms=[{'Hash': 'm7x3p9'}])
+    self.fake.install()
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def test1(self):
+    w = wufoo.Api(my_subdomain, my_api_key)
+    reported = []
+    w.AddRequestHook(reported.append)
+    w.GetForms()
+    entries = list(w.IterEntriesForForm('m7x3p9'))
+    self.assertRaises(KeyError, w.GetUsers)
+    
+    self.assertEqual([s.endpoint for s in reported], 
+                     ['forms', 'forms/{hash}/entries', 'users'])
+    forms, page, users = reported
+    self.assertEqual(forms.method, 'GET')
+    self.assertEqual(forms.bytes, len(simplejson.dumps({'Forms': [{'Hash': 'm7x3p9'}]})))
+    self.assertTrue(page.bytes > 0)
+    self.assertTrue(page.decode_time > 0)
+    self.assertEqual(forms.error, None)
+    self.assertTrue(isinstance(users.error, KeyError))
+    
+    w.RemoveRequestHook(reported.append)
+    w.GetForms()
+    self.assertEqual(len(reported), 3)
+    
+    metrics = w.GetMetrics().AsDict()
+    self.assertEqual(metrics['forms']['requests'], 2)
+    self.assertEqual(metrics['users']['errors'], 1)
+    self.assertEqual(metrics['forms']['histograms']['total']['count'], 2)
+    simplejson.loads(w.GetMetrics().AsJsonString())
+    
+  def test2(self):
+    h = wufoo.LatencyHistogram()
+    self.assertEqual(h.Percentile(50), None)
+    for seconds in [0.0005] * 90 + [0.3] * 9 + [120]:
+      h.Add(seconds)
+    self.assertEqual(h.count, 100)
+    self.assertEqual(h.Percentile(50), 0.001)
+    self.assertEqual(h.Percentile(95), 0.5)
+    self.assertEqual(h.Percentile(100), 120)
+    self.assertEqual(h.AsDict()['buckets'], [[0.001, 90], [0.5, 9], [None, 1]])
+
+  def test3(self):
+    # A failing hook doesn't hide the request's own error, or stop the 
+    # other hooks
+    w = wufoo.Api(my_subdomain, my_api_key)
+    reported = []
+    def broken(stats):
+      raise ValueError('broken hook')
+    w.AddRequestHook(broken)
+    w.AddRequestHook(reported.append)
+    self.assertRaises(KeyError, w.GetUsers)
+    self.assertRaises(ValueError, w.GetForms)
+    self.assertEqual(len(reported), 2)
+    w.RemoveRequestHook(broken)
+    
+    # The 201 older urllib2 raises for a new entry isn't an error
+    respond = self.fake.respond
+    def created(url, data, headers):
+      if data is None:
+        return respond(url, data, headers)
+      raise urllib2.HTTPError(url, 201, 'Created', {},
+                              StringIO.StringIO('{"Success": 1, "EntryId": 6}'))
+    self.fake.respond = created
+    self.assertEqual(w.PostEntry('m7x3p9', {'Field1': 'x'})['EntryId'], 6)
+    self.assertEqual((reported[-1].status, reported[-1].error), (201, None))
+
+class FakeConnection:
+  # Every connection made, so tests can close the ones left open
+  opened = []
+
+  def __init__(self, host, timeout=None):
+    self.host = host
+    self.timeout = timeout
+    self.sock, self.peer = socket.socketpair()
+    self.closed = False
+    FakeConnection.opened.append(self)
+
+  def close(self):
+    self.closed = True
+    self.sock.close()
+    self.peer.close()
+
+class DroppedConnection(FakeConnection):
+  '''A connection whose server hangs up once a request is sent'''
+  sent = []
+
+  def request(self, method, selector, body=None, headers={}):
+    DroppedConnection.sent.append((method, self.timeout))
+
+  def getresponse(self):
+    raise httplib.BadStatusLine('')
+
+class FakeHTTPResponse(StringIO.StringIO):
+  will_close = False
+
+  def isclosed(self):
+    return self.tell() == self.len
+
+class wufoo_ConnectionPooltests(unittest.TestCase):
+  def tearDown(self):
+    for conn in FakeConnection.opened:
+      conn.close()
+    del FakeConnection.opened[:]
+
+  def test1(self):
+    # Connections handed back are reused for the same host only
+    pool = wufoo.ConnectionPool(max_size=1, connection_class=FakeConnection)
+    conn, reused = pool.Get('test.wufoo.com')
+    self.assertFalse(reused)
+    pool.Put('test.wufoo.com', conn)
+    
+    self.assertEqual(pool.Get('test.wufoo.com'), (conn, True))
+    self.assertFalse(pool.Get('other.wufoo.com')[1])
+    
+    # Only max_size idle connections are kept
+    other, reused = pool.Get('test.wufoo.com')
+    pool.Put('test.wufoo.com', conn)
+    pool.Put('test.wufoo.com', other)
+    self.assertTrue(other.closed)
+    
+  def test2(self):
+    # Idle and unhealthy connections are evicted
+    pool = wufoo.ConnectionPool(idle_timeout=-1, connection_class=FakeConnection)
+    conn, reused = pool.Get('test.wufoo.com')
+    pool.Put('test.wufoo.com', conn)
+    self.assertFalse(pool.Get('test.wufoo.com')[1])
+    self.assertTrue(conn.closed)
+    
+    pool = wufoo.ConnectionPool(connection_class=FakeConnection)
+    conn, reused = pool.Get('test.wufoo.com')
+    pool.Put('test.wufoo.com', conn)
+    conn.peer.close()
+    self.assertFalse(pool.Get('test.wufoo.com')[1])
+    self.assertTrue(conn.closed)
+
+  def test3(self):
+    w = wufoo.Api(my_subdomain, my_api_key, pool_size=0)
+    self.assertEqual(w.GetConnectionPool(), None)
+    
+    w = wufoo.Api(my_subdomain, my_api_key, pool_size=2)
+    self.assertEqual(w.GetConnectionPool().max_size, 2)
+
+  def test4(self):
+    # Closing a response with only a little left unread keeps its connection
+    pool = wufoo.ConnectionPool(connection_class=FakeConnection)
+    conn, reused = pool.Get('test.wufoo.com')
+    # The array ends right at the end of the first chunk read
+    head = '{"Entries": [1, 2'.ljust(8191) + ']'
+    body = FakeHTTPResponse(head + '}' + ' ' * 100)
+    response = wufoo._PooledResponse(pool, 'test.wufoo.com', 'https', conn, body)
+    self.assertEqual(list(wufoo._IterJsonArray(response, 'Entries')), [1, 2])
+    response.close()
+    self.assertEqual(pool.Get('test.wufoo.com'), (conn, True))
+    
+    body = FakeHTTPResponse(head + '}' + ' ' * 100000)
+    response = wufoo._PooledResponse(pool, 'test.wufoo.com', 'https', conn, body)
+    self.assertEqual(list(wufoo._IterJsonArray(response, 'Entries')), [1, 2])
+    response.close()
+    self.assertTrue(conn.closed)
+    self.assertFalse(pool.Get('test.wufoo.com')[1])
+
+  def test5(self):
+    # A dropped reused connection is only retried when that can't send
+    # a POST twice, and requests keep the opener's timeout
+    pool = wufoo.ConnectionPool(connection_class=DroppedConnection)
+    handler = wufoo._KeepAliveHandler(pool)
+    for data, sent in ((None, 2), ('Field1=x', 1)):
+      del DroppedConnection.sent[:]
+      pool.Put('test.wufoo.com', pool.Get('test.wufoo.com', 'http')[0], 'http')
+      req = urllib2.Request('http://test.wufoo.com/api/v3/forms.json', data)
+      req.timeout = 5
+      self.assertRaises(urllib2.URLError, handler.http_open, req)
+      self.assertEqual(len(DroppedConnection.sent), sent)
+      self.assertEqual(DroppedConnection.sent[0][1], 5)
+
+  def test6(self):
+    # HTTPS through a proxy starts with a CONNECT
+    proxy = socket.socket()
+    proxy.bind(('127.0.0.1', 0))
+    proxy.listen(1)
+    proxy.settimeout(5)
+    received = []
+    def accept():
+      conn, address = proxy.accept()
+      received.append(conn.recv(1024))
+      conn.close()
+    thread = threading.Thread(target=accept)
+    thread.start()
+    saved = os.environ.get('https_proxy')
+    os.environ['https_proxy'] = 'http://127.0.0.1:%d' % proxy.getsockname()[1]
+    open = wufoo.urllib2.OpenerDirector.open
+    wufoo.urllib2.OpenerDirector.open = real_open
+    try:
+      w = wufoo.Api(my_subdomain, my_api_key)
+      w.SetRateLimiter(None)
+      self.assertRaises(Exception, w.GetForms)
+    finally:
+      wufoo.urllib2.OpenerDirector.open = open
+      if saved is None:
+        del os.environ['https_proxy']
+      else:
+        os.environ['https_proxy'] = saved
+      thread.join()
+      proxy.close()
+    self.assertTrue(received[0].startswith('CONNECT %s.wufoo.com:443 ' % my_subdomain))
+      
+class wufoo_Modeltests(unittest.TestCase):
+
+  def test1(self):
+    # Models keep their attributes in slots, and entries share Field keys
+    json = simplejson.dumps(make_entries(2))
+    first, second = [wufoo.Entry.NewFromJsonDict(x) for x in simplejson.loads(json)]
+    self.assertFalse(hasattr(first, '__dict__'))
+    self.assertRaises(AttributeError, setattr, first, '_other', 1)
+    key, = [k for k in first.fields if k == 'Field1']
+    other, = [k for k in second.fields if k == 'Field1']
+    self.assertTrue(key is other)
+    
+    for cls in (wufoo.Field, wufoo.Comment, wufoo.Widget, wufoo.User, 
+                wufoo.Report, wufoo.Form):
+      self.assertFalse(hasattr(cls(), '__dict__'))
+    
+    # They still pickle with every protocol, lazy entries included
+    lazy = wufoo.Entry.NewFromJsonDict(simplejson.loads(json)[0], lazy=True)
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+      for entry in (first, lazy):
+        copy = pickle.loads(pickle.dumps(entry, protocol))
+        self.assertEqual(copy.AsDict(), first.AsDict())
+      form = wufoo.Form(hash='m7x3p9', date_created='2010-06-01 10:00:00')
+      self.assertEqual(pickle.loads(pickle.dumps(form, protocol)).date_created, form.date_created)
+
+  def test2(self):
+    # Lazy entries copy attributes out of their own copy of the JSON dict
+    data = {'EntryId': '1', 'Field1': 'cheddar', 'DateCreated': '2010-06-01 10:00:00'}
+    entry = wufoo.Entry.NewFromJsonDict(data, lazy=True)
+    data['EntryId'] = '2'
+    self.assertEqual(entry.entry_id, '1')
+    self.assertEqual(entry.fields, {'Field1': 'cheddar'})
+    data['EntryId'] = '1'
+    self.assertEqual(entry.AsDict(), wufoo.Entry.NewFromJsonDict(data).AsDict())
+    self.assertRaises(AttributeError, getattr, entry, 'nothing')
+    
+  def test3(self):
+    fake = PatchedOpener(make_entries(5))
+    fake.install()
+    try:
+      eager = wufoo.Api(my_subdomain, my_api_key).GetEntriesForForm('m7x3p9')
+      lazy = wufoo.Api(my_subdomain, my_api_key, lazy_entries=True).GetEntriesForForm('m7x3p9')
+    finally:
+      fake.uninstall()
+    self.assertEqual([x.AsDict() for x in lazy], [x.AsDict() for x in eager])
+
+  def test4(self):
+    # Wufoo's date format skips dateutil, other formats still parse
+    entry = wufoo.Entry(date_created='2010-06-01 10:20:30', date_updated='June 2 2010')
+    self.assertEqual(entry.date_created, wufoo.datetime.datetime(2010, 6, 1, 10, 20, 30))
+    self.assertEqual(entry.date_updated, wufoo.datetime.datetime(2010, 6, 2))
+    self.assertTrue(entry.date_created is entry.date_created)
+    
+    lazy = wufoo.Entry.NewFromJsonDict({'DateCreated': '2010-06-01 10:20:30'}, lazy=True)
+    self.assertEqual(lazy.date_created, entry.date_created)
+    self.assertRaises(ValueError, getattr, wufoo.Form(start_date='0000-00-00 00:00:00'), 'start_date')
+
+class wufoo_FieldDecodertests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener()
+    self.fake.fields = [
+      {'ID': 'EntryId', 'Title': 'Entry Id', 'Type': 'text'},
+      {'ID': 'Field1', 'Title': 'Count', 'Type': 'number'},
+      {'ID': 'Field2', 'Title': 'Price', 'Type': 'money'},
+      {'ID': 'Field3', 'Title': 'Due', 'Type': 'date'},
+      {'ID': 'Field4', 'Title': 'Cheeses', 'Type': 'checkbox',
+       'SubFields': [{'ID': 'Field5', 'Label': 'Brie'}, {'ID': 'Field6', 'Label': 'Gouda'}]},
+      {'ID': 'Field7', 'Title': 'Rate', 'Type': 'likert',
+       'SubFields': [{'ID': 'Field8', 'Label': 'Taste'}, {'ID': 'Field9', 'Label': 'Smell'}],
+       'Choices': [{'Label': 'Bad', 'Score': 1}, {'Label': 'Good', 'Score': 2}]},
+      {'ID': 'Field10', 'Title': 'Name', 'Type': 'text'}]
+    self.fake.install()
+    self.api = wufoo.Api(my_subdomain, my_api_key)
+
+  def tearDown(self):
+    self.fake.uninstall()
+
+  def test1(self):
+    decoder = self.api.GetFieldDecoder('m7x3p9')
+    entry = wufoo.Entry(fields={'Field1': '12', 'Field2': '4.50', 'Field3': '20100601',
+                                'Field5': 'Brie', 'Field6': '', 'Field8': 'Good', 
+                                'Field9': 'Awful', 'Field10': '42'})
+    self.assertEqual(decoder.DecodeEntry(entry),
+                     {'Field1': 12, 'Field2': wufoo.decimal.Decimal('4.50'),
+                      'Field3': wufoo.datetime.date(2010, 6, 1), 'Field4': ['Brie'],
+                      'Field8': 2, 'Field9': 'Awful', 'Field10': '42'})
+    
+    empty = wufoo.Entry(fields={'Field1': '', 'Field2': 'free', 'Field3': ''})
+    typed = decoder.Decode([entry, empty, entry])
+    self.assertEqual(typed[0], typed[2])
+    self.assertEqual(typed[1], {'Field1': None, 'Field2': 'free', 'Field3': None})
+
+  def test2(self):
+    # The decoder is kept until the form's fields change, which every
+    # call checks
+    decoder = self.api.GetFieldDecoder('m7x3p9')
+    self.assertTrue(self.api.GetFieldDecoder('m7x3p9') is decoder)
+    self.assertEqual(len(self.fake.urls), 2)
+    
+    self.api.GetFieldsForForm('m7x3p9', system=True)
+    self.assertTrue(self.api.GetFieldDecoder('m7x3p9') is decoder)
+    
+    self.fake.fields[1]['Type'] = 'text'
+    entry = wufoo.Entry(fields={'Field1': '12'})
+    self.assertEqual(self.api.GetFieldDecoder('m7x3p9').DecodeEntry(entry), {'Field1': '12'})
+    
+    # The response cache answers the check until the fields expire
+    api = wufoo.Api(my_subdomain, my_api_key, cache=wufoo.ResponseCache())
+    decoder = api.GetFieldDecoder('m7x3p9')
+    self.assertTrue(api.GetFieldDecoder('m7x3p9') is decoder)
+    self.assertEqual(len(self.fake.urls), 6)
+
+class wufoo_EntryIndextests(unittest.TestCase):
+  def setUp(self):
+    self.index = wufoo.EntryIndex([
+      wufoo.Entry(entry_id='1', date_created='2010-06-01 10:00:00',
+                  fields={'Field1': 'Cheddar', 'Field2': '5', 'Field3': '20100601'}),
+      wufoo.Entry(entry_id='2', date_created='2010-06-02 10:00:00',
+                  fields={'Field1': 'brie', 'Field2': '12', 'Field3': ''}),
+      wufoo.Entry(entry_id='3', date_created='2010-06-02 18:00:00',
+                  fields={'Field1': 'Red Cheddar', 'Field2': '', 'Field3': '20100715'}),
+      wufoo.Entry(entry_id='10', date_created='2010-06-03 09:00:00',
+                  fields={'Field1': '', 'Field2': '40', 'Field3': '20100601'})])
+
+  def ids(self, *args, **kwargs):
+    return [int(e.entry_id) for e in self.index.Query(*args, **kwargs)]
+
+  def test1(self):
+    # Every operator, on text, numbers and dates
+    cases = [(Filter('Field1', 'contains', 'CHEDDAR'), [1, 3]),
+             (Filter('Field1', 'does_not_contain', 'cheddar'), [2, 10]),
+             (Filter('Field1', 'begins_with', 'ched'), [1]),
+             (Filter('Field1', 'ends_with', 'dar'), [1, 3]),
+             (Filter('Field1', 'is_equal_to', 'brie'), [2]),
+             (Filter('Field1', 'is_not_equal_to', 'brie'), [1, 3, 10]),
+             (Filter('Field1', 'is_not_null'), [1, 2, 3]),
+             (Filter('Field1', 'is_less_than', 'd'), [1, 2]),
+             (Filter('Field2', 'is_less_than', 12), [1]),
+             (Filter('Field2', 'is_greater_than', '5'), [2, 10]),
+             (Filter('EntryId', 'is_greater_than', 2), [3, 10]),
+             (Filter('DateCreated', 'is_on', '2010-06-02'), [2, 3]),
+             (Filter('DateCreated', 'is_before', '2010-06-02 10:00:00'), [1]),
+             (Filter('DateCreated', 'is_after', '2010-06-02 10:00:00'), [3, 10]),
+             (Filter('Field3', 'is_on', '2010-06-01'), [1, 10]),
+             (Filter('Field3', 'is_after', '2010-06-01'), [3])]
+    for filter, expected in cases:
+      self.assertEqual(self.ids(filter), expected, str(filter))
+    self.assertRaises(ValueError, self.index.Query, Filter('Field3', 'is_on', 'soon'))
+
+  def test2(self):
+    cheddar = Filter('Field1', 'contains', 'cheddar')
+    big = Filter('Field2', 'is_greater_than', 10)
+    self.assertEqual(self.ids([cheddar, big]), [])
+    self.assertEqual(self.ids([cheddar, big], match='OR'), [1, 2, 3, 10])
+    self.assertEqual(self.index.Count([cheddar, big], match='OR'), 4)
+    self.assertEqual(self.ids(big, sort_id='Field2', sort_direction='DESC'), [10, 2])
+    self.assertEqual(self.ids(sort_id='Field1', sort_direction='ASC', page_start=1, page_size=2), [2, 1])
+    
+    # Indexes are rebuilt after changes
+    self.index.Add(wufoo.Entry(entry_id='2', fields={'Field1': 'cheddar'}))
+    self.index.Remove(10)
+    self.assertEqual(self.ids(cheddar), [1, 2, 3])
+    self.assertEqual(len(self.index), 3)
+
+class wufoo_TextIndextests(unittest.TestCase):
+  def setUp(self):
+    self.index = wufoo.TextIndex(
+      [wufoo.Entry(entry_id='1', fields={'Field1': 'Refund my credit card', 'Field2': 'Ann'}),
+       wufoo.Entry(entry_id='2', fields={'Field1': 'Card declined', 'Field2': 'credit union'}),
+       wufoo.Entry(entry_id='10', fields={'Field1': 'Chargeback', 'Field2': u'Zo\xeb'})],
+      [wufoo.Comment(comment_id='1', entry_id='2', text='Asked for a refund'),
+       wufoo.Comment(comment_id='2', entry_id='3', text='Called back about the e-mail')])
+
+  def test1(self):
+    search = self.index.Search
+    self.assertEqual(len(self.index), 4)
+    self.assertEqual(search('REFUND'), ['1', '2'])
+    self.assertEqual(search('refund card'), ['1', '2'])
+    self.assertEqual(search('"credit card"'), ['1'])
+    # Phrases don't span fields
+    self.assertEqual(search('"card credit"'), [])
+    self.assertEqual(search('"credit card" OR chargeback'), ['1', '10'])
+    self.assertEqual(search('declined chargeback', match='OR'), ['2', '10'])
+    self.assertEqual(search('email'), [])
+    self.assertEqual(search('e-mail'), ['3'])
+    self.assertEqual(search('zo\xc3\xab'), ['10'])
+    self.assertEqual(search('nothing'), [])
+    self.assertEqual(search(''), [])
+
+  def test2(self):
+    # Changes only touch the entry they belong to
+    index = self.index
+    index.Add(wufoo.Entry(entry_id='1', fields={'Field1': 'Wrong size', 'Field2': 'Ann'}))
+    self.assertEqual(index.Search('refund'), ['2'])
+    self.assertEqual(index.Search('size ann'), ['1'])
+    self.assertFalse('credit' in index._words['1'])
+    
+    index.AddComment(wufoo.Comment(comment_id='3', entry_id='1', text='refund sent'))
+    self.assertEqual(index.Search('"refund sent"'), ['1'])
+    index.RemoveComment('1', '3')
+    self.assertEqual(index.Search('sent'), [])
+    
+    index.Remove('2')
+    self.assertEqual(index.Search('credit OR refund'), [])
+    self.assertFalse('declined' in index._postings)
+    self.assertEqual(len(index), 3)
+
+class wufoo_QueryPlannertests(unittest.TestCase):
+  def setUp(self):
+    self.fake = PatchedOpener(make_entries(5))
+    self.fake.install()
+    self.api = wufoo.Api(my_subdomain, my_api_key)
+    self.planner = wufoo.QueryPlanner(self.api, max_age=60)
+    self.now = 1000.0
+    self.planner._clock = lambda: self.now
+    self.plans = []
+    self.planner.AddPlanHook(self.plans.append)
+    
+  def tearDown(self):
+    self.fake.uninstall()
+    
+  def test1(self):
+    # A fresh copy answers without any request
+    self.assertEqual(self.planner.Track('m7x3p9'), 5)
+    requests = len(self.fake.urls)
+    f1 = Filter('Field1', 'is_equal_to', 'value 2')
+    entries = self.planner.GetEntriesForForm('m7x3p9', filters=[f1])
+    self.assertEqual([e.entry_id for e in entries], ['2'])
+    self.assertEqual(len(self.fake.urls), requests)
+    self.assertEqual(self.plans[-1].strategy, wufoo.QueryPlan.LOCAL)
+    
+  def test2(self):
+    # A stale copy with a small delta is synced, then answers
+    self.planner.Track('m7x3p9')
+    self.fake.entries.append({'EntryId': '6', 'Field1': 'value 6'})
+    self.now += 61
+    self.assertEqual(self.planner.Explain('m7x3p9').strategy, wufoo.QueryPlan.DELTA)
+    entries = self.planner.GetEntriesForForm('m7x3p9', sort_id='EntryId', sort_direction='ASC')
+    self.assertEqual([e.entry_id for e in entries], ['1', '2', '3', '4', '5', '6'])
+    plan = self.plans[-1]
+    self.assertEqual((plan.strategy, plan.age), (wufoo.QueryPlan.DELTA, 61))
+    self.assertTrue('Filter0=EntryId+Is_greater_than+5' in self.fake.urls[-1])
+    
+    # And is fresh again
+    self.planner.GetEntriesForForm('m7x3p9')
+    self.assertEqual(self.plans[-1].strategy, wufoo.QueryPlan.LOCAL)
+    
+  def test3(self):
+    # A selective query on a form that grew a lot goes to Wufoo
+    self.planner.Track('m7x3p9')
+    self.fake.count = 50000
+    self.now += 61
+    f1 = Filter('Field1', 'is_equal_to', 'value 2')
+    entries = self.planner.GetEntriesForForm('m7x3p9', filters=[f1], page_size=25)
+    self.assertEqual([e.entry_id for e in entries], ['2'])
+    plan = self.plans[-1]
+    self.assertEqual(plan.strategy, wufoo.QueryPlan.SERVER)
+    self.assertEqual((plan.server_requests, plan.delta_requests), (1, 500))
+    self.assertTrue('Filter0=Field1+Is_equal_to+value+2' in self.fake.urls[-1])
+    
+    # Everything matches, so syncing the delta is no worse
+    self.assertEqual(self.planner.Explain('m7x3p9').strategy, wufoo.QueryPlan.DELTA)
+    
+  def test4(self):
+    # Untracked forms and reports are always queried on Wufoo
+    self.assertEqual(len(self.planner.GetEntriesForForm('m7x3p9')), 5)
+    self.assertEqual(self.plans[-1].reason, 'the form is not tracked')
+    self.planner.GetEntriesForReport('r1x2y3')
+    self.assertEqual(self.plans[-1].strategy, wufoo.QueryPlan.SERVER)
+    self.assertEqual(len(self.plans), 2)
+    
+    self.planner.Track('m7x3p9')
+    self.planner.Untrack('m7x3p9')
+    self.planner.GetEntriesForForm('m7x3p9')
+    self.assertEqual(self.plans[-1].strategy, wufoo.QueryPlan.SERVER)
+    
+  def test5(self):
+    # A store keeps the copy across planners
+    store = wufoo.EntryStore()
+    planner = wufoo.QueryPlanner(self.api, store=store)
+    self.assertEqual(planner.Track('m7x3p9'), 5)
+    self.fake.entries.append({'EntryId': '6'})
+    planner = wufoo.QueryPlanner(self.api, store=store)
+    self.assertEqual(planner.Track('m7x3p9'), 1)
+    self.assertEqual(len(planner.GetEntriesForForm('m7x3p9')), 6)
+    store.Close()
+    
+  def test6(self):
+    # Updated entries count towards the delta
+    self.fake.entries = make_entries(150)
+    self.planner.Track('m7x3p9')
+    for entry in self.fake.entries[:120]:
+      entry['DateUpdated'] = '2010-07-01 10:00:00'
+    self.now += 61
+    self.assertEqual(self.planner.Explain('m7x3p9').delta_requests, 2)
+    self.assertTrue('Filter1=DateUpdated+Is_not_NULL' in self.fake.urls[-1])
+
+  def test7(self):
+    # The local copy still answers while a sync is waiting on Wufoo
+    self.planner.Track('m7x3p9')
+    index = self.planner._indexes['m7x3p9']
+    self.fake.entries.append({'EntryId': '6'})
+    self.now += 61
+    counted = []
+    respond = self.fake.respond
+    def respond_while_counting(url, data, headers):
+      if '/entries.json' in url:
+        t = threading.Thread(target=lambda: counted.append(index.Count(None)))
+        t.start()
+        t.join(1)
+      return respond(url, data, headers)
+    self.fake.respond = respond_while_counting
+    self.assertEqual(len(self.planner.GetEntriesForForm('m7x3p9')), 6)
+    self.assertEqual(counted, [5])
+
+class wufoo_EntryTabletests(unittest.TestCase):
+  def setUp(self):
+    self.fields = [wufoo.Field(id='Field1', type='text'),
+                   wufoo.Field(id='Field2', type='number'),
+                   wufoo.Field(id='Field3', type='date')]
+    self.entries = [wufoo.Entry(entry_id=str(i), date_created='2010-06-%02d 10:00:00' % (i % 3 + 1),
+                                fields={'Field1': ['gouda', 'brie'][i % 2], 
+                                        'Field2': str(i * 10) if i != 4 else '',
+                                        'Field3': '201006%02d' % i})
+                    for i in range(1, 7)]
+    self.numpy = wufoo.EntryTable._numpy
+
+  def tearDown(self):
+    wufoo.EntryTable._numpy = self.numpy
+
+  def each_backend(self, test):
+    for numpy in (self.numpy, None):
+      wufoo.EntryTable._numpy = numpy
+      test(wufoo.EntryTable(iter(self.entries), fields=self.fields))
+
+  def test1(self):
+    # Columns are typed from the form's fields, empty numbers are NaN
+    def test(table):
+      self.assertEqual(len(table), 6)
+      self.assertEqual(table.GetColumnNames()[5:], ['Field1', 'Field2', 'Field3'])
+      self.assertEqual(table.GetColumnType('Field2'), 'number')
+      self.assertEqual(list(table.GetColumn('Field1'))[:2], ['brie', 'gouda'])
+      row = table.GetRow(3)
+      self.assertEqual(row['Field2'], None)
+      self.assertEqual(row['Field3'], wufoo.datetime.datetime(2010, 6, 4))
+      self.assertEqual(row['EntryId'], 4.0)
+    self.each_backend(test)
+
+  def test2(self):
+    # Filtering, aggregation and grouping skip empty values
+    def test(table):
+      self.assertEqual(table.Aggregate('Field2', 'count'), 5)
+      self.assertEqual(table.Aggregate('Field2', 'sum'), 170.0)
+      self.assertEqual(table.Aggregate('Field3', 'max'), wufoo.datetime.datetime(2010, 6, 6))
+      self.assertRaises(ValueError, table.Aggregate, 'Field1', 'mean')
+      
+      gouda = table.Where('Field1', '==', 'gouda')
+      self.assertEqual(list(gouda.GetColumn('EntryId')), [2.0, 4.0, 6.0])
+      self.assertEqual(gouda.Aggregate('Field2', 'mean'), 40.0)
+      self.assertEqual(len(table.Where('Field2', '>=', 30)), 3)
+      self.assertEqual(len(table.Where('Field2', '!=', 30)), 5)
+      self.assertEqual(len(table.Where('Field3', '<', wufoo.datetime.date(2010, 6, 3))), 2)
+      self.assertEqual(len(table.Where('EntryId', 'in', [1, 2, 9])), 2)
+      self.assertRaises(ValueError, table.Where, 'Field2', 'is_equal_to', 1)
+      
+      self.assertEqual(table.GroupBy('Field1', 'Field2', 'sum'), {'brie': 90.0, 'gouda': 80.0})
+      self.assertEqual(table.GroupBy('DateCreated', bucket='day'), 
+                       {wufoo.datetime.date(2010, 6, 1): 2, 
+                        wufoo.datetime.date(2010, 6, 2): 2,
+                        wufoo.datetime.date(2010, 6, 3): 2})
+      self.assertEqual(table.GroupBy('Field2', bucket=None)[None], 1)
+    self.each_backend(test)
+
+# wufoo_MockTests leaves OpenerDirector.open mocked out
+real_open = urllib2.OpenerDirector.open
+
+class wufoo_FakeServertests(unittest.TestCase):
+  def setUp(self):
+    self.open = wufoo.urllib2.OpenerDirector.open
+    wufoo.urllib2.OpenerDirector.open = real_open
+    self.server = fakewufoo.FakeWufooServer(forms=1, entries=120)
+    self.server.Start()
+    self.api = wufoo.Api('fake', my_api_key, base_url=self.server.url)
+    self.api.SetRateLimiter(None)
+    self.hash = self.server.forms[0]['Hash']
+
+  def tearDown(self):
+    self.api.GetConnectionPool().Clear()
+    self.server.Stop()
+    wufoo.urllib2.OpenerDirector.open = self.open
+
+  def test1(self):
+    # The Api runs end to end against the fake server over kept-alive connections
+    self.assertEqual([f.hash for f in self.api.GetForms()], [self.hash])
+    self.assertEqual(self.api.GetFormEntryCount(self.hash), 120)
+    entries = list(self.api.IterEntriesForForm(self.hash, sort_id='EntryId', sort_direction='ASC', workers=3))
+    self.assertEqual([int(e.entry_id) for e in entries], range(1, 121))
+    
+    stats = []
+    self.api.AddRequestHook(stats.append)
+    self.api.GetFieldsForForm(self.hash)
+    self.assertEqual(stats[-1].status, 200)
+
+  def test2(self):
+    # Invalid identifiers and injected errors come back as HTTP errors
+    self.assertRaises(urllib2.HTTPError, self.api.GetFieldsForForm, 'nosuchform')
+    self.server.FailNext(500)
+    self.assertRaises(urllib2.HTTPError, self.api.GetFormEntryCount, self.hash)
+    self.assertEqual(self.api.GetFormEntryCount(self.hash), 120)
+
+  def test3(self):
+    # Comments are paged in parallel and joined onto entries by EntryId
+    self.server.comments[self.hash] = [self.server.MakeComment(n, 120) for n in range(1, 251)]
+    expected = {}
+    for comment in self.server.comments[self.hash]:
+      expected.setdefault(comment['EntryId'], []).append(comment['CommentId'])
+    
+    by_entry = self.api.GetCommentsByEntry(self.hash, workers=3)
+    self.assertEqual(dict([(k, [c.comment_id for c in v]) for k, v in by_entry.items()]), expected)
+    
+    entries = self.api.GetEntriesForForm(self.hash, page_size=100)
+    self.assertEqual(entries[0].comments, None)
+    self.api.AttachComments(self.hash, entries, workers=3)
+    for entry in entries:
+      self.assertEqual([c.comment_id for c in entry.comments], expected.get(entry.entry_id, []))
+    
+    # A comment added after the count was taken is still read
+    count = self.api.GetCommentCount
+    def count_then_comment(form_hash):
+      n = count(form_hash)
+      self.server.comments[self.hash].append(self.server.MakeComment(251, 120))
+      return n
+    self.api.GetCommentCount = count_then_comment
+    by_entry = self.api.GetCommentsByEntry(self.hash, workers=3, page_size=50)
+    self.assertEqual(sum([len(v) for v in by_entry.values()]), 251)
+
+  def test4(self):
+    # Invalid hashes and URL names are remembered until they expire or
+    # are listed
+    negative = wufoo.NegativeCache(timeout=30)
+    now = [1000.0]
+    negative._clock = lambda: now[0]
+    self.api.SetNegativeCache(negative)
+    stats = []
+    self.api.AddRequestHook(stats.append)
+    for i in range(3):
+      self.assertRaises(WufooError, self.api.GetForm, 'f99999')
+      self.assertRaises(WufooError, self.api.GetReport, 'r99999')
+    self.assertEqual(len(stats), 2)
+    
+    now[0] += 30
+    self.assertRaises(WufooError, self.api.GetForm, 'f99999')
+    self.assertEqual(len(stats), 3)
+    
+    self.assertRaises(WufooError, self.api.GetForm, 'new-form')
+    self.assertEqual(len(stats), 4)
+    
+    form = dict(self.server.forms[0], Hash='f99999', Url='new-form')
+    self.server.forms.append(form)
+    self.server.entries['f99999'] = []
+    self.server.fields['f99999'] = []
+    self.assertEqual(len(self.api.GetForms()), 2)
+    self.assertEqual(self.api.GetForm('f99999').hash, 'f99999')
+    self.assertEqual(self.api.GetForm('new-form').hash, 'f99999')
+    self.assertRaises(WufooError, self.api.GetReport, 'r99999')
+    self.assertEqual(len(negative), 1)
+
+  def test5(self):
+    # A new entry comes back with a 201, a rejected one with a 200
+    response = self.api.PostEntry(self.hash, {'Field10': 'brie'})
+    self.assertEqual(response['EntryId'], 121)
+    self.assertEqual(self.server.entries[self.hash][-1]['Field10'], 'brie')
+    try:
+      self.api.PostEntry(self.hash, {})
+      self.fail()
+    except WufooError, e:
+      self.assertEqual(e.message, 'Errors have been highlighted below.')
+      
+  def test6(self):
+    # Rows are posted in parallel, retried and reported in order
+    drawn = []
+    def rows():
+      for i in range(30):
+        drawn.append(i)
+        if i == 7:
+          yield {}
+        else:
+          yield {'Field10': 'row %d' % i}
+    
+    self.server.FailNext(503, count=2)
+    results = self.api.PostEntries(self.hash, rows(), workers=3, retry_delay=0)
+    first = results.next()
+    self.assertTrue(len(drawn) < 30)
+    results = [first] + list(results)
+    
+    self.assertEqual([r.index for r in results], range(30))
+    self.assertEqual([r.index for r in results if not r.ok], [7])
+    self.assertEqual(results[7].attempts, 1)
+    self.assertEqual(sum([r.attempts for r in results]), 32)
+    created = dict([(e['EntryId'], e['Field10']) for e in self.server.entries[self.hash][120:]])
+    self.assertEqual(len(created), 29)
+    for r in results:
+      if r.ok:
+        self.assertEqual(created[r.entry_id], 'row %d' % r.index)
+    
+    # Errors that won't go away, or may come after the entry was made,
+    # aren't retried
+    results = list(self.api.PostEntries('nosuchform', [{'Field10': 'x'}], retry_delay=0))
+    self.assertEqual((results[0].ok, results[0].attempts), (False, 1))
+    self.server.FailNext(500)
+    results = list(self.api.PostEntries(self.hash, [{'Field10': 'x'}], retry_delay=0))
+    self.assertEqual((results[0].ok, results[0].attempts), (False, 1))
+
 if __name__ == "__main__":
   
   # Run single tests with:
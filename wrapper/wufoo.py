@@ -28,10 +28,29 @@ Lingering Concerns:
 __author__ = 'mpare@gatech.edu'
 __version__ = '0.1-devel'
 
+import array
 import base64
+import bisect
+import calendar
+import collections
+import decimal
+import hashlib
+import httplib
+import itertools
+import math
+import operator
 import os
+import Queue
+import random
+import re
+import select
 import simplejson
+import socket
+import sqlite3
+import StringIO
 import sys
+import threading
+import time
 import urllib
 import urllib2
 from urllib2 import HTTPError
@@ -40,6 +59,11 @@ import dateutil
 import dateutil.parser
 import datetime
 
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
 # ----------------------------------------
 #
 # Class Definitions
@@ -54,7 +78,44 @@ class WufooError(Exception):
     '''Returns the first argument used to construct this error.'''
     return self.args[0]
 
+# Wufoo sends every date as 'YYYY-MM-DD HH:MM:SS'
+_DATE_PATTERN = re.compile(r'(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)$')
+
+def _ParseDate(value):
+  # dateutil's fuzzy parser is only needed for other formats
+  match = _DATE_PATTERN.match(value or '')
+  if match:
+    return datetime.datetime(*[int(x) for x in match.groups()])
+  return dateutil.parser.parse(value)
+
+def _SecondBefore(value):
+  # A YYYY-MM-DD HH:MM:SS date one second earlier
+  try:
+    date = _ParseDate(value)
+  except (TypeError, ValueError, OverflowError):
+    return value
+  return (date - datetime.timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+
+def _GetSlotState(obj):
+  # Slotted instances have no __dict__ for pickle protocols 0 and 1 to
+  # save, so their state is the slots that are set. Lazy entries keep
+  # unread slots unset.
+  state = {}
+  for name in obj.__slots__:
+    try:
+      state[name] = object.__getattribute__(obj, name)
+    except AttributeError:
+      pass
+  return state
+
+def _SetSlotState(obj, state):
+  for name, value in state.items():
+    setattr(obj, name, value)
+
 class Field(object):
+  __slots__ = ('_type', '_id', '_title', '_is_required', '_subfields',
+               '_label', '_score', '_choices')
+
   def __init__(self, type=None, id=None, title=None, is_required=None, subfields=None, label=None, score=None, choices=None):
     self._type=type
     self._id=id
@@ -65,6 +126,12 @@ class Field(object):
     self._score=score
     self._choices=choices
 
+  def __getstate__(self):
+    return _GetSlotState(self)
+
+  def __setstate__(self, state):
+    _SetSlotState(self, state)
+
   @property
   def type(self):
     return self._type
@@ -173,6 +240,9 @@ class Field(object):
 class Comment(object):
   '''Class for representing the structure of the Comment class in the Wufoo API'''
   
+  __slots__ = ('_commented_by', '_comment_id', '_date_created', '_entry_id',
+               '_text', '_parsed_date_created')
+
   def __init__(self, commented_by=None, comment_id=None, date_created=None, entry_id=None, text=None):
     self._commented_by=commented_by
     self._comment_id=comment_id
@@ -180,6 +250,12 @@ class Comment(object):
     self._entry_id=entry_id
     self._text=text
 
+  def __getstate__(self):
+    return _GetSlotState(self)
+
+  def __setstate__(self, state):
+    _SetSlotState(self, state)
+
   @property
   def commented_by(self):
     return self._commented_by
@@ -190,7 +266,11 @@ class Comment(object):
 
   @property
   def date_created(self):
-    return dateutil.parser.parse(self._date_created)
+    try:
+      return self._parsed_date_created
+    except AttributeError:
+      self._parsed_date_created = _ParseDate(self._date_created)
+      return self._parsed_date_created
 
   @property
   def entry_id(self):
@@ -265,6 +345,8 @@ class Comment(object):
 class Widget(object):
   '''Class for representing the structure of the Widget class in Wufoo API'''
 
+  __slots__ = ('_subdomain', '_type', '_type_desc', '_hash', '_name', '_size')
+
   def __init__(self, subdomain=None, type=None, type_desc=None, hash=None, name=None, size=None):
     self._subdomain=subdomain
     self._type=type
@@ -273,6 +355,12 @@ class Widget(object):
     self._name=name
     self._size=size
 
+  def __getstate__(self):
+    return _GetSlotState(self)
+
+  def __setstate__(self, state):
+    _SetSlotState(self, state)
+
   @property
   def embed_code(self):
     return '''
@@ -374,6 +462,11 @@ class Widget(object):
 
 class User(object):
   '''Class to represent the User structure in the Wufoo API.'''
+  __slots__ = ('_api_key', '_hash', '_is_account_owner', '_image', '_company',
+               '_link_forms', '_create_themes', '_link_reports', '_user',
+               '_create_reports', '_time_zone', '_create_forms',
+               '_admin_access', '_email')
+
   def __init__(self, api_key=None, hash=None, is_account_owner=None, image=None, company=None, link_forms=None, create_themes=None, link_reports=None, user=None, create_reports=None, time_zone=None, create_forms=None, admin_access=None, email=None):
     self._api_key=api_key
     self._hash=hash
@@ -390,6 +483,12 @@ class User(object):
     self._admin_access=admin_access
     self._email=email
 
+  def __getstate__(self):
+    return _GetSlotState(self)
+
+  def __setstate__(self, state):
+    _SetSlotState(self, state)
+
   @property
   def api_key(self):
     return self._api_key
@@ -609,11 +708,44 @@ class Filter(object):
       ret = "%s+%s+%s" % (self.field_id, op, self.value)
     return ret
     
+# One copy of each Field key, shared by the fields dicts of every Entry.
+# The JSON decoder hands back a new string for every key of every entry.
+_FIELD_KEYS = {}
+
+def _EntryFields(data):
+  # Compress the Field[id] values into maps
+  fields = {}
+  for k, v in data.items():
+    if k.startswith('Field'):
+      fields[_FIELD_KEYS.setdefault(k, k)] = v
+  return fields
+
 class Entry(object):
   ''' A class for representing the Entry object in the Wufoo API
   '''
   
-  def __init__(self, fields=None, entry_id=None, date_created=None, created_by=None, date_updated=None, updated_by=None, status=None, purchase_total=None, ip=None, last_page=None, currency=None, transaction_id=None, complete_submission=None, merchant_type=None):
+  __slots__ = ('_fields', '_data', '_entry_id', '_date_created',
+               '_created_by', '_date_updated', '_updated_by', '_status',
+               '_purchase_total', '_ip', '_last_page', '_currency',
+               '_transaction_id', '_complete_submission', '_merchant_type',
+               '_comments', '_parsed_date_created', '_parsed_date_updated')
+
+  # JSON keys of the attributes a lazy instance fills in on first access
+  _JSON_KEYS = {'_entry_id': 'EntryId',
+                '_date_created': 'DateCreated',
+                '_created_by': 'CreatedBy',
+                '_date_updated': 'DateUpdated',
+                '_updated_by': 'UpdatedBy',
+                '_status': 'Status',
+                '_purchase_total': 'PurchaseTotal',
+                '_ip': 'IP',
+                '_last_page': 'LastPage',
+                '_currency': 'Currency',
+                '_transaction_id': 'TransactionId',
+                '_complete_submission': 'CompleteSubmission',
+                '_merchant_type': 'MerchantType'}
+
+  def __init__(self, fields=None, entry_id=None, date_created=None, created_by=None, date_updated=None, updated_by=None, status=None, purchase_total=None, ip=None, last_page=None, currency=None, transaction_id=None, complete_submission=None, merchant_type=None, comments=None):
     self._fields = fields
     self._entry_id=entry_id
     self._date_created=date_created
@@ -628,6 +760,30 @@ class Entry(object):
     self._transaction_id=transaction_id
     self._complete_submission=complete_submission
     self._merchant_type=merchant_type
+    self._comments=comments
+    self._data=None
+
+  def __getstate__(self):
+    return _GetSlotState(self)
+
+  def __setstate__(self, state):
+    _SetSlotState(self, state)
+
+  def __getattr__(self, name):
+    # Only reached for slots left empty by a lazy NewFromJsonDict, which
+    # are filled in from the JSON dict the first time they are read.
+    if name == '_data':
+      raise AttributeError(name)
+    if name == '_fields':
+      value = _EntryFields(self._data)
+    elif name in Entry._JSON_KEYS:
+      value = self._data.get(Entry._JSON_KEYS[name], None)
+    elif name == '_comments':
+      value = None
+    else:
+      raise AttributeError(name)
+    setattr(self, name, value)
+    return value
 
   @property
   def entry_id(self):
@@ -635,7 +791,11 @@ class Entry(object):
 
   @property
   def date_created(self):
-    return dateutil.parser.parse(self._date_created)
+    try:
+      return self._parsed_date_created
+    except AttributeError:
+      self._parsed_date_created = _ParseDate(self._date_created)
+      return self._parsed_date_created
 
   @property
   def created_by(self):
@@ -643,7 +803,11 @@ class Entry(object):
 
   @property
   def date_updated(self):
-    return dateutil.parser.parse(self._date_updated)
+    try:
+      return self._parsed_date_updated
+    except AttributeError:
+      self._parsed_date_updated = _ParseDate(self._date_updated)
+      return self._parsed_date_updated
 
   @property
   def updated_by(self):
@@ -684,6 +848,11 @@ class Entry(object):
   @property 
   def fields(self):
     return self._fields
+
+  @property
+  def comments(self):
+    '''The entry's wufoo.Comment instances, once joined by Api.AttachComments'''
+    return self._comments
     
   def __str__(self):
     '''A string representation of this wufoo.Entry instance.
@@ -745,22 +914,25 @@ class Entry(object):
     return data
     
   @staticmethod
-  def NewFromJsonDict(data):
+  def NewFromJsonDict(data, lazy=False):
     '''Create a new instance based on a JSON dict.
 
     Args:
       data: A JSON dict, as converted from the JSON in the Wufoo API
+      lazy: 
+        Set to True to wrap the dict and only copy out each attribute,
+        and the fields map, when it is first read. A shallow copy of 
+        the dict is kept for the life of the instance, so later changes
+        to data don't show through. [optional]
     Returns:
       A wufoo.Entry instance
     '''
+    if lazy:
+      entry = Entry.__new__(Entry)
+      entry._data = dict(data)
+      return entry
     
-    # Compress the Field[id] values into maps
-    fields = {}
-    for k, v in data.items():
-      if k.startswith('Field'):
-        fields[k] = v
-    
-    return Entry(fields=fields,
+    return Entry(fields=_EntryFields(data),
                   entry_id=data.get('EntryId', None),
                   date_created=data.get('DateCreated', None),
                   created_by=data.get('CreatedBy', None),
@@ -780,6 +952,11 @@ class Report(object):
   '''A class representing the Report structure used by the Wufoo API.
   '''
   
+  __slots__ = ('_link_entries', '_hash', '_name', '_url', '_is_public',
+               '_date_created', '_link_fields', '_link_widgets',
+               '_date_updated', '_link_entries_count', '_description',
+               '_parsed_date_created', '_parsed_date_updated')
+
   def __init__(self, link_entries=None, hash=None, name=None, url=None, is_public=None, date_created=None, link_fields=None, link_widgets=None, date_updated=None, link_entries_count=None, description=None):
     self._link_entries=link_entries
     self._hash=hash
@@ -792,6 +969,12 @@ class Report(object):
     self._date_updated=date_updated
     self._link_entries_count=link_entries_count
     self._description=description
+
+  def __getstate__(self):
+    return _GetSlotState(self)
+
+  def __setstate__(self, state):
+    _SetSlotState(self, state)
     
   @property
   def link_entries(self):
@@ -815,7 +998,11 @@ class Report(object):
 
   @property
   def date_created(self):
-    return dateutil.parser.parse(self._date_created)
+    try:
+      return self._parsed_date_created
+    except AttributeError:
+      self._parsed_date_created = _ParseDate(self._date_created)
+      return self._parsed_date_created
 
   @property
   def link_fields(self):
@@ -827,7 +1014,11 @@ class Report(object):
 
   @property
   def date_updated(self):
-    return dateutil.parser.parse(self._date_updated)
+    try:
+      return self._parsed_date_updated
+    except AttributeError:
+      self._parsed_date_updated = _ParseDate(self._date_updated)
+      return self._parsed_date_updated
 
   @property
   def link_entries_count(self):
@@ -913,6 +1104,13 @@ class Report(object):
 class Form(object):
   ''' A class for representing the data in a Wufoo Form
   '''
+  __slots__ = ('_start_date', '_link_entries', '_end_date', '_name',
+               '_language', '_url', '_redirect_message', '_is_public',
+               '_date_created', '_link_fields', '_entry_limit', '_hash',
+               '_date_updated', '_email', '_link_entries_count',
+               '_description', '_parsed_start_date', '_parsed_end_date',
+               '_parsed_date_created', '_parsed_date_updated')
+
   def __init__(self,
                start_date=None,
                link_entries=None,
@@ -946,10 +1144,20 @@ class Form(object):
     self._email=email
     self._link_entries_count=link_entries_count
     self._description=description
+
+  def __getstate__(self):
+    return _GetSlotState(self)
+
+  def __setstate__(self, state):
+    _SetSlotState(self, state)
     
   @property
   def start_date(self):
-    return dateutil.parser.parse(self._start_date)
+    try:
+      return self._parsed_start_date
+    except AttributeError:
+      self._parsed_start_date = _ParseDate(self._start_date)
+      return self._parsed_start_date
 
   @property
   def link_entries(self):
@@ -957,7 +1165,11 @@ class Form(object):
 
   @property
   def end_date(self):
-    return dateutil.parser.parse(self._end_date)
+    try:
+      return self._parsed_end_date
+    except AttributeError:
+      self._parsed_end_date = _ParseDate(self._end_date)
+      return self._parsed_end_date
 
   @property
   def name(self):
@@ -981,7 +1193,11 @@ class Form(object):
 
   @property
   def date_created(self):
-    return dateutil.parser.parse(self._date_created)
+    try:
+      return self._parsed_date_created
+    except AttributeError:
+      self._parsed_date_created = _ParseDate(self._date_created)
+      return self._parsed_date_created
 
   @property
   def link_fields(self):
@@ -997,7 +1213,11 @@ class Form(object):
 
   @property
   def date_updated(self):
-    return dateutil.parser.parse(self._date_updated)
+    try:
+      return self._parsed_date_updated
+    except AttributeError:
+      self._parsed_date_updated = _ParseDate(self._date_updated)
+      return self._parsed_date_updated
 
   @property
   def email(self):
@@ -1101,271 +1321,1799 @@ class Form(object):
 
 # ----------------------------------------
 #
-# API class
+# Typed field values
 #
 # ----------------------------------------
 
-class Api(object):
-
-  _API_REALM = 'Wufoo API'
+def _DecodeNumber(value):
+  try:
+    return int(value)
+  except ValueError:
+    return float(value)
+
+def _DecodeMoney(value):
+  return decimal.Decimal(value.replace(',', '').strip('$ '))
+
+def _DecodeDate(value):
+  # Date fields come back as YYYYMMDD
+  if len(value) == 8 and value.isdigit():
+    return datetime.date(int(value[:4]), int(value[4:6]), int(value[6:]))
+  return _ParseDate(value).date()
+
+# Converters of field values, by Field.type
+_FIELD_DECODERS = {'number': _DecodeNumber,
+                   'money': _DecodeMoney,
+                   'rating': int,
+                   'date': _DecodeDate}
+
+# Values that raise these are left as they came
+_DECODE_ERRORS = (ArithmeticError, KeyError, TypeError, ValueError)
+
+def _FieldSignature(fields):
+  # Everything a FieldDecoder is compiled from, to tell when a form's 
+  # fields have changed. System fields are left out.
+  return tuple([(f.id, f.type, f.label,
+                 _FieldSignature(f.subfields or []),
+                 tuple([(c.label, c.score) for c in f.choices or []]))
+                for f in fields if f.id and f.id.startswith('Field')])
+
+class FieldDecoder(object):
+  '''Converts the strings of Entry.fields into typed values.
+
+  A decoder is compiled from a form's fields, see Api.GetFieldDecoder:
+
+  * number fields become ints or floats, money fields Decimals, rating
+    fields ints and date fields datetime.dates
+  * each statement of a likert field becomes the Score of its choice
+  * a checkbox field becomes the list of its checked values, under the
+    checkbox field's ID in place of its subfields
+
+  Empty values of these fields become None. Values that don't parse 
+  and all other fields are left as they are.
+  '''
 
-  def __init__(self,
-               subdomain,
-               apikey,
-               input_encoding=None,
-               request_headers=None):
-    '''Instantiate a new wufoo.Api object.
+  def __init__(self, fields):
+    '''Compile a new wufoo.FieldDecoder object.
 
     Args:
-      subdomain: The subdomain of the Wufoo account
-      apikey: The API key of the Wufoo account. 
-      input_encoding: The encoding used to encode input strings. [optional]
-      request_header: A dictionary of additional HTTP request headers. [optional]
+      fields: The wufoo.Field list of a form, from GetFieldsForForm
     '''
-    self._urllib = urllib2
-    self._InitializeRequestHeaders(request_headers)
-    self._InitializeUserAgent()
-    self._InitializeDefaultParameters()
-    self._input_encoding = input_encoding
-    self.SetCredentials(apikey)
-    self.SetSubdomain(subdomain)
-
-  def SetSubdomain(self, subdomain):
-    self._subdomain = subdomain
-    
-  def SetCredentials(self, apikey):
-    self._apikey = apikey
-
-  def GetFieldsForForm(self, form_hash, system=None):
-    return self._GetFields('forms', form_hash, system)
-    
-  def GetFieldsForReport(self, report_hash, system=None):
-    return self._GetFields('reports', report_hash, system)
+    self._signature = _FieldSignature(fields)
+    self._converters = []
+    self._checkboxes = []
+    for field in fields:
+      if not field.id or not field.id.startswith('Field'):
+        continue
+      if field.type == 'checkbox' and field.subfields:
+        self._checkboxes.append((field.id, [x.id for x in field.subfields]))
+      elif field.type == 'likert' and field.subfields:
+        scores = dict([(x.label, x.score) for x in field.choices or []])
+        for subfield in field.subfields:
+          self._converters.append((subfield.id, scores.__getitem__))
+      elif field.type in _FIELD_DECODERS:
+        self._converters.append((field.id, _FIELD_DECODERS[field.type]))
+
+  def DecodeEntry(self, entry):
+    '''The typed field values of an entry.
 
-  def _GetFields(self, for_what, identifier, system=None):
-    '''Fetch all the fields.
+    Args:
+      entry: A wufoo.Entry instance
 
     Returns:
-      A sequence of wufoo.Field instances, one for each field
+      A dict of field IDs to values
     '''
-    parameters = {}
-    if system:
-      parameters['system'] = system
-      
-    url = "https://%s.wufoo.com/api/v3/%s/%s/fields.json" % (self._subdomain, for_what, identifier)
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
-        
-    return [Field.NewFromJsonDict(x) for x in data['Fields']]
+    return self._Decode(entry.fields or {}, None)
 
-  def GetForms(self):
-    '''Fetch the sequence of all forms for a user.
+  def Decode(self, entries):
+    '''The typed field values of many entries, in one pass.
+
+    Values that repeat across entries, such as dates and likert 
+    choices, are only converted once.
+
+    Args:
+      entries: An iterable of wufoo.Entry instances
 
     Returns:
-      A sequence of wufoo.Form instances, one for each form
+      A list of dicts of field IDs to values, one per entry
     '''
-    parameters = {}
-    url = "https://%s.wufoo.com/api/v3/forms.json" % self._subdomain
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
-    
-    return [Form.NewFromJsonDict(x) for x in data['Forms']]
+    memos = dict([(id, {}) for id, convert in self._converters])
+    return [self._Decode(entry.fields or {}, memos) for entry in entries]
+
+  def _Decode(self, fields, memos):
+    values = dict(fields)
+    for id, convert in self._converters:
+      value = values.get(id)
+      if not value:
+        if id in values:
+          values[id] = None
+        continue
+      if memos is not None and value in memos[id]:
+        values[id] = memos[id][value]
+        continue
+      try:
+        result = convert(value)
+      except _DECODE_ERRORS:
+        result = value
+      if memos is not None:
+        memos[id][value] = result
+      values[id] = result
+    for id, subfield_ids in self._checkboxes:
+      checked = [values.pop(x) for x in subfield_ids if x in values]
+      if checked:
+        values[id] = [x for x in checked if x]
+    return values
 
-  def GetForm(self, hash):
-    '''Fetch a single form for a user.
+# ----------------------------------------
+#
+# JSON streaming
+#
+# ----------------------------------------
 
-    Args:
-      hash:
-        Returns the Form with the specified hash
-    
-    Returns:
-      The wufoo.Form instance that corresponds to the given hash
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+class _JsonStreamReader(object):
+  '''Reads JSON tokens and values from a file-like object, a chunk at a time.'''
+
+  def __init__(self, fp, chunk_size=8192):
+    self._fp = fp
+    self._chunk_size = chunk_size
+    self._decoder = simplejson.JSONDecoder()
+    self._buffer = ''
+    self._pos = 0
+    self._eof = False
+
+  def Next(self):
+    '''Consume and return the next non-whitespace character.'''
+    char = self.Peek()
+    if not char:
+      raise ValueError('Unexpected end of JSON data')
+    self._pos += 1
+    return char
+
+  def Peek(self):
+    '''The next non-whitespace character, or '' at the end of the data.'''
+    while True:
+      self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+      if self._pos < len(self._buffer) or not self._Fill():
+        return self._buffer[self._pos:self._pos + 1]
+
+  def Expect(self, char):
+    if self.Next() != char:
+      raise ValueError('Expected %r in JSON data' % char)
+
+  def Value(self):
+    '''Consume and decode the next JSON value.'''
+    self.Peek()
+    while True:
+      try:
+        value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        # A number at the end of the buffer may continue in the next chunk
+        if end < len(self._buffer) or self._eof:
+          self._pos = end
+          return value
+      except ValueError:
+        if self._eof:
+          raise
+      self._Fill()
+
+  def _Fill(self):
+    # Drop what has been consumed and read more. A value larger than a
+    # chunk doubles the read size, so it is not re-scanned too often.
+    if self._eof:
+      return False
+    chunk = self._fp.read(max(self._chunk_size, len(self._buffer) - self._pos))
+    if not chunk:
+      self._eof = True
+      return False
+    self._buffer = self._buffer[self._pos:] + chunk
+    self._pos = 0
+    return True
+
+def _IterJsonArray(fp, key):
+  '''Decode the array under a key of a JSON object read from fp.
+
+  Items are yielded as soon as they have been read, so the whole
+  document is never held in memory.
+  '''
+  reader = _JsonStreamReader(fp)
+  reader.Expect('{')
+  if reader.Peek() == '}':
+    raise KeyError(key)
+  while True:
+    name = reader.Value()
+    reader.Expect(':')
+    if name != key:
+      reader.Value()
+    else:
+      reader.Expect('[')
+      if reader.Peek() == ']':
+        return
+      while True:
+        yield reader.Value()
+        if reader.Peek() == ']':
+          return
+        reader.Expect(',')
+    if reader.Peek() == '}':
+      raise KeyError(key)
+    reader.Expect(',')
 
-    '''
-    parameters = {}
-    url = "https://%s.wufoo.com/api/v3/forms/%s.json" % (self._subdomain, hash)
-    
-    try:
-      json = self._FetchUrl(url, parameters=parameters)
-    except HTTPError, ef:
-      if ef.msg == 'Invalid identifier.':
-        raise WufooError(ef.msg)
-      else:
-        # A different type of HTTP error
-        raise ef
-      
-    data = simplejson.loads(json)
-  
-    return Form.NewFromJsonDict(data['Forms'][0])
+# ----------------------------------------
+#
+# Instrumentation
+#
+# ----------------------------------------
 
-  def GetReports(self):
-    '''Fetch the sequence of all reports for a user.
-    
-    Returns:
-      A sequence of wufoo.Report instances, one for each report
-    '''
-    parameters = {}
-    url = "https://%s.wufoo.com/api/v3/reports.json" % self._subdomain
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
-    
-    return [Report.NewFromJsonDict(x) for x in data['Reports']]   
-    
-  def GetReport(self, hash):
-    '''Fetch a single report for a user.
+class RequestStats(object):
+  '''What one request to the Wufoo API cost.
+
+  Attributes:
+    endpoint: The endpoint template, such as 'forms/{hash}/entries'
+    method: 'GET' or 'POST'
+    url: The URL requested
+    status: The HTTP status code, if a response came back
+    cached: True if the response came from the cache
+    stale: 
+      True if the cached response had expired, and was served while it
+      is revalidated in the background
+    bytes: Size of the response body
+    network_time: Seconds spent sending the request and reading the response
+    decode_time: Seconds spent decoding the JSON
+    build_time: Seconds spent building model instances
+    error: The exception the request failed with, or None
+  '''
 
-    Args:
-      hash:
-        Returns the Report with the specified hash
-    
-    Returns:
-      The wufoo.Report instance that corresponds to the given hash
+  def __init__(self, method='GET'):
+    self.endpoint = None
+    self.method = method
+    self.url = None
+    self.status = None
+    self.cached = False
+    self.stale = False
+    self.bytes = 0
+    self.network_time = 0.0
+    self.decode_time = 0.0
+    self.build_time = 0.0
+    self.error = None
 
-    '''
-    parameters = {}
-    url = "https://%s.wufoo.com/api/v3/reports/%s.json" % (self._subdomain, hash)
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
+  @property
+  def total_time(self):
+    return self.network_time + self.decode_time + self.build_time
 
-    if data['Reports'][0] is None:
-      raise WufooError('Invalid identifier.')
+  def __str__(self):
+    return '%s %s %d bytes network=%.1fms decode=%.1fms build=%.1fms' % (
+      self.method, self.endpoint, self.bytes, self.network_time * 1000, 
+      self.decode_time * 1000, self.build_time * 1000)
 
-    return Report.NewFromJsonDict(data['Reports'][0])
-  
-  def GetFormEntryCount(self, hash):
-    '''Fetch the entry count for a Form
-    
-    Args:
-      hash:
-        Returns the count of the entries for the Form with the specified hash
-    
-    Returns:
-      An integer count of the number of entries
-    '''    
-    parameters = {}
-    
-    url = "https://%s.wufoo.com/api/v3/forms/%s/entries/count.json" % (self._subdomain, hash)
-    
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
+class LatencyHistogram(object):
+  '''Counts of latencies in fixed, roughly logarithmic buckets.'''
 
-    return int(data['EntryCount'])
-  
-  def GetReportEntryCount(self, hash):
-    '''Fetch the entry count for a Report
+  # Upper bounds of the buckets, in seconds. Anything slower lands in a
+  # final overflow bucket.
+  BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+            1.0, 2.5, 5.0, 10.0, 25.0, 60.0)
 
-    Args:
-      hash:
-        Returns the count of the entries for the Report with the specified hash
+  def __init__(self):
+    self._counts = [0] * (len(LatencyHistogram.BOUNDS) + 1)
+    self._count = 0
+    self._sum = 0.0
+    self._max = 0.0
 
-    Returns:
-      An integer count of the number of entries
-    '''
-    parameters = {}
+  @property
+  def count(self):
+    return self._count
 
-    url = "https://%s.wufoo.com/api/v3/reports/%s/entries/count.json" % (self._subdomain, hash)
+  @property
+  def sum(self):
+    return self._sum
 
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
+  @property
+  def max(self):
+    return self._max
 
-    return int(data['EntryCount']) 
-    
-  def GetEntriesForForm(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
-    return self._GetEntries(hash, 'forms', system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
+  def Add(self, seconds):
+    self._counts[bisect.bisect_left(LatencyHistogram.BOUNDS, seconds)] += 1
+    self._count += 1
+    self._sum += seconds
+    self._max = max(self._max, seconds)
 
-  def GetEntriesForReport(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
-    return self._GetEntries(hash, 'reports', system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
-    
-  def _GetEntries(self, hash, for_what, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
-    '''Fetch all entries related to a Report or Form
+  def Percentile(self, percent):
+    '''The upper bound of the bucket holding the given percentile.
 
     Args:
-      for_what:
-        Either "form" or "report"
-      hash:
-        Returns the Entries from the form with the specified hash
-      system:
-        Set to True to include system fields
-      filter:
-        List of filters applied to the results
-      match:
-        'AND' or 'OR' to chain together filters
-      sort_id:
-        Field ID to sort on. See the Field API
-      sort_direction:
-        Sort direction, either ASC or DESC
-      page_start:
-        Page to start on (0 by default)
-      page_end:
-        Page to end on
+      percent: A number between 0 and 100
 
     Returns:
-      Set of wufoo.Entry instances that corresponds to the given Report or Form
+      Seconds, or None if nothing was added
     '''
-    parameters = {}
-    if system:
-      parameters['system'] = 'true'
-    if sort_id:
-      parameters['sort'] = sort_id
-    if sort_direction:
-      parameters['sortDirection'] = sort_direction
-    if page_start:
-      parameters['pageStart'] = page_start
-    if page_size:
-      parameters['pageSize'] = page_size
-    if match:
-      parameters['match'] = match
-    if filters:
-      try:
-        # Is it a list of filter objects?
-        for (i, f) in zip(range(len(filters)), filters):
-          parameters['Filter'+str(i)] = str(f)
-      except (TypeError):
-        # It's just one filter?
-        parameters['Filter1'] = str(filters)
+    if not self._count:
+      return None
+    rank = max(1, int(math.ceil(self._count * percent / 100.0)))
+    seen = 0
+    for bound, count in zip(LatencyHistogram.BOUNDS, self._counts):
+      seen += count
+      if seen >= rank:
+        return min(bound, self._max)
+    return self._max
 
-    url = "https://%s.wufoo.com/api/v3/%s/%s/entries.json" % (self._subdomain, for_what, hash)
-    
-    # The filter can't have the + signs url encoded.
-    def re_plus(s):
-      return s.replace('%2B', '+')
-    
-    json = self._FetchUrl(url, parameters=parameters, url_post_process=re_plus)
-    data = simplejson.loads(json)
+  def AsDict(self):
+    '''A dict representation of this wufoo.LatencyHistogram instance.
 
-    return [Entry.NewFromJsonDict(x) for x in data['Entries']]
-  
-  def GetUsers(self):
-    url = "https://%s.wufoo.com/api/v3/users.json" % (self._subdomain)
-    json = self._FetchUrl(url, parameters={})
-    data = simplejson.loads(json)
-    return [User.NewFromJsonDict(x) for x in data['Users']]
+    Return:
+      A dict with the count, sum and max, and a list of 
+      [upper bound, count] buckets. The overflow bucket's bound is None.
+    '''
+    bounds = list(LatencyHistogram.BOUNDS) + [None]
+    return {'count': self._count,
+            'sum': self._sum,
+            'max': self._max,
+            'buckets': [[b, c] for b, c in zip(bounds, self._counts) if c]}
+
+class RequestMetrics(object):
+  '''Latency histograms of every request, per endpoint.
+
+  Each endpoint keeps a histogram of the total time of its requests and
+  one of each of the network, decode and build phases, as well as
+  counts of requests, errors and bytes transferred.
+  '''
 
-  def GetWidgets(self, report_hash):
-    url = "https://%s.wufoo.com/api/v3/reports/%s/widgets.json" % (self._subdomain, report_hash)
-    json = self._FetchUrl(url, parameters={})
-    data = simplejson.loads(json)
-    return [Widget.NewFromJsonDict(x, self._subdomain) for x in data['Widgets']]
+  PHASES = ('total', 'network', 'decode', 'build')
 
-  def GetComments(self, form_hash, entry_id=None, page_start=None, page_size=None):
-    '''Fetch all comments related to a Form
+  def __init__(self):
+    self._endpoints = {}
+    self._lock = threading.Lock()
 
-    Args:
-      for_what:
-        Either "form" or "report"
-      form_hash:
-        Returns the Entries from the form with the specified hash
-      entry_id
-        Return only comments from a specific entry
-      page_start:
-        Page to start on (0 by default)
-      page_size:
-        Number of comments per page
+  def Record(self, stats):
+    '''Add a wufoo.RequestStats to the histograms.'''
+    self._lock.acquire()
+    try:
+      metrics = self._endpoints.get(stats.endpoint)
+      if metrics is None:
+        metrics = self._endpoints[stats.endpoint] = {
+          'requests': 0, 'errors': 0, 'cached': 0, 'bytes': 0,
+          'histograms': dict([(p, LatencyHistogram()) for p in RequestMetrics.PHASES])}
+      metrics['requests'] += 1
+      metrics['bytes'] += stats.bytes
+      if stats.error is not None:
+        metrics['errors'] += 1
+      if stats.cached:
+        metrics['cached'] += 1
+      histograms = metrics['histograms']
+      histograms['total'].Add(stats.total_time)
+      histograms['network'].Add(stats.network_time)
+      histograms['decode'].Add(stats.decode_time)
+      histograms['build'].Add(stats.build_time)
+    finally:
+      self._lock.release()
+
+  def GetEndpoints(self):
+    self._lock.acquire()
+    try:
+      return sorted(self._endpoints.keys())
+    finally:
+      self._lock.release()
 
-    Returns:
-      Set of wufoo.Comment instances that corresponds to the given Form
-    '''
-    parameters = {}
+  def GetHistogram(self, endpoint, phase='total'):
+    '''The wufoo.LatencyHistogram of one phase of an endpoint, or None.'''
+    self._lock.acquire()
+    try:
+      metrics = self._endpoints.get(endpoint)
+      if metrics is None:
+        return None
+      return metrics['histograms'][phase]
+    finally:
+      self._lock.release()
+
+  def Clear(self):
+    self._lock.acquire()
+    try:
+      self._endpoints = {}
+    finally:
+      self._lock.release()
+
+  def AsDict(self):
+    '''A dict of endpoint to its counters and histograms, ready for JSON.'''
+    self._lock.acquire()
+    try:
+      data = {}
+      for endpoint, metrics in self._endpoints.items():
+        data[endpoint] = {
+          'requests': metrics['requests'],
+          'errors': metrics['errors'],
+          'cached': metrics['cached'],
+          'bytes': metrics['bytes'],
+          'histograms': dict([(p, h.AsDict()) for p, h in metrics['histograms'].items()])}
+      return data
+    finally:
+      self._lock.release()
+
+  def AsJsonString(self):
+    return simplejson.dumps(self.AsDict(), sort_keys=True)
+
+class _MeteredFile(object):
+  '''Adds the time spent reading a response, and its size, to a RequestStats.'''
+
+  def __init__(self, fp, stats):
+    self._fp = fp
+    self._stats = stats
+
+  def read(self, size=-1):
+    start = time.time()
+    if size is None or size < 0:
+      data = self._fp.read()
+    else:
+      data = self._fp.read(size)
+    self._stats.network_time += time.time() - start
+    self._stats.bytes += len(data)
+    return data
+
+  def close(self):
+    if hasattr(self._fp, 'close'):
+      self._fp.close()
+
+# ----------------------------------------
+#
+# Caching
+#
+# ----------------------------------------
+
+# Seconds responses stay fresh in the cache, by endpoint template. 
+# Endpoints not listed here are never cached.
+DEFAULT_CACHE_TIMEOUTS = {
+  'forms': 300,
+  'forms/{hash}': 300,
+  'forms/{hash}/fields': 300,
+  'reports': 300,
+  'reports/{hash}': 300,
+  'reports/{hash}/fields': 300,
+  'reports/{hash}/widgets': 300,
+  'users': 300,
+}
+
+# Endpoints whose expired responses may be served while they are
+# revalidated, see Api.SetStaleWhileRevalidate
+STALE_WHILE_REVALIDATE_ENDPOINTS = ('forms',
+                                    'forms/{hash}',
+                                    'forms/{hash}/fields',
+                                    'reports',
+                                    'reports/{hash}/fields')
+
+def _KeepPlusSigns(url):
+  # Filters can't have their + signs url encoded
+  return url.replace('%2B', '+')
+
+def _EndpointTemplate(url):
+  '''The endpoint a URL is for, with the identifier replaced by {hash}.
+
+  For example https://x.wufoo.com/api/v3/forms/m7x3p9/entries.json?a=b
+  is for 'forms/{hash}/entries'.
+  '''
+  path = urlparse.urlparse(url)[2]
+  if '/api/v3/' in path:
+    path = path.split('/api/v3/', 1)[1]
+  if path.endswith('.json'):
+    path = path[:-len('.json')]
+  parts = path.strip('/').split('/')
+  if len(parts) > 1:
+    parts[1] = '{hash}'
+  return '/'.join(parts)
+
+class _LruDict(object):
+  '''A dict that remembers the order keys were last used in.
+
+  Keys are kept in a circular doubly linked list, most recently used at
+  the end, so every operation is constant time.
+  '''
+
+  def __init__(self):
+    self._map = {}
+    self._root = root = []
+    root[:] = [root, root, None, None]
+
+  def __len__(self):
+    return len(self._map)
+
+  def __contains__(self, key):
+    return key in self._map
+
+  def Get(self, key, default=None):
+    link = self._map.get(key)
+    if link is None:
+      return default
+    self._Unlink(link)
+    self._Append(link)
+    return link[3]
+
+  def Set(self, key, value):
+    link = self._map.get(key)
+    if link is None:
+      link = self._map[key] = [None, None, key, value]
+    else:
+      self._Unlink(link)
+      link[3] = value
+    self._Append(link)
+
+  def Pop(self, key, default=None):
+    link = self._map.pop(key, None)
+    if link is None:
+      return default
+    self._Unlink(link)
+    return link[3]
+
+  def PopOldest(self):
+    '''Remove and return the (key, value) used longest ago.'''
+    link = self._root[1]
+    if link is self._root:
+      raise KeyError('PopOldest from an empty _LruDict')
+    del self._map[link[2]]
+    self._Unlink(link)
+    return link[2], link[3]
+
+  def _Unlink(self, link):
+    prev, next = link[0], link[1]
+    prev[1] = next
+    next[0] = prev
+
+  def _Append(self, link):
+    root = self._root
+    last = root[0]
+    link[0] = last
+    link[1] = root
+    last[1] = root[0] = link
+
+class CachedResponse(object):
+  '''A response body kept in a cache, with its validators.'''
+
+  def __init__(self, body, timestamp=None, etag=None, last_modified=None):
+    self._body = body
+    self._timestamp = timestamp or time.time()
+    self._etag = etag
+    self._last_modified = last_modified
+
+  @property
+  def body(self):
+    return self._body
+
+  @property
+  def timestamp(self):
+    return self._timestamp
+
+  @property
+  def etag(self):
+    return self._etag
+
+  @property
+  def last_modified(self):
+    return self._last_modified
+
+class ResponseCache(object):
+  '''A thread-safe, in-memory cache of API responses.
+
+  Least recently used responses are evicted once the bodies kept add up
+  to more than max_bytes. Any object with the same Get, Set and Remove 
+  methods can be passed to Api.SetCache instead, for example one backed
+  by memcache.
+  '''
+
+  def __init__(self, max_bytes=16 * 1024 * 1024):
+    '''Instantiate a new wufoo.ResponseCache object.
+
+    Args:
+      max_bytes: Total size of the response bodies kept [optional]
+    '''
+    self._max_bytes = max_bytes
+    self._bytes = 0
+    self._entries = _LruDict()
+    self._lock = threading.Lock()
+
+  @property
+  def size(self):
+    '''Total size of the response bodies currently kept.'''
+    return self._bytes
+
+  def Get(self, key):
+    '''Fetch a wufoo.CachedResponse, or None if the key isn't cached.'''
+    self._lock.acquire()
+    try:
+      return self._entries.Get(key)
+    finally:
+      self._lock.release()
+
+  def Set(self, key, response):
+    '''Keep a wufoo.CachedResponse, evicting older ones to make room.'''
+    self._lock.acquire()
+    try:
+      old = self._entries.Pop(key)
+      if old is not None:
+        self._bytes -= len(old.body)
+      if len(response.body) > self._max_bytes:
+        return
+      self._entries.Set(key, response)
+      self._bytes += len(response.body)
+      while self._bytes > self._max_bytes:
+        oldest_key, oldest = self._entries.PopOldest()
+        self._bytes -= len(oldest.body)
+    finally:
+      self._lock.release()
+
+  def Remove(self, key):
+    '''Drop a key from the cache.'''
+    self._lock.acquire()
+    try:
+      old = self._entries.Pop(key)
+      if old is not None:
+        self._bytes -= len(old.body)
+    finally:
+      self._lock.release()
+
+class NegativeCache(object):
+  '''A thread-safe, bounded cache of identifiers Wufoo reported invalid.
+
+  Identifiers are forgotten timeout seconds after they were added, and
+  the least recently used are dropped once max_items are kept. Any 
+  object with the same Add, Contains and Remove methods can be passed
+  to Api.SetNegativeCache instead.
+  '''
+
+  def __init__(self, max_items=1024, timeout=60):
+    '''Instantiate a new wufoo.NegativeCache object.
+
+    Args:
+      max_items: Number of identifiers kept [optional]
+      timeout: Seconds an identifier is kept [optional]
+    '''
+    self._max_items = max_items
+    self._timeout = timeout
+    self._entries = _LruDict()
+    self._lock = threading.Lock()
+    self._clock = time.time
+
+  def __len__(self):
+    return len(self._entries)
+
+  def Add(self, key):
+    '''Remember that a key is invalid, for the next timeout seconds.'''
+    self._lock.acquire()
+    try:
+      self._entries.Set(key, self._clock())
+      while len(self._entries) > self._max_items:
+        self._entries.PopOldest()
+    finally:
+      self._lock.release()
+
+  def Contains(self, key):
+    '''Returns True if a key was found invalid less than timeout seconds ago.'''
+    self._lock.acquire()
+    try:
+      added = self._entries.Get(key)
+      if added is None:
+        return False
+      if self._clock() - added >= self._timeout:
+        self._entries.Pop(key)
+        return False
+      return True
+    finally:
+      self._lock.release()
+
+  def Remove(self, key):
+    '''Forget a key, once it is known to be valid.'''
+    self._lock.acquire()
+    try:
+      self._entries.Pop(key)
+    finally:
+      self._lock.release()
+
+# ----------------------------------------
+#
+# Rate limiting
+#
+# ----------------------------------------
+
+class _TokenBucket(object):
+
+  def __init__(self, rate, burst, now):
+    self.max_rate = self.rate = float(rate)
+    self.burst = float(burst)
+    self.tokens = float(burst)
+    self.updated = now
+    self.paused_until = now
+
+  def Refill(self, now):
+    elapsed = max(0, now - self.updated)
+    self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+    self.updated = now
+
+class RateLimiter(object):
+  '''A token bucket per subdomain that paces requests to the Wufoo API.
+
+  One limiter can be shared by every thread and every Api instance
+  talking to the same accounts. When the API answers that too many
+  requests were made, the rate of that subdomain is halved and the 
+  request is retried after a backoff with random jitter; every
+  successful request then raises the rate again, up to its budget.
+
+  POSTs are only retried after a 429, which the API sends before doing
+  anything with a request. After a 503 the entry may have been created,
+  so the error is raised for the caller to decide.
+  '''
+  
+  # Status codes the API uses to ask clients to slow down
+  _THROTTLE_CODES = (429, 503)
+
+  def __init__(self, rate=5, burst=10, budgets=None, max_retries=5,
+               max_backoff=60):
+    '''Instantiate a new wufoo.RateLimiter object.
+
+    Args:
+      rate: Requests per second allowed per subdomain [optional]
+      burst: Requests allowed at once after being idle [optional]
+      budgets: 
+        A dict of subdomain to (rate, burst) overriding the defaults 
+        [optional]
+      max_retries: Times a throttled request is retried [optional]
+      max_backoff: Longest wait in seconds between retries [optional]
+    '''
+    self._rate = rate
+    self._burst = burst
+    self._budgets = budgets or {}
+    self._max_retries = max_retries
+    self._max_backoff = max_backoff
+    self._buckets = {}
+    self._lock = threading.Lock()
+    self._clock = time.time
+    self._sleep = time.sleep
+    self._random = random.random
+
+  @property
+  def max_retries(self):
+    return self._max_retries
+
+  def SetBudget(self, subdomain, rate, burst):
+    '''Override the rate and burst allowed for one subdomain.'''
+    self._lock.acquire()
+    try:
+      self._budgets[subdomain] = (rate, burst)
+      self._buckets.pop(subdomain, None)
+    finally:
+      self._lock.release()
+
+  def GetRate(self, subdomain):
+    '''The requests per second currently allowed for a subdomain.'''
+    self._lock.acquire()
+    try:
+      return self._Bucket(subdomain, self._clock()).rate
+    finally:
+      self._lock.release()
+
+  def Acquire(self, subdomain):
+    '''Block until a request to the subdomain may be made.'''
+    self._lock.acquire()
+    try:
+      now = self._clock()
+      bucket = self._Bucket(subdomain, now)
+      bucket.Refill(now)
+      # Take the token now, even if it goes negative, so concurrent 
+      # callers queue up behind each other instead of all waking at once.
+      bucket.tokens -= 1
+      wait = max(bucket.paused_until - now, 0)
+      if bucket.tokens < 0:
+        wait = max(wait, -bucket.tokens / bucket.rate)
+    finally:
+      self._lock.release()
+    if wait > 0:
+      self._sleep(wait)
+
+  def IsThrottled(self, error):
+    '''Returns True if an HTTPError asks the client to slow down.'''
+    return getattr(error, 'code', None) in RateLimiter._THROTTLE_CODES
+
+  def Throttled(self, subdomain, attempt, retry_after=None):
+    '''Slow a subdomain down after the API throttled a request.
+
+    Args:
+      subdomain: The subdomain that was throttled
+      attempt: Number of times this request was already retried
+      retry_after: Seconds the API asked to wait, if it said [optional]
+
+    Returns:
+      Seconds every request to the subdomain is held back for
+    '''
+    if retry_after is None:
+      # Equal jitter, half the delay plus a random share of the other
+      # half, spreads out the retries of concurrent callers
+      delay = min(self._max_backoff, 2 ** attempt)
+      delay = delay * (0.5 + self._random() / 2)
+    else:
+      delay = min(self._max_backoff, retry_after)
+    self._lock.acquire()
+    try:
+      now = self._clock()
+      bucket = self._Bucket(subdomain, now)
+      bucket.rate = max(bucket.rate / 2, bucket.max_rate / 64)
+      bucket.tokens = min(bucket.tokens, 0)
+      bucket.paused_until = max(bucket.paused_until, now + delay)
+    finally:
+      self._lock.release()
+    return delay
+
+  def Succeeded(self, subdomain):
+    '''Speed a subdomain back up after a request went through.'''
+    self._lock.acquire()
+    try:
+      bucket = self._Bucket(subdomain, self._clock())
+      if bucket.rate < bucket.max_rate:
+        bucket.rate = min(bucket.max_rate, bucket.rate + bucket.max_rate / 16)
+    finally:
+      self._lock.release()
+
+  def _Bucket(self, subdomain, now):
+    bucket = self._buckets.get(subdomain)
+    if bucket is None:
+      rate, burst = self._budgets.get(subdomain, (self._rate, self._burst))
+      bucket = self._buckets[subdomain] = _TokenBucket(rate, burst, now)
+    return bucket
+
+def _RetryAfter(error):
+  '''The seconds an HTTPError's Retry-After header asks to wait, or None.'''
+  headers = getattr(error, 'hdrs', None)
+  if headers is None:
+    return None
+  try:
+    return max(0, int(headers.get('Retry-After')))
+  except (TypeError, ValueError):
+    return None
+
+# ----------------------------------------
+#
+# Concurrency helpers
+#
+# ----------------------------------------
+
+class Future(object):
+  '''The pending result of a call running on a background thread.'''
+
+  def __init__(self):
+    self._done = threading.Event()
+    self._result = None
+    self._exc_info = None
+    self._callbacks = []
+    self._lock = threading.Lock()
+
+  def Done(self):
+    '''Returns True once the call has finished.'''
+    return self._done.isSet()
+
+  def AddDoneCallback(self, callback):
+    '''Call callback(future) once the call has finished.
+
+    The callback runs on the thread that finished the call, or right away
+    if the call is already done.
+    '''
+    self._lock.acquire()
+    try:
+      if not self._done.isSet():
+        self._callbacks.append(callback)
+        return
+    finally:
+      self._lock.release()
+    callback(self)
+
+  def Result(self, timeout=None):
+    '''Wait for the call to finish and return its result.
+
+    Any exception raised by the call is raised again here.
+    '''
+    self._done.wait(timeout)
+    if not self._done.isSet():
+      raise WufooError('Timed out waiting for a result.')
+    if self._exc_info:
+      raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+    return self._result
+
+  def _Run(self, func, args, kwargs):
+    try:
+      self._result = func(*args, **kwargs)
+    except:
+      self._exc_info = sys.exc_info()
+    self._lock.acquire()
+    try:
+      self._done.set()
+      callbacks, self._callbacks = self._callbacks, []
+    finally:
+      self._lock.release()
+    for callback in callbacks:
+      callback(self)
+
+class _WorkerPool(object):
+  '''A fixed number of daemon threads running submitted calls.'''
+
+  def __init__(self, size):
+    self._queue = Queue.Queue()
+    self._threads = []
+    for i in range(size):
+      thread = threading.Thread(target=self._Work)
+      thread.setDaemon(True)
+      thread.start()
+      self._threads.append(thread)
+
+  def Submit(self, func, *args, **kwargs):
+    '''Queue a call and return a Future for its result.'''
+    future = Future()
+    self._queue.put((future, func, args, kwargs))
+    return future
+
+  def Close(self):
+    '''Stop the threads once the calls already queued have run.'''
+    for thread in self._threads:
+      self._queue.put(None)
+
+  def _Work(self):
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+      future, func, args, kwargs = item
+      future._Run(func, args, kwargs)
+
+class _SingleFlight(object):
+  '''Runs concurrent calls with the same key once, sharing the outcome.'''
+
+  def __init__(self):
+    self._calls = {}
+    self._lock = threading.Lock()
+
+  def Do(self, key, func, *args):
+    '''Call func(*args), unless a call with the same key is running.
+
+    A caller that finds a call running waits for it, and gets its result
+    or has its exception raised.
+
+    Returns:
+      A tuple of the result, and True if it came from another caller's
+      call
+    '''
+    self._lock.acquire()
+    try:
+      future = self._calls.get(key)
+      shared = future is not None
+      if not shared:
+        future = self._calls[key] = Future()
+    finally:
+      self._lock.release()
+    
+    if not shared:
+      try:
+        future._Run(func, args, {})
+      finally:
+        self._lock.acquire()
+        try:
+          del self._calls[key]
+        finally:
+          self._lock.release()
+    return future.Result(), shared
+
+def _MapInOrder(func, items, workers, window=None):
+  '''Apply func to every item on a pool of worker threads.
+
+  At most `workers` calls run at once, and results are yielded in the
+  order of items regardless of the order the calls finish in. Up to
+  `window` items (`workers` by default) are submitted ahead of the
+  oldest unfinished one, so a larger window keeps the other workers 
+  busy while a slow call holds up the results behind it.
+  '''
+  window = max(window or workers, workers)
+  pool = _WorkerPool(workers)
+  try:
+    pending = collections.deque()
+    for item in items:
+      pending.append(pool.Submit(func, item))
+      if len(pending) >= window:
+        yield pending.popleft().Result()
+    while pending:
+      yield pending.popleft().Result()
+  finally:
+    pool.Close()
+
+# ----------------------------------------
+#
+# Connection handling
+#
+# ----------------------------------------
+
+class ConnectionPool(object):
+  '''A thread-safe pool of persistent HTTP(S) connections, kept per host.
+
+  Connections are handed out by Get and handed back by Put once their
+  response has been read completely. Idle connections are evicted after
+  idle_timeout seconds, and a connection is health checked before it is
+  reused.
+  '''
+
+  # Classes used to open new connections, by URL scheme
+  _CONNECTION_CLASSES = {'http': httplib.HTTPConnection,
+                         'https': httplib.HTTPSConnection}
+
+  def __init__(self, max_size=4, idle_timeout=60, timeout=None,
+               connection_class=None):
+    '''Instantiate a new wufoo.ConnectionPool object.
+
+    Args:
+      max_size: Number of idle connections kept per host
+      idle_timeout: Seconds an idle connection is kept before eviction
+      timeout: Socket timeout for new connections [optional]
+      connection_class: 
+        Class used to open every new connection, instead of one picked
+        by the URL scheme [optional]
+    '''
+    self._max_size = max_size
+    self._idle_timeout = idle_timeout
+    self._timeout = timeout
+    self._connection_class = connection_class
+    self._idle = {}
+    self._lock = threading.Lock()
+
+  @property
+  def max_size(self):
+    return self._max_size
+
+  @property
+  def idle_timeout(self):
+    return self._idle_timeout
+
+  def Get(self, host, scheme='https'):
+    '''Fetch a connection to a host, reusing an idle one when possible.
+
+    Args:
+      host: The host (and optional port) to connect to
+      scheme: 'http' or 'https' [optional]
+
+    Returns:
+      A tuple of (connection, reused)
+    '''
+    now = time.time()
+    self._lock.acquire()
+    try:
+      idle = self._idle.get((scheme, host), [])
+      while idle:
+        conn, last_used = idle.pop()
+        if now - last_used <= self._idle_timeout and self._IsHealthy(conn):
+          return conn, True
+        conn.close()
+    finally:
+      self._lock.release()
+    return self._NewConnection(host, scheme), False
+
+  def Put(self, host, conn, scheme='https'):
+    '''Hand a connection back to the pool once its response is consumed.
+
+    Args:
+      host: The host the connection is open to
+      conn: The connection to keep for reuse
+      scheme: 'http' or 'https' [optional]
+    '''
+    self._lock.acquire()
+    try:
+      self._EvictIdle(time.time())
+      idle = self._idle.setdefault((scheme, host), [])
+      if len(idle) < self._max_size:
+        idle.append((conn, time.time()))
+        return
+    finally:
+      self._lock.release()
+    conn.close()
+
+  def Clear(self):
+    '''Close every idle connection in the pool.'''
+    self._lock.acquire()
+    try:
+      idle, self._idle = self._idle, {}
+    finally:
+      self._lock.release()
+    for connections in idle.values():
+      for conn, last_used in connections:
+        conn.close()
+
+  def _NewConnection(self, host, scheme):
+    connection_class = (self._connection_class or 
+                        ConnectionPool._CONNECTION_CLASSES[scheme])
+    if self._timeout is None:
+      return connection_class(host)
+    return connection_class(host, timeout=self._timeout)
+
+  def _EvictIdle(self, now):
+    for key, idle in self._idle.items():
+      fresh = []
+      for conn, last_used in idle:
+        if now - last_used > self._idle_timeout:
+          conn.close()
+        else:
+          fresh.append((conn, last_used))
+      if fresh:
+        self._idle[key] = fresh
+      else:
+        del self._idle[key]
+
+  def _IsHealthy(self, conn):
+    # An idle keep-alive socket should have nothing to read. If it is
+    # readable the server has either closed it or sent something we
+    # did not ask for; neither can be reused.
+    sock = getattr(conn, 'sock', None)
+    if sock is None:
+      return False
+    try:
+      readable, writable, errored = select.select([sock], [], [], 0)
+    except (select.error, socket.error, ValueError):
+      return False
+    return not readable
+
+class _PooledResponse(object):
+  '''File-like wrapper that returns its connection to the pool at EOF.'''
+
+  def __init__(self, pool, host, scheme, conn, response):
+    self._pool = pool
+    self._host = host
+    self._scheme = scheme
+    self._conn = conn
+    self._response = response
+    self._buffer = ''
+
+  def read(self, amt=None):
+    if amt is None or amt < 0:
+      data = self._buffer + self._ReadChunk(None)
+      self._buffer = ''
+      return data
+    if len(self._buffer) < amt:
+      self._buffer += self._ReadChunk(amt - len(self._buffer))
+    data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+    return data
+
+  def readline(self, limit=-1):
+    while '\n' not in self._buffer:
+      chunk = self._ReadChunk(8192)
+      if not chunk:
+        break
+      self._buffer += chunk
+    end = self._buffer.find('\n') + 1 or len(self._buffer)
+    if limit >= 0:
+      end = min(end, limit)
+    line, self._buffer = self._buffer[:end], self._buffer[end:]
+    return line
+
+  def readlines(self, sizehint=0):
+    return list(iter(self.readline, ''))
+
+  # Bytes close() will read to reach EOF rather than give up the connection
+  _DRAIN_LIMIT = 64 * 1024
+
+  def close(self):
+    # A reader that stops just short of EOF, like one that has seen the last
+    # entry but not the closing brackets, leaves only a few bytes. Reading
+    # them lets the connection go back to the pool.
+    drained = 0
+    while self._response is not None and drained < self._DRAIN_LIMIT:
+      chunk = self._ReadChunk(8192)
+      if not chunk:
+        break
+      drained += len(chunk)
+    if self._response is not None:
+      # Closing before EOF leaves unread data on the socket, so the
+      # connection can't be reused.
+      self._response.close()
+      self._conn.close()
+      self._response = None
+
+  def _ReadChunk(self, amt):
+    if self._response is None:
+      return ''
+    if amt is None:
+      data = self._response.read()
+    else:
+      data = self._response.read(amt)
+    if amt is None or not data or self._response.isclosed():
+      self._Release()
+    return data
+
+  def _Release(self):
+    response, self._response = self._response, None
+    if response.will_close:
+      self._conn.close()
+    else:
+      self._pool.Put(self._host, self._conn, self._scheme)
+
+class _KeepAliveHandler(urllib2.HTTPHandler, urllib2.HTTPSHandler):
+  '''urllib2 handler that sends HTTP(S) requests over pooled connections.'''
+
+  def __init__(self, pool):
+    urllib2.HTTPSHandler.__init__(self)
+    self._pool = pool
+
+  def http_open(self, req):
+    return self._Open(req, 'http')
+
+  def https_open(self, req):
+    return self._Open(req, 'https')
+
+  def _Open(self, req, scheme):
+    host = req.get_host()
+    if not host:
+      raise urllib2.URLError('no host given')
+    if getattr(req, '_tunnel_host', None):
+      # HTTPS through a proxy needs a CONNECT first, which pooled 
+      # connections don't send
+      return urllib2.HTTPSHandler.https_open(self, req)
+
+    headers = dict(req.unredirected_hdrs)
+    headers.update(req.headers)
+    headers = dict([(k.title(), v) for k, v in headers.items()])
+    headers['Connection'] = 'keep-alive'
+    method = req.get_method()
+    timeout = getattr(req, 'timeout', socket._GLOBAL_DEFAULT_TIMEOUT)
+
+    while True:
+      conn, reused = self._pool.Get(host, scheme)
+      if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+        conn.timeout = timeout
+        if conn.sock is not None:
+          conn.sock.settimeout(timeout)
+      sent = False
+      try:
+        conn.request(method, req.get_selector(), req.data, headers)
+        sent = True
+        response = conn.getresponse()
+        break
+      except (httplib.HTTPException, socket.error), e:
+        conn.close()
+        # The server may have dropped a reused connection since the
+        # health check; retry those on a fresh connection. A POST that
+        # went out may have been acted on, so it isn't sent twice.
+        if not reused or (sent and method not in ('GET', 'HEAD')):
+          raise urllib2.URLError(e)
+
+    fp = _PooledResponse(self._pool, host, scheme, conn, response)
+    resp = urllib.addinfourl(fp, response.msg, req.get_full_url())
+    resp.code = response.status
+    resp.msg = response.reason
+    return resp
+
+# ----------------------------------------
+#
+# API class
+#
+# ----------------------------------------
+
+def _IsTransient(error, limiter=None):
+  # POSTs worth sending again: throttled, unavailable and lost ones. A
+  # rate limiter already retried any 429, and other server errors may
+  # come after the entry was created.
+  if isinstance(error, HTTPError):
+    if error.code == 429:
+      return limiter is None
+    return error.code == 503
+  return isinstance(error, (urllib2.URLError, httplib.HTTPException, socket.error))
+
+class PostResult(object):
+  '''What became of one row posted by Api.PostEntries.
+
+  Attributes:
+    index: The position of the row in the input, counting from 0
+    entry_id: The EntryId of the new entry, or None if it failed
+    error: The error text if the entry failed, or None
+    field_errors: The FieldErrors Wufoo rejected the entry with
+    attempts: Number of times the entry was posted
+  '''
+
+  def __init__(self, index):
+    self.index = index
+    self.entry_id = None
+    self.error = None
+    self.field_errors = []
+    self.attempts = 0
+
+  @property
+  def ok(self):
+    return self.error is None
+
+  def __str__(self):
+    if self.ok:
+      return '%d created %s' % (self.index, self.entry_id)
+    return '%d failed after %d attempts: %s' % (self.index, self.attempts, self.error)
+
+class Api(object):
+  '''A wrapper of the Wufoo API for one account.
+
+  One instance can be shared by any number of threads. Settings are
+  replaced rather than changed in place, and everything a request 
+  needs is gathered once at its start, so a request sees either the 
+  old or the new value of a setting changed while it runs.
+  '''
+
+  # Wufoo ignores the password and authenticates with the API key alone
+  _API_PASSWORD = 'foo'
+  
+  # Largest pageSize the API accepts for entries and comments
+  _MAX_PAGE_SIZE = 100
+
+  def __init__(self,
+               subdomain,
+               apikey,
+               input_encoding=None,
+               request_headers=None,
+               pool_size=4,
+               pool_idle_timeout=60,
+               cache=None,
+               rate_limiter=None,
+               base_url=None,
+               lazy_entries=False,
+               coalesce=True,
+               negative_cache=None):
+    '''Instantiate a new wufoo.Api object.
+
+    Args:
+      subdomain: The subdomain of the Wufoo account
+      apikey: The API key of the Wufoo account. 
+      input_encoding: The encoding used to encode input strings. [optional]
+      request_header: A dictionary of additional HTTP request headers. [optional]
+      pool_size: 
+        Number of idle HTTPS connections kept per host, 0 to disable
+        connection reuse. [optional]
+      pool_idle_timeout: 
+        Seconds an idle connection is kept before it is closed. [optional]
+      cache: 
+        A wufoo.ResponseCache to keep responses in, None to disable
+        caching [optional]
+      rate_limiter:
+        A wufoo.RateLimiter to pace requests with, which may be shared
+        with other Api instances [optional]
+      base_url:
+        The URL the API is reached at, instead of the subdomain's
+        [optional]
+      lazy_entries:
+        Set to True to build entries that copy out their attributes 
+        only when read, see wufoo.Entry.NewFromJsonDict [optional]
+      coalesce:
+        Set to False to send every call's request even when an 
+        identical one is in flight, see SetCoalescing [optional]
+      negative_cache:
+        A wufoo.NegativeCache to remember invalid form and report 
+        hashes in, None to always ask Wufoo [optional]
+    '''
+    self._urllib = urllib2
+    if pool_size:
+      self.SetConnectionPool(ConnectionPool(pool_size, pool_idle_timeout))
+    else:
+      self.SetConnectionPool(None)
+    self.SetCache(cache)
+    self.SetNegativeCache(negative_cache)
+    self.SetRateLimiter(rate_limiter)
+    self._metrics = RequestMetrics()
+    self._request_hooks = []
+    self._cache_timeouts = dict(DEFAULT_CACHE_TIMEOUTS)
+    self._max_staleness = {}
+    self._revalidating = set()
+    self._revalidating_lock = threading.Lock()
+    self._decoders = {}
+    self._in_flight = _SingleFlight()
+    self.SetCoalescing(coalesce)
+    self._InitializeRequestHeaders(request_headers)
+    self._InitializeUserAgent()
+    self._InitializeDefaultParameters()
+    self._input_encoding = input_encoding
+    self.SetCredentials(apikey)
+    self.SetSubdomain(subdomain)
+    self.SetBaseUrl(base_url)
+    self.SetLazyEntries(lazy_entries)
+
+  def SetSubdomain(self, subdomain):
+    self._subdomain = subdomain
+
+  def SetBaseUrl(self, base_url):
+    '''Override the URL the API is reached at.
+
+    Args:
+      base_url: 
+        The URL the endpoint paths are appended to, for example
+        'http://localhost:8080/api/v3', or None for the subdomain's
+        https://<subdomain>.wufoo.com/api/v3
+    '''
+    self._base_url = base_url
+
+  def _BaseUrl(self):
+    if self._base_url:
+      return self._base_url.rstrip('/')
+    return "https://%s.wufoo.com/api/v3" % self._subdomain
+    
+  def SetLazyEntries(self, lazy):
+    '''Build entries lazily, for callers that read only a few attributes.
+
+    Args:
+      lazy: 
+        True to wrap each decoded entry and copy out attributes as they
+        are read, False to copy them all up front
+    '''
+    self._lazy_entries = lazy
+
+  def SetCredentials(self, apikey):
+    '''Set the API key requests are authenticated with.
+
+    The Authorization header is built once here rather than for every
+    request.
+    '''
+    if apikey:
+      basic_auth = base64.b64encode('%s:%s' % (apikey, Api._API_PASSWORD))
+      authorization = 'Basic %s' % basic_auth
+    else:
+      authorization = None
+    # Responses are only shared between Api instances using the same key
+    identity = hashlib.sha1(apikey or '').hexdigest()
+    # Replaced as one tuple, so a request never mixes two keys
+    self._credentials = (apikey, authorization, identity)
+
+  def GetFieldsForForm(self, form_hash, system=None):
+    return self._GetFields('forms', form_hash, system)
+    
+  def GetFieldsForReport(self, report_hash, system=None):
+    return self._GetFields('reports', report_hash, system)
+
+  def _GetFields(self, for_what, identifier, system=None):
+    '''Fetch all the fields.
+
+    Returns:
+      A sequence of wufoo.Field instances, one for each field
+    '''
+    parameters = {}
+    if system:
+      parameters['system'] = system
+      
+    url = "%s/%s/%s/fields.json" % (self._BaseUrl(), for_what, identifier)
+    fields = self._FetchModels(url, lambda data: [Field.NewFromJsonDict(x) for x in data['Fields']], parameters=parameters)
+    if for_what == 'forms':
+      self._UpdateFieldDecoder(identifier, fields)
+    return fields
+
+  def GetFieldDecoder(self, form_hash):
+    '''The wufoo.FieldDecoder for the entries of a form.
+
+    Every call fetches the form's fields, which comes from the response
+    cache while they are cached, and the decoder compiled from them is
+    kept until the fields differ from the ones it was compiled from.
+    Without a cache, each call costs a request.
+
+    Args:
+      form_hash: The form whose entries are to be decoded
+
+    Returns:
+      A wufoo.FieldDecoder instance
+    '''
+    # Compiles the decoder again if the fields changed
+    self.GetFieldsForForm(form_hash)
+    return self._decoders[form_hash]
+
+  def _UpdateFieldDecoder(self, form_hash, fields):
+    decoder = self._decoders.get(form_hash)
+    if decoder is None or decoder._signature != _FieldSignature(fields):
+      self._decoders[form_hash] = FieldDecoder(fields)
+
+  def GetForms(self):
+    '''Fetch the sequence of all forms for a user.
+
+    Returns:
+      A sequence of wufoo.Form instances, one for each form
+    '''
+    parameters = {}
+    url = "%s/forms.json" % self._BaseUrl()
+    forms = self._FetchModels(url, lambda data: [Form.NewFromJsonDict(x) for x in data['Forms']], parameters=parameters)
+    self._ForgetInvalid('forms', forms)
+    return forms
+
+  def GetForm(self, hash):
+    '''Fetch a single form for a user.
+
+    Args:
+      hash:
+        Returns the Form with the specified hash
+    
+    Returns:
+      The wufoo.Form instance that corresponds to the given hash
+
+    '''
+    parameters = {}
+    url = "%s/forms/%s.json" % (self._BaseUrl(), hash)
+    
+    self._CheckIdentifier(url)
+    try:
+      return self._FetchModels(url, lambda data: Form.NewFromJsonDict(data['Forms'][0]), parameters=parameters)
+    except HTTPError, ef:
+      if ef.msg == 'Invalid identifier.':
+        self._RememberInvalid(url)
+        raise WufooError(ef.msg)
+      else:
+        # A different type of HTTP error
+        raise ef
+
+  def GetReports(self):
+    '''Fetch the sequence of all reports for a user.
+    
+    Returns:
+      A sequence of wufoo.Report instances, one for each report
+    '''
+    parameters = {}
+    url = "%s/reports.json" % self._BaseUrl()
+    reports = self._FetchModels(url, lambda data: [Report.NewFromJsonDict(x) for x in data['Reports']], parameters=parameters)
+    self._ForgetInvalid('reports', reports)
+    return reports
+    
+  def GetReport(self, hash):
+    '''Fetch a single report for a user.
+
+    Args:
+      hash:
+        Returns the Report with the specified hash
+    
+    Returns:
+      The wufoo.Report instance that corresponds to the given hash
+
+    '''
+    parameters = {}
+    url = "%s/reports/%s.json" % (self._BaseUrl(), hash)
+    
+    def build(data):
+      if data['Reports'][0] is None:
+        raise WufooError('Invalid identifier.')
+      return Report.NewFromJsonDict(data['Reports'][0])
+    
+    self._CheckIdentifier(url)
+    try:
+      return self._FetchModels(url, build, parameters=parameters)
+    except HTTPError, ef:
+      if ef.msg != 'Invalid identifier.':
+        raise
+      self._RememberInvalid(url)
+      raise WufooError(ef.msg)
+    except WufooError:
+      self._RememberInvalid(url)
+      raise
+
+  def _CheckIdentifier(self, url):
+    negative_cache = self._negative_cache
+    if negative_cache is not None and negative_cache.Contains('%s %s' % (self._credentials[2], url)):
+      raise WufooError('Invalid identifier.')
+
+  def _RememberInvalid(self, url):
+    negative_cache = self._negative_cache
+    if negative_cache is not None:
+      negative_cache.Add('%s %s' % (self._credentials[2], url))
+
+  def _ForgetInvalid(self, for_what, listed):
+    negative_cache = self._negative_cache
+    if negative_cache is not None:
+      # A form or report can be fetched by its hash or its URL name
+      for identifier in [x.hash for x in listed] + [x.url for x in listed if x.url]:
+        url = "%s/%s/%s.json" % (self._BaseUrl(), for_what, identifier)
+        negative_cache.Remove('%s %s' % (self._credentials[2], url))
+  
+  def GetFormEntryCount(self, hash, filters=None, match='AND'):
+    '''Fetch the entry count for a Form
+    
+    Args:
+      hash:
+        Returns the count of the entries for the Form with the specified hash
+      filters:
+        List of filters the counted entries match [optional]
+      match:
+        'AND' or 'OR' to chain together filters
+    
+    Returns:
+      An integer count of the number of entries
+    '''    
+    parameters = {}
+    if filters:
+      parameters['match'] = match
+      self._AddFilters(parameters, filters)
+    
+    url = "%s/forms/%s/entries/count.json" % (self._BaseUrl(), hash)
+    
+    return self._FetchModels(url, lambda data: int(data['EntryCount']), parameters=parameters, url_post_process=_KeepPlusSigns)
+  
+  def GetReportEntryCount(self, hash):
+    '''Fetch the entry count for a Report
+
+    Args:
+      hash:
+        Returns the count of the entries for the Report with the specified hash
+
+    Returns:
+      An integer count of the number of entries
+    '''
+    parameters = {}
+
+    url = "%s/reports/%s/entries/count.json" % (self._BaseUrl(), hash)
+
+    return self._FetchModels(url, lambda data: int(data['EntryCount']), parameters=parameters)
+    
+  def GetEntriesForForm(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
+    return self._GetEntries(hash, 'forms', system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
+
+  def GetEntriesForReport(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
+    return self._GetEntries(hash, 'reports', system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
+    
+  def IterEntriesForForm(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_size=None, workers=None):
+    return self._IterEntries(hash, 'forms', system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_size=page_size, workers=workers)
+
+  def IterEntriesForReport(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_size=None, workers=None):
+    return self._IterEntries(hash, 'reports', system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_size=page_size, workers=workers)
+
+  def _IterEntries(self, hash, for_what, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_size=None, workers=None):
+    '''Iterate over every entry of a Report or Form, one page at a time
+
+    Pages are only fetched as the iteration reaches them, and entries
+    are handed out as they are read off the response, so memory use 
+    doesn't grow with the number of entries.
+
+    With workers set, the entry count is fetched first and the pages it
+    covers are requested in parallel on that many threads. Entries are
+    still yielded in the server's sort order, and at most `workers` 
+    pages are held in memory. Report counts don't take filters into
+    account, so filtered report entries are always walked one page at
+    a time.
+
+    Args:
+      Same as _GetEntries, without page_start
+      page_size:
+        Number of entries fetched per request (the API maximum by default)
+      workers:
+        Number of pages fetched in parallel [optional]
+
+    Returns:
+      A generator of wufoo.Entry instances
+    '''
+    page_size = page_size or Api._MAX_PAGE_SIZE
+    def get_page(page_start):
+      return self._GetEntries(hash, for_what, system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
+    
+    page_start = 0
+    entries = []
+    if workers and workers > 1 and (for_what == 'forms' or not filters):
+      if for_what == 'forms':
+        count = self.GetFormEntryCount(hash, filters=filters, match=match)
+      else:
+        count = self.GetReportEntryCount(hash)
+      for entries in _MapInOrder(get_page, range(0, count, page_size), workers):
+        for entry in entries:
+          yield entry
+        page_start += page_size
+      # Entries added since the count was taken are picked up by the 
+      # serial walk below.
+      if page_start and len(entries) < page_size:
+        return
+
+    while True:
+      count = 0
+      for entry in self._StreamEntries(hash, for_what, system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size):
+        yield entry
+        count += 1
+      if count < page_size:
+        return
+      page_start += page_size
+
+  def _AddFilters(self, parameters, filters):
+    if filters:
+      try:
+        # Is it a list of filter objects?
+        for (i, f) in zip(range(len(filters)), filters):
+          parameters['Filter'+str(i)] = str(f)
+      except (TypeError):
+        # It's just one filter?
+        parameters['Filter1'] = str(filters)
+
+  def _GetEntries(self, hash, for_what, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
+    '''Fetch a page of entries related to a Report or Form
+
+    Args:
+      Same as _StreamEntries
+
+    Returns:
+      List of wufoo.Entry instances that corresponds to the given Report or Form
+    '''
+    return list(self._StreamEntries(hash, for_what, system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size))
+    
+  def _StreamEntries(self, hash, for_what, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
+    '''Fetch all entries related to a Report or Form
+
+    Args:
+      for_what:
+        Either "form" or "report"
+      hash:
+        Returns the Entries from the form with the specified hash
+      system:
+        Set to True to include system fields
+      filter:
+        List of filters applied to the results
+      match:
+        'AND' or 'OR' to chain together filters
+      sort_id:
+        Field ID to sort on. See the Field API
+      sort_direction:
+        Sort direction, either ASC or DESC
+      page_start:
+        Page to start on (0 by default)
+      page_end:
+        Page to end on
+
+    Returns:
+      A generator of wufoo.Entry instances that corresponds to the given 
+      Report or Form
+    '''
+    parameters = {}
+    if system:
+      parameters['system'] = 'true'
+    if sort_id:
+      parameters['sort'] = sort_id
+    if sort_direction:
+      parameters['sortDirection'] = sort_direction
+    if page_start:
+      parameters['pageStart'] = page_start
+    if page_size:
+      parameters['pageSize'] = page_size
+    if match:
+      parameters['match'] = match
+    self._AddFilters(parameters, filters)
+
+    url = "%s/%s/%s/entries.json" % (self._BaseUrl(), for_what, hash)
+    
+    # Each entry is built as soon as it has been read off the response,
+    # rather than decoding the whole page first.
+    stats = RequestStats()
+    try:
+      response = self._FetchUrl(url, parameters=parameters, url_post_process=_KeepPlusSigns, stream=True, stats=stats)
+      try:
+        entries = _IterJsonArray(response, 'Entries')
+        while True:
+          start = time.time()
+          network_time = stats.network_time
+          try:
+            x = entries.next()
+          except StopIteration:
+            break
+          built = time.time()
+          entry = Entry.NewFromJsonDict(x, lazy=self._lazy_entries)
+          # Reading more of the response counts as network time
+          stats.decode_time += built - start - (stats.network_time - network_time)
+          stats.build_time += time.time() - built
+          yield entry
+      finally:
+        response.close()
+    except Exception, e:
+      stats.error = e
+      raise
+    finally:
+      self._ReportRequest(stats)
+  
+  def GetUsers(self):
+    url = "%s/users.json" % self._BaseUrl()
+    return self._FetchModels(url, lambda data: [User.NewFromJsonDict(x) for x in data['Users']], parameters={})
+
+  def GetWidgets(self, report_hash):
+    url = "%s/reports/%s/widgets.json" % (self._BaseUrl(), report_hash)
+    return self._FetchModels(url, lambda data: [Widget.NewFromJsonDict(x, self._subdomain) for x in data['Widgets']], parameters={})
+
+  def GetComments(self, form_hash, entry_id=None, page_start=None, page_size=None):
+    '''Fetch all comments related to a Form
+
+    Args:
+      for_what:
+        Either "form" or "report"
+      form_hash:
+        Returns the Entries from the form with the specified hash
+      entry_id
+        Return only comments from a specific entry
+      page_start:
+        Page to start on (0 by default)
+      page_size:
+        Number of comments per page
+
+    Returns:
+      Set of wufoo.Comment instances that corresponds to the given Form
+    '''
+    parameters = {}
     if entry_id:
       parameters['entryId'] = entry_id
     if page_start:
@@ -1373,11 +3121,8 @@ class Api(object):
     if page_size:
       parameters['pageSize'] = page_size
 
-    url = "https://%s.wufoo.com/api/v3/forms/%s/comments.json" % (self._subdomain, form_hash)
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
-
-    return [Comment.NewFromJsonDict(x) for x in data['Comments']]
+    url = "%s/forms/%s/comments.json" % (self._BaseUrl(), form_hash)
+    return self._FetchModels(url, lambda data: [Comment.NewFromJsonDict(x) for x in data['Comments']], parameters=parameters)
     
     
   def GetCommentCount(self, form_hash, entry_id=None):
@@ -1390,16 +3135,83 @@ class Api(object):
     Returns:
       An integer count of the number of entries
     '''    
-    url = "https://%s.wufoo.com/api/v3/forms/%s/comments/count.json" % (self._subdomain, form_hash)
+    url = "%s/forms/%s/comments/count.json" % (self._BaseUrl(), form_hash)
     
     parameters = {}
     if entry_id:
       parameters['entryId'] = entry_id
     
-    json = self._FetchUrl(url, parameters=parameters)
-    data = simplejson.loads(json)
+    return self._FetchModels(url, lambda data: int(data['Count']), parameters=parameters)
+
+  def GetCommentsByEntry(self, form_hash, workers=None, page_size=None):
+    '''Fetch every comment of a form, grouped by entry
+
+    The comment count is fetched first and the pages it covers are 
+    requested in parallel, as IterEntriesForForm does with workers set.
+    Comments added while the pages are fetched are picked up by reading
+    on past the last page.
+
+    Args:
+      form_hash:
+        The form to fetch the comments of
+      workers:
+        Number of pages fetched in parallel [optional]
+      page_size:
+        Number of comments fetched per request (the API maximum by default)
 
-    return int(data['Count'])
+    Returns:
+      A dict of lists of wufoo.Comment instances, by EntryId, each in 
+      the order Wufoo lists them
+    '''
+    page_size = page_size or Api._MAX_PAGE_SIZE
+    def get_page(page_start):
+      return self.GetComments(form_hash, page_start=page_start, page_size=page_size)
+    
+    by_entry = {}
+    seen = set()
+    def add(comments):
+      for comment in comments:
+        # A comment added while paging shifts the rest along a page
+        if comment.comment_id in seen:
+          continue
+        seen.add(comment.comment_id)
+        by_entry.setdefault(str(comment.entry_id), []).append(comment)
+
+    count = self.GetCommentCount(form_hash)
+    page_start = 0
+    comments = []
+    for comments in _MapInOrder(get_page, range(0, count, page_size), workers or 1):
+      add(comments)
+      page_start += page_size
+    while not page_start or len(comments) == page_size:
+      comments = get_page(page_start)
+      add(comments)
+      page_start += page_size
+    return by_entry
+
+  def AttachComments(self, form_hash, entries, workers=None):
+    '''Fetch the comments of a form and join them onto its entries
+
+    Each entry's comments attribute is set to the list of its comments,
+    empty when it has none. The join looks each entry up in the dict 
+    GetCommentsByEntry returns, so it takes time linear in the number
+    of entries and comments.
+
+    Args:
+      form_hash:
+        The form the entries belong to
+      entries:
+        A list of wufoo.Entry instances of the form
+      workers:
+        Number of comment pages fetched in parallel [optional]
+
+    Returns:
+      The entries
+    '''
+    by_entry = self.GetCommentsByEntry(form_hash, workers=workers)
+    for entry in entries:
+      entry._comments = by_entry.get(str(entry.entry_id), [])
+    return entries
   
   def PostEntry(self, form_hash, entry_data):
     '''Post an entry for a form. Assumes data is well-formed.
@@ -1410,20 +3222,86 @@ class Api(object):
       data:
         A dictionary of the data to be submitted. Keys should correspond
         to field names.
+
+    Returns:
+      The decoded response, a dict with the EntryId and EntryLink of the
+      new entry
+
+    Raises:
+      WufooError: 
+        If Wufoo rejected the entry, with the ErrorText and the list of
+        FieldErrors as its arguments
     '''
 
-    url = 'https://%s.wufoo.com/api/v3/forms/%s/entries.json' % (self._subdomain, form_hash)
+    url = '%s/forms/%s/entries.json' % (self._BaseUrl(), form_hash)
 
     try:
-      #print url
       json = self._FetchUrl(url, post_data=entry_data)
-      # Error
-      data = simplejson.loads(json)
-      raise WufooError(data['ErrorText'])
     except HTTPError, e:
-      # Success if 201 response
+      # urllib2 before Python 2.6 raises for the 201 of a new entry
+      if e.code != 201:
+        raise
       json = e.read()
-      data = simplejson.loads(json)
+    data = simplejson.loads(json)
+    # Entries Wufoo rejects come back with a 200
+    if str(data.get('Success')) != '1':
+      raise WufooError(data.get('ErrorText'), data.get('FieldErrors', []))
+    return data
+
+  def PostEntries(self, form_hash, rows, workers=4, max_retries=3, retry_delay=1.0):
+    '''Post many entries to a form, several at a time.
+
+    Rows are read from the iterable only as workers become free, so at
+    most four rows per worker are held in memory, and results are 
+    yielded in the order of the rows. The other workers keep posting
+    while a row waits to be retried, until they are four rows per 
+    worker ahead of it.
+
+    Requests are paced by the rate limiter, if set, which then retries
+    rows answered with a 429. Rows answered with a 503, or a 429 
+    without a limiter, and rows whose connection failed are retried 
+    after retry_delay seconds, doubling each time. A row whose 
+    connection failed after it was sent, or that got a 503 from a 
+    proxy in front of Wufoo, may have been created anyway, so it can be
+    created twice; pass max_retries=0 to never post a row twice. Other
+    server errors and entries Wufoo rejects are not retried.
+
+    Args:
+      form_hash:
+        The form to post the entries to
+      rows:
+        An iterable of dicts of field data, as for PostEntry
+      workers:
+        Number of entries posted at once [optional]
+      max_retries:
+        Number of times a failed entry is posted again [optional]
+      retry_delay:
+        Seconds to wait before the first retry [optional]
+
+    Returns:
+      A generator of wufoo.PostResult instances, one for each row
+    '''
+    def post((index, entry_data)):
+      result = PostResult(index)
+      while True:
+        result.attempts += 1
+        try:
+          result.entry_id = str(self.PostEntry(form_hash, entry_data)['EntryId'])
+          result.error = None
+          return result
+        except WufooError, e:
+          result.error = e.message
+          if len(e.args) > 1:
+            result.field_errors = e.args[1]
+          return result
+        except Exception, e:
+          result.error = str(e) or e.__class__.__name__
+          if not _IsTransient(e, self._rate_limiter) or result.attempts > max_retries:
+            return result
+          time.sleep(retry_delay * 2 ** (result.attempts - 1))
+    
+    # A row waiting to be retried mustn't stall the rows behind it
+    return _MapInOrder(post, enumerate(rows), workers, window=4 * workers)
       
   def PutWebHook(self, form_hash, url, handshake_key=None, metadata=None):
     ''' Creates/Updates a web hook on a Wufoo form.
@@ -1442,7 +3320,7 @@ class Api(object):
       The web hook hash used to delete the web hook
     '''
     
-    url = "https://%s.wufoo.com/api/v3/forms/%s/webhooks.json" % (self._subdomain, form_hash)
+    url = "%s/forms/%s/webhooks.json" % (self._BaseUrl(), form_hash)
     
     post_data = {}
     post_data['url'] = url
@@ -1451,14 +3329,12 @@ class Api(object):
     if metadata:
       post_data['metadata'] = metadata
     
-    json = self._FetchUrl(url, post_data=post_data)
-    data = simplejson.loads(json)
+    self._FetchModels(url, lambda data: None, post_data=post_data)
 
   def ClearCredentials(self):
-    '''Clear the username and password for this instance
+    '''Clear the API key for this instance
     '''
-    self._username = None
-    self._password = None
+    self.SetCredentials(None)
     
   def SetUrllib(self, urllib):
     '''Override the default urllib implementation.
@@ -1468,6 +3344,130 @@ class Api(object):
     '''
     self._urllib = urllib
 
+  def SetConnectionPool(self, pool):
+    '''Override the pool of persistent connections.
+
+    A pool can be shared between several Api instances.
+
+    Args:
+      pool: a wufoo.ConnectionPool instance, or None to open a new 
+            connection for every request
+    '''
+    self._connection_pool = pool
+
+  def GetConnectionPool(self):
+    '''The pool of persistent connections used.
+
+    Returns:
+      The wufoo.ConnectionPool instance used by this API wrapper, or None
+    '''
+    return self._connection_pool
+
+  def SetCache(self, cache):
+    '''Override the cache responses are kept in.
+
+    Args:
+      cache: an instance that supports the same API as wufoo.ResponseCache,
+             or None to disable caching
+    '''
+    self._cache = cache
+
+  def SetNegativeCache(self, negative_cache):
+    '''Override the cache invalid form and report identifiers are kept in.
+
+    GetForm and GetReport raise WufooError('Invalid identifier.') for a
+    hash or URL name in the cache without asking Wufoo. An identifier is
+    added when Wufoo reports it invalid, and removed when GetForms or 
+    GetReports lists a form or report with that hash or URL name. Like 
+    responses, identifiers are kept per API key.
+
+    Args:
+      negative_cache: 
+        an instance that supports the same API as wufoo.NegativeCache,
+        or None to disable negative caching
+    '''
+    self._negative_cache = negative_cache
+
+  def SetCacheTimeout(self, endpoint, cache_timeout):
+    '''Override how long responses from an endpoint stay fresh.
+
+    Args:
+      endpoint: 
+        An endpoint template such as 'forms' or 'forms/{hash}/fields'
+      cache_timeout: 
+        Seconds a response is served from the cache, 0 to never cache
+    '''
+    self._cache_timeouts[endpoint] = cache_timeout
+
+  def SetStaleWhileRevalidate(self, max_stale, endpoints=STALE_WHILE_REVALIDATE_ENDPOINTS):
+    '''Serve expired responses at once and revalidate them in the background.
+
+    An expired response of one of the endpoints is returned right away,
+    and a background thread revalidates it for the calls that follow,
+    one per response at a time. Once it has been expired for more than
+    max_stale seconds, the call waits for the revalidation as usual.
+    Requests made in the background are reported to the request hooks 
+    on the background thread.
+
+    Args:
+      max_stale: 
+        Seconds past its cache timeout a response may be served, 0 to
+        always wait for the revalidation
+      endpoints: 
+        Endpoint templates to apply it to, GetForms, GetForm, GetReports,
+        GetFieldsForForm and GetFieldsForReport by default [optional]
+    '''
+    for endpoint in endpoints:
+      self._max_staleness[endpoint] = max_stale
+
+  def SetCoalescing(self, coalesce):
+    '''Share one request between concurrent identical calls.
+
+    Entries are streamed to each caller and never shared.
+
+    Args:
+      coalesce: 
+        True to have a call wait for an identical GET already in flight
+        and share its result, False to always send a request
+    '''
+    self._coalesce = coalesce
+
+  def SetRateLimiter(self, rate_limiter):
+    '''Override the rate limiter requests are paced with.
+
+    Args:
+      rate_limiter: a wufoo.RateLimiter instance, or None to send 
+                    requests as fast as they are made
+    '''
+    self._rate_limiter = rate_limiter
+
+  def AddRequestHook(self, hook):
+    '''Call a function after every request to the Wufoo API.
+
+    Args:
+      hook: 
+        A function called with a wufoo.RequestStats once the response 
+        has been turned into models, on the thread that made the call.
+        An exception it raises is passed on to the caller, unless the
+        request itself failed.
+    '''
+    # Copy rather than append, so threads reporting requests never see
+    # the list change under them.
+    self._request_hooks = self._request_hooks + [hook]
+
+  def RemoveRequestHook(self, hook):
+    hooks = list(self._request_hooks)
+    hooks.remove(hook)
+    self._request_hooks = hooks
+
+  def GetMetrics(self):
+    '''The latency histograms of the requests made so far.
+
+    Returns:
+      The wufoo.RequestMetrics instance used by this API wrapper
+    '''
+    return self._metrics
+
   def GetUrllib(self):
     '''The the implementation of urllib used.
     
@@ -1482,7 +3482,11 @@ class Api(object):
     Args:
       user_agent: a string that should be send to the server as the User-agent
     '''
-    self._request_headers['User-Agent'] = user_agent
+    # Replace rather than update, so requests in flight never see the
+    # headers change under them.
+    headers = dict(self._request_headers)
+    headers['User-Agent'] = user_agent
+    self._request_headers = headers
 
   def _BuildUrl(self, url, path_elements=None, extra_params=None):
     # Break url into consituent parts
@@ -1509,10 +3513,8 @@ class Api(object):
     return urlparse.urlunparse((scheme, netloc, path, params, query, fragment))
 
   def _InitializeRequestHeaders(self, request_headers):
-    if request_headers:
-      self._request_headers = request_headers
-    else:
-      self._request_headers = {}
+    # A copy, so the caller's dict can't change the headers later
+    self._request_headers = dict(request_headers or {})
 
   def _InitializeUserAgent(self):
     user_agent = 'Python-urllib/%s (python-twitter/%s)' % \
@@ -1522,25 +3524,50 @@ class Api(object):
   def _InitializeDefaultParameters(self):
     self._default_params = {}
 
-  def _AddAuthorizationHeader(self, username, password):
-    if username and password:
-      basic_auth = base64.encodestring('%s:%s' % (username, password))[:-1]
-      self._request_headers['Authorization'] = 'Basic %s' % basic_auth
-
-  def _RemoveAuthorizationHeader(self):
-    if self._request_headers and 'Authorization' in self._request_headers:
-      del self._request_headers['Authorization']
-
-  def _GetOpener(self, url, username=None, password=None):
-    if username and password:
-      self._AddAuthorizationHeader(username, password)
-      handler = self._urllib.HTTPBasicAuthHandler()
-      (scheme, netloc, path, params, query, fragment) = urlparse.urlparse(url)
-      handler.add_password(Api._API_REALM, netloc, username, password)
-      opener = self._urllib.build_opener(handler)
-    else:
-      opener = self._urllib.build_opener()
-    opener.addheaders = self._request_headers.items()
+  def _RevalidateInBackground(self, cache_key, revalidate):
+    self._revalidating_lock.acquire()
+    try:
+      if cache_key in self._revalidating:
+        return
+      self._revalidating.add(cache_key)
+    finally:
+      self._revalidating_lock.release()
+    
+    def run():
+      try:
+        revalidate()
+      except Exception:
+        # The request hooks saw the error. The stale response is served
+        # until it is too old, and then the caller gets the error.
+        pass
+      finally:
+        self._revalidating_lock.acquire()
+        try:
+          self._revalidating.discard(cache_key)
+        finally:
+          self._revalidating_lock.release()
+    thread = threading.Thread(target=run)
+    thread.setDaemon(True)
+    thread.start()
+
+  def _RequestHeaders(self, authorization):
+    headers = self._request_headers.items()
+    if authorization:
+      headers.append(('Authorization', authorization))
+    return headers
+
+  def _GetOpener(self, headers):
+    '''A url opener of a single request, sending headers with it.
+
+    The Authorization header goes out with the first request, so no
+    basic auth handler is needed to answer a challenge.
+    '''
+    handlers = []
+    pool = self._connection_pool
+    if pool:
+      handlers.append(_KeepAliveHandler(pool))
+    opener = self._urllib.build_opener(*handlers)
+    opener.addheaders = headers
     return opener
 
   def _Encode(self, s):
@@ -1584,11 +3611,100 @@ class Api(object):
     else:
       return urllib.urlencode(dict([(k, self._Encode(v)) for k, v in post_data.items()]))
 
+  def _OpenUrl(self, opener, url, encoded_post_data):
+    '''Open a URL, pacing and retrying it with the rate limiter if set.'''
+    limiter = self._rate_limiter
+    if not limiter:
+      return opener.open(url, encoded_post_data)
+    
+    attempt = 0
+    while True:
+      limiter.Acquire(self._subdomain)
+      try:
+        response = opener.open(url, encoded_post_data)
+      except HTTPError, e:
+        if not limiter.IsThrottled(e) or attempt >= limiter.max_retries:
+          raise
+        # The next Acquire waits out the backoff
+        limiter.Throttled(self._subdomain, attempt, _RetryAfter(e))
+        # Sending a POST again could create its entry twice
+        if encoded_post_data is not None and e.code != 429:
+          raise
+        attempt += 1
+      else:
+        limiter.Succeeded(self._subdomain)
+        return response
+
+  def _FetchModels(self, url, build, parameters=None, post_data=None, url_post_process=None):
+    '''Fetch a URL, decode its JSON body and build models from it.
+
+    How long each step took is reported to the request hooks. With
+    coalescing on, a GET that is already in flight is not sent again;
+    the caller waits for it and builds its own models from the shared
+    decoded JSON, and only the call that sent it reports the request.
+
+    Args:
+      url: The URL to retrieve
+      build: A function returning the models for the decoded JSON
+      parameters: As for _FetchUrl [OPTIONAL]
+      post_data: As for _FetchUrl [OPTIONAL]
+      url_post_process: As for _FetchUrl [OPTIONAL]
+
+    Returns:
+      The return value of build
+    '''
+    if post_data is not None or not self._coalesce:
+      return self._FetchAndBuild(url, build, parameters, post_data, url_post_process)
+    
+    key = (self._credentials[2], url, self._EncodeParameters(parameters))
+    def build_and_keep(data):
+      return data, build(data)
+    (data, result), shared = self._in_flight.Do(key, self._FetchAndBuild, url, build_and_keep, parameters, post_data, url_post_process)
+    if shared:
+      # Models can be changed by whoever holds them, so only the decoded
+      # JSON is shared
+      return build(data)
+    return result
+
+  def _FetchAndBuild(self, url, build, parameters, post_data, url_post_process=None):
+    stats = RequestStats()
+    try:
+      json = self._FetchUrl(url, post_data=post_data, parameters=parameters, url_post_process=url_post_process, stats=stats)
+      start = time.time()
+      data = simplejson.loads(json)
+      decoded = time.time()
+      stats.decode_time = decoded - start
+      result = build(data)
+      stats.build_time = time.time() - decoded
+      return result
+    except Exception, e:
+      stats.error = e
+      raise
+    finally:
+      self._ReportRequest(stats)
+
+  def _ReportRequest(self, stats):
+    self._metrics.Record(stats)
+    # Requests are reported from finally blocks, so a failing hook must
+    # not hide the request's own error, or keep the other hooks from 
+    # running.
+    failed = None
+    for hook in self._request_hooks:
+      try:
+        hook(stats)
+      except Exception:
+        failed = failed or sys.exc_info()
+    if failed and stats.error is None:
+      raise failed[0], failed[1], failed[2]
+
   def _FetchUrl(self,
                 url,
                 post_data=None,
                 parameters=None,
-                url_post_process=None):
+                url_post_process=None,
+                stream=False,
+                stats=None,
+                revalidate=False):
     '''Fetch a URL, optionally caching for a specified time.
 
     Args:
@@ -1600,10 +3716,44 @@ class Api(object):
         to the query string. [OPTIONAL]
       url_post_process:
         Function to post process the URL once it has been encoded. [OPTIONAL]
+      stream:
+        Set to True to return a file-like object to read the body from
+        instead of the whole body. [OPTIONAL]
+      stats:
+        A wufoo.RequestStats to record the request in. The caller then
+        reports it; otherwise the request is reported once fetched. 
+        [OPTIONAL]
+      revalidate:
+        Set to True to revalidate a cached response even if it is still
+        fresh. [OPTIONAL]
 
     Returns:
       A string containing the body of the response.
     '''
+    if stats is None:
+      stats = RequestStats()
+      try:
+        return self._FetchUrl(url, post_data=post_data, parameters=parameters, url_post_process=url_post_process, stream=stream, stats=stats, revalidate=revalidate)
+      except HTTPError, e:
+        # urllib2 before Python 2.6 raises for the 201 of a new entry
+        if e.code != 201:
+          stats.error = e
+        raise
+      except Exception, e:
+        stats.error = e
+        raise
+      finally:
+        self._ReportRequest(stats)
+    
+    def body(data):
+      if stream:
+        return StringIO.StringIO(data)
+      return data
+    
+    def revalidate_later():
+      self._FetchUrl(request_url, parameters=parameters, url_post_process=url_post_process, revalidate=True)
+    request_url = url
+    
     # Build the extra parameters dict
     extra_params = {}
     if self._default_params:
@@ -1614,8 +3764,11 @@ class Api(object):
     # Add key/value parameters to the query string of the url
     url = self._BuildUrl(url, extra_params=extra_params)
 
-    # Get a url opener that can handle basic auth
-    opener = self._GetOpener(url, username=self._apikey, password="foo")
+    # Everything the request depends on is read once, so settings 
+    # changed by other threads can't be half seen
+    apikey, authorization, identity = self._credentials
+    cache = self._cache
+    opener = self._GetOpener(self._RequestHeaders(authorization))
 
     encoded_post_data = self._EncodePostData(post_data)
     
@@ -1624,11 +3777,1681 @@ class Api(object):
     if url_post_process:
       url = url_post_process(url)
     
+    endpoint = _EndpointTemplate(url)
+    stats.endpoint = endpoint
+    stats.url = url
+    if post_data is not None:
+      stats.method = 'POST'
+    
+    # Only GET requests to endpoints with a timeout are cached
+    cache_key = cached = None
+    if cache and post_data is None:
+      cache_timeout = self._cache_timeouts.get(endpoint, 0)
+      if cache_timeout:
+        cache_key = '%s %s' % (identity, url)
+        cached = cache.Get(cache_key)
+    if cached and not revalidate:
+      age = time.time() - cached.timestamp
+      fresh = age < cache_timeout
+      if not fresh and age < cache_timeout + self._max_staleness.get(endpoint, 0):
+        # Serve it as it is while the server is asked whether it changed
+        self._RevalidateInBackground(cache_key, revalidate_later)
+        stats.stale = True
+      if fresh or stats.stale:
+        opener.close()
+        stats.cached = True
+        stats.bytes = len(cached.body)
+        return body(cached.body)
+    if cached:
+      # Stale, ask the server whether it changed
+      if cached.etag:
+        opener.addheaders.append(('If-None-Match', cached.etag))
+      if cached.last_modified:
+        opener.addheaders.append(('If-Modified-Since', cached.last_modified))
+    
     # Open and return the URL
-    url_data = opener.open(url, encoded_post_data).read()
+    start = time.time()
+    try:
+      response = self._OpenUrl(opener, url, encoded_post_data)
+    except HTTPError, e:
+      opener.close()
+      stats.network_time += time.time() - start
+      stats.status = e.code
+      if cached and e.code == 304:
+        cache.Set(cache_key, CachedResponse(cached.body, 
+                                            etag=cached.etag,
+                                            last_modified=cached.last_modified))
+        stats.cached = True
+        stats.bytes = len(cached.body)
+        return body(cached.body)
+      raise
+    stats.network_time += time.time() - start
+    stats.status = getattr(response, 'code', None)
+    info = getattr(response, 'info', None)
+    response = _MeteredFile(response, stats)
+    if stream and not cache_key:
+      opener.close()
+      return response
+    url_data = response.read()
     opener.close()
     
-    return url_data
+    if cache_key:
+      etag = last_modified = None
+      if info:
+        etag = info().getheader('ETag')
+        last_modified = info().getheader('Last-Modified')
+      cache.Set(cache_key, CachedResponse(url_data, 
+                                          etag=etag,
+                                          last_modified=last_modified))
+    
+    return body(url_data)
+    
+class MemoryCheckpoints(object):
+  '''Keeps the sync high-water mark of each form in memory.
+
+  Any object with the same Get and Set methods can be passed to 
+  wufoo.EntrySync instead, to keep the marks between runs. Objects 
+  without GetUpdatedAtMark and SetUpdatedAtMark work too; EntrySync
+  then keeps the entries updated at the mark itself, for as long as it
+  is kept.
+  '''
+
+  def __init__(self):
+    self._marks = {}
+    self._updated_at_mark = {}
+    self._lock = threading.Lock()
+
+  def Get(self, form_hash):
+    '''The (entry_id, date_updated) mark of a form, or None.'''
+    self._lock.acquire()
+    try:
+      return self._marks.get(form_hash)
+    finally:
+      self._lock.release()
+
+  def Set(self, form_hash, entry_id, date_updated):
+    '''Record the highest EntryId and DateUpdated seen for a form.'''
+    self._lock.acquire()
+    try:
+      self._marks[form_hash] = (entry_id, date_updated)
+    finally:
+      self._lock.release()
+
+  def GetUpdatedAtMark(self, form_hash):
+    '''The (date_updated, entry_ids) last recorded by SetUpdatedAtMark, or None.'''
+    self._lock.acquire()
+    try:
+      return self._updated_at_mark.get(form_hash)
+    finally:
+      self._lock.release()
+
+  def SetUpdatedAtMark(self, form_hash, date_updated, entry_ids):
+    '''Record the EntryIds handed out that were updated at date_updated.'''
+    self._lock.acquire()
+    try:
+      self._updated_at_mark[form_hash] = (date_updated, set(entry_ids))
+    finally:
+      self._lock.release()
+
+class EntrySync(object):
+  '''Fetches only the entries added or changed since the last sync.
+
+  The highest EntryId and DateUpdated seen are remembered per form, and
+  the next sync asks for entries past either mark, so each run costs in
+  proportion to what changed rather than to the size of the form. 
+  Dates only go to the second, so the entries updated in the mark's 
+  second are asked for again, and those already handed out skipped.
+
+    sync = wufoo.EntrySync(wf)
+    for entry in sync.SyncForm("m7x3p9"):
+      save(entry)
+  '''
+
+  def __init__(self, api, checkpoints=None):
+    '''Instantiate a new wufoo.EntrySync object.
+
+    Args:
+      api: The wufoo.Api to fetch entries with
+      checkpoints: 
+        Where the marks are kept, a wufoo.MemoryCheckpoints by default 
+        [optional]
+    '''
+    self._api = api
+    if checkpoints is None:
+      checkpoints = MemoryCheckpoints()
+    self._checkpoints = checkpoints
+    if not hasattr(checkpoints, 'GetUpdatedAtMark'):
+      self._updated_at_mark = MemoryCheckpoints()
+    else:
+      self._updated_at_mark = checkpoints
+
+  def GetCheckpoints(self):
+    return self._checkpoints
+
+  def SyncForm(self, form_hash, system=False, page_size=None):
+    '''Iterate over the entries added or updated since the last sync.
+
+    The EntryId mark moves forward as entries are consumed, so a sync
+    stopped half way resumes after the last entry handed out. The 
+    DateUpdated mark only moves once the sync completes; until then 
+    updated entries may be handed out again.
+
+    Args:
+      form_hash:
+        The form to sync
+      system:
+        Set to True to include system fields
+      page_size:
+        Number of entries fetched per request [optional]
+
+    Returns:
+      A generator of wufoo.Entry instances, in EntryId order
+    '''
+    entry_id, date_updated = self._Mark(form_hash)
+    filters = self._Filters(entry_id, date_updated)
+    seen = self._UpdatedAtMark(form_hash, date_updated)
+    last_updated = date_updated
+    at_last = set(seen)
+    for entry in self._api.IterEntriesForForm(form_hash, system=system, filters=filters, match='OR', sort_id='EntryId', sort_direction='ASC', page_size=page_size):
+      updated = entry._date_updated
+      if updated and updated == date_updated and entry.entry_id in seen:
+        # Handed out already, and not updated since
+        continue
+      yield entry
+      
+      if updated and updated > last_updated:
+        last_updated = updated
+        at_last = set()
+      if updated and updated == last_updated:
+        at_last.add(entry.entry_id)
+      if entry_id is None or int(entry.entry_id) > entry_id:
+        entry_id = int(entry.entry_id)
+        self._checkpoints.Set(form_hash, entry_id, date_updated)
+    
+    self._checkpoints.Set(form_hash, entry_id, last_updated)
+    self._updated_at_mark.SetUpdatedAtMark(form_hash, last_updated, at_last)
+
+  def CountChanges(self, form_hash):
+    '''The number of entries the next SyncForm of a form will hand out.
+
+    Costs one request for the count of the entries past either mark.
+    '''
+    entry_id, date_updated = self._Mark(form_hash)
+    filters = self._Filters(entry_id, date_updated)
+    count = self._api.GetFormEntryCount(form_hash, filters=filters, match='OR')
+    # The entries already handed out at the DateUpdated mark still match
+    seen = self._UpdatedAtMark(form_hash, date_updated)
+    return max(0, count - len(seen))
+
+  def _Mark(self, form_hash):
+    mark = self._checkpoints.Get(form_hash)
+    if mark:
+      return mark
+    return None, None
+
+  def _UpdatedAtMark(self, form_hash, date_updated):
+    # The EntryIds handed out that were updated at the DateUpdated mark
+    at_mark = self._updated_at_mark.GetUpdatedAtMark(form_hash)
+    if date_updated and at_mark and at_mark[0] == date_updated:
+      return at_mark[1]
+    return set()
+
+  def _Filters(self, entry_id, date_updated):
+    filters = []
+    if entry_id is not None:
+      filters.append(Filter('EntryId', 'is_greater_than', entry_id))
+    if date_updated:
+      # Entries updated later in the mark's second are not after it
+      filters.append(Filter('DateUpdated', 'is_after', _SecondBefore(date_updated)))
+    elif entry_id is not None:
+      # None of the entries seen so far had been updated
+      filters.append(Filter('DateUpdated', 'is_not_null'))
+    return filters
+
+class AsyncApi(object):
+  '''A non-blocking wufoo.Api.
+
+  Every method that talks to the Wufoo API takes the same arguments as 
+  on wufoo.Api but returns a wufoo.Future right away. The calls run on
+  a fixed number of threads, which limits how many requests are in
+  flight at once. Results are the same model classes wufoo.Api returns.
+
+    wf = wufoo.AsyncApi("subdomain", "XXXX-XXXX-XXXX-XXXX")
+    futures = [wf.GetEntriesForForm(hash) for hash in hashes]
+    entries = [f.Result() for f in futures]
+  '''
+  
+  _METHODS = ('GetFieldsForForm',
+              'GetFieldsForReport',
+              'GetFieldDecoder',
+              'GetForms',
+              'GetForm',
+              'GetReports',
+              'GetReport',
+              'GetFormEntryCount',
+              'GetReportEntryCount',
+              'GetEntriesForForm',
+              'GetEntriesForReport',
+              'GetUsers',
+              'GetWidgets',
+              'GetComments',
+              'GetCommentCount',
+              'GetCommentsByEntry',
+              'AttachComments',
+              'PostEntry',
+              'PutWebHook')
+
+  def __init__(self, subdomain, apikey, max_concurrency=8, **kwargs):
+    '''Instantiate a new wufoo.AsyncApi object.
+
+    Args:
+      subdomain: The subdomain of the Wufoo account
+      apikey: The API key of the Wufoo account. 
+      max_concurrency: Number of requests allowed in flight at once [optional]
+      Other keyword arguments are passed on to wufoo.Api
+    '''
+    self._api = Api(subdomain, apikey, **kwargs)
+    self._pool = _WorkerPool(max_concurrency)
+  
+  def GetApi(self):
+    '''The blocking wufoo.Api the calls are made with.
+    
+    Returns:
+      The wufoo.Api instance used by this wrapper
+    '''
+    return self._api
+  
+  def Close(self):
+    '''Stop the worker threads once the queued calls have finished.'''
+    self._pool.Close()
+
+def _AsyncMethod(name):
+  def method(self, *args, **kwargs):
+    return self._pool.Submit(getattr(self._api, name), *args, **kwargs)
+  method.__name__ = name
+  method.__doc__ = getattr(Api, name).__doc__
+  return method
+
+for _name in AsyncApi._METHODS:
+  setattr(AsyncApi, _name, _AsyncMethod(_name))
+    
+# ----------------------------------------
+#
+# Local storage
+#
+# ----------------------------------------
+
+def _ModelFromDict(cls, data):
+  # AsDict keys are the constructor's argument names
+  return cls(**dict([(str(k), v) for k, v in data.items()]))
+
+def _FieldFromDict(data):
+  field = _ModelFromDict(Field, data)
+  if field._subfields:
+    field._subfields = [_FieldFromDict(x) for x in field._subfields]
+  if field._choices:
+    field._choices = [_FieldFromDict(x) for x in field._choices]
+  return field
+
+def _EntryFromDict(data):
+  entry = _ModelFromDict(Entry, data)
+  if entry._fields:
+    entry._fields = dict([(_FIELD_KEYS.setdefault(k, k), v) 
+                          for k, v in entry._fields.items()])
+  return entry
+
+class EntryStore(object):
+  '''A local SQLite copy of forms, fields, entries and comments.
+
+  Records are stored as they come back from wufoo.Api and are handed 
+  back as the same model classes. The store also keeps the sync marks 
+  of each form, so it can be passed to wufoo.EntrySync as its 
+  checkpoints, and SyncForm resumes an interrupted export where it 
+  stopped.
+
+  A store must only be used from the thread that created it.
+
+    store = wufoo.EntryStore('wufoo.db')
+    store.SyncForm(wf, "m7x3p9")
+    for entry in store.GetEntries("m7x3p9"):
+      print entry.entry_id
+  '''
+
+  _SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS forms (
+      hash TEXT PRIMARY KEY,
+      data TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS fields (
+      form_hash TEXT NOT NULL,
+      position INTEGER NOT NULL,
+      data TEXT NOT NULL,
+      PRIMARY KEY (form_hash, position));
+    CREATE TABLE IF NOT EXISTS entries (
+      form_hash TEXT NOT NULL,
+      entry_id INTEGER NOT NULL,
+      data TEXT NOT NULL,
+      PRIMARY KEY (form_hash, entry_id));
+    CREATE TABLE IF NOT EXISTS comments (
+      form_hash TEXT NOT NULL,
+      comment_id INTEGER NOT NULL,
+      entry_id INTEGER,
+      data TEXT NOT NULL,
+      PRIMARY KEY (form_hash, comment_id));
+    CREATE INDEX IF NOT EXISTS comments_entry 
+      ON comments (form_hash, entry_id);
+    CREATE TABLE IF NOT EXISTS checkpoints (
+      form_hash TEXT PRIMARY KEY,
+      entry_id INTEGER,
+      date_updated TEXT);
+    CREATE TABLE IF NOT EXISTS updated_at_mark (
+      form_hash TEXT NOT NULL,
+      entry_id INTEGER NOT NULL,
+      date_updated TEXT NOT NULL,
+      PRIMARY KEY (form_hash, entry_id));
+  '''
+
+  def __init__(self, path=':memory:', commit_every=100):
+    '''Instantiate a new wufoo.EntryStore object.
+
+    Args:
+      path: The SQLite database file, in memory by default [optional]
+      commit_every: 
+        Number of entries SyncForm saves per transaction [optional]
+    '''
+    self._connection = sqlite3.connect(path)
+    self._connection.executescript(EntryStore._SCHEMA)
+    self._commit_every = commit_every
+
+  def Close(self):
+    '''Commit any pending changes and close the database.'''
+    self._connection.commit()
+    self._connection.close()
+
+  def Commit(self):
+    self._connection.commit()
+
+  def SaveForm(self, form):
+    self._connection.execute(
+      'INSERT OR REPLACE INTO forms (hash, data) VALUES (?, ?)',
+      (form.hash, form.AsJsonString()))
+
+  def SaveFields(self, form_hash, fields):
+    '''Replace the fields kept for a form.'''
+    self._connection.execute('DELETE FROM fields WHERE form_hash = ?', 
+                             (form_hash,))
+    self._connection.executemany(
+      'INSERT INTO fields (form_hash, position, data) VALUES (?, ?, ?)',
+      [(form_hash, i, f.AsJsonString()) for i, f in enumerate(fields)])
+
+  def SaveEntry(self, form_hash, entry):
+    self._connection.execute(
+      'INSERT OR REPLACE INTO entries (form_hash, entry_id, data) VALUES (?, ?, ?)',
+      (form_hash, int(entry.entry_id), entry.AsJsonString()))
+
+  def SaveComment(self, form_hash, comment):
+    entry_id = comment.entry_id
+    if entry_id is not None:
+      entry_id = int(entry_id)
+    self._connection.execute(
+      'INSERT OR REPLACE INTO comments (form_hash, comment_id, entry_id, data) VALUES (?, ?, ?, ?)',
+      (form_hash, int(comment.comment_id), entry_id, comment.AsJsonString()))
+
+  def GetForms(self):
+    cursor = self._connection.execute('SELECT data FROM forms ORDER BY hash')
+    return [_ModelFromDict(Form, simplejson.loads(x)) for (x,) in cursor]
+
+  def GetForm(self, hash):
+    '''The wufoo.Form kept for a hash, or None.'''
+    row = self._connection.execute('SELECT data FROM forms WHERE hash = ?',
+                                   (hash,)).fetchone()
+    if row is None:
+      return None
+    return _ModelFromDict(Form, simplejson.loads(row[0]))
+
+  def GetFields(self, form_hash):
+    cursor = self._connection.execute(
+      'SELECT data FROM fields WHERE form_hash = ? ORDER BY position',
+      (form_hash,))
+    return [_FieldFromDict(simplejson.loads(x)) for (x,) in cursor]
+
+  def GetEntry(self, form_hash, entry_id):
+    '''The wufoo.Entry kept for an EntryId, or None.'''
+    row = self._connection.execute(
+      'SELECT data FROM entries WHERE form_hash = ? AND entry_id = ?',
+      (form_hash, int(entry_id))).fetchone()
+    if row is None:
+      return None
+    return _EntryFromDict(simplejson.loads(row[0]))
+
+  def GetEntries(self, form_hash):
+    '''Iterate over the entries kept for a form, in EntryId order.
+
+    Returns:
+      A generator of wufoo.Entry instances
+    '''
+    cursor = self._connection.execute(
+      'SELECT data FROM entries WHERE form_hash = ? ORDER BY entry_id',
+      (form_hash,))
+    for (data,) in cursor:
+      yield _EntryFromDict(simplejson.loads(data))
+
+  def GetEntryCount(self, form_hash):
+    return self._connection.execute(
+      'SELECT COUNT(*) FROM entries WHERE form_hash = ?',
+      (form_hash,)).fetchone()[0]
+
+  def GetComments(self, form_hash, entry_id=None):
+    if entry_id is None:
+      cursor = self._connection.execute(
+        'SELECT data FROM comments WHERE form_hash = ? ORDER BY comment_id',
+        (form_hash,))
+    else:
+      cursor = self._connection.execute(
+        'SELECT data FROM comments WHERE form_hash = ? AND entry_id = ? ORDER BY comment_id',
+        (form_hash, int(entry_id)))
+    return [_ModelFromDict(Comment, simplejson.loads(x)) for (x,) in cursor]
+
+  def Get(self, form_hash):
+    '''The (entry_id, date_updated) sync mark of a form, or None.'''
+    return self._connection.execute(
+      'SELECT entry_id, date_updated FROM checkpoints WHERE form_hash = ?',
+      (form_hash,)).fetchone()
+
+  def Set(self, form_hash, entry_id, date_updated):
+    '''Record the sync mark of a form.
+
+    The mark is written in the same transaction as the entries saved 
+    before it, so the two always agree after a crash.
+    '''
+    self._connection.execute(
+      'INSERT OR REPLACE INTO checkpoints (form_hash, entry_id, date_updated) VALUES (?, ?, ?)',
+      (form_hash, entry_id, date_updated))
+
+  def GetUpdatedAtMark(self, form_hash):
+    '''The (date_updated, entry_ids) last recorded by SetUpdatedAtMark, or None.'''
+    rows = self._connection.execute(
+      'SELECT date_updated, entry_id FROM updated_at_mark WHERE form_hash = ?',
+      (form_hash,)).fetchall()
+    if not rows:
+      return None
+    return rows[0][0], set([str(entry_id) for date_updated, entry_id in rows])
+
+  def SetUpdatedAtMark(self, form_hash, date_updated, entry_ids):
+    '''Record the EntryIds handed out that were updated at date_updated.'''
+    self._connection.execute('DELETE FROM updated_at_mark WHERE form_hash = ?',
+                             (form_hash,))
+    self._connection.executemany(
+      'INSERT INTO updated_at_mark (form_hash, entry_id, date_updated) VALUES (?, ?, ?)',
+      [(form_hash, int(x), date_updated) for x in entry_ids])
+
+  def SyncForm(self, api, form_hash, system=False, page_size=None):
+    '''Bring the local copy of a form up to date.
+
+    The form, its fields and every entry added or updated since the 
+    last sync are fetched and saved. Entries are committed in batches
+    along with the sync mark, so an interrupted sync resumes from the 
+    last batch.
+
+    Args:
+      api: The wufoo.Api to fetch with
+      form_hash: The form to sync
+      system: Set to True to include system fields
+      page_size: Number of entries fetched per request [optional]
+
+    Returns:
+      The number of entries saved
+    '''
+    self.SaveForm(api.GetForm(form_hash))
+    self.SaveFields(form_hash, api.GetFieldsForForm(form_hash, system=system))
+    self.Commit()
+
+    count = 0
+    sync = EntrySync(api, checkpoints=self)
+    for entry in sync.SyncForm(form_hash, system=system, page_size=page_size):
+      self.SaveEntry(form_hash, entry)
+      count += 1
+      # The mark only covers an entry once the next one is asked for, 
+      # so after a crash the last entry of a batch is fetched again.
+      # Saving it twice is harmless.
+      if count % self._commit_every == 0:
+        self.Commit()
+    self.Commit()
+    return count
+
+# ----------------------------------------
+#
+# Local queries
+#
+# ----------------------------------------
+
+# Entry attributes of the system fields, by field ID
+_SYSTEM_ATTRIBUTES = dict([(v, k) for k, v in Entry._JSON_KEYS.items()])
+
+def _FilterText(value):
+  # Text comparisons ignore case, as Wufoo's do
+  if value is None:
+    return u''
+  if not isinstance(value, basestring):
+    value = str(value)
+  return value.lower()
+
+def _FilterNumber(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return None
+
+def _FilterDate(value):
+  if not value:
+    return None
+  try:
+    if len(value) == 8 and value.isdigit():
+      return datetime.datetime(int(value[:4]), int(value[4:6]), int(value[6:]))
+    return _ParseDate(value)
+  except (TypeError, ValueError, OverflowError):
+    return None
+
+class EntryIndex(object):
+  '''Answers wufoo.Filter queries from entries kept in memory.
+
+  Filters and match work as they do for GetEntriesForForm, so repeated
+  queries over synced entries need no API calls. Each field is indexed
+  on first use and its indexes are kept until the entries change:
+
+  * a hash index of the distinct values, for is_equal_to, 
+    is_not_equal_to and is_not_null
+  * a sorted index of the distinct values, for begins_with and for
+    comparing text with is_less_than and is_greater_than
+  * sorted indexes of the numeric and the date values, for 
+    is_less_than and is_greater_than on numbers and for is_on, 
+    is_before and is_after
+
+  contains, does_not_contain and ends_with test each distinct value
+  once rather than each entry. Text comparisons ignore case.
+  '''
+
+  def __init__(self, entries=None):
+    '''Instantiate a new wufoo.EntryIndex object.
+
+    Args:
+      entries: An iterable of wufoo.Entry instances to index [optional]
+    '''
+    self._entries = {}
+    self._indexes = {}
+    self._lock = threading.Lock()
+    if entries is not None:
+      self.Extend(entries)
+
+  def __len__(self):
+    return len(self._entries)
+
+  def Add(self, entry):
+    '''Add an entry, replacing the one with the same EntryId.'''
+    self._lock.acquire()
+    try:
+      self._entries[entry.entry_id] = entry
+      self._indexes.clear()
+    finally:
+      self._lock.release()
+
+  def Extend(self, entries):
+    '''Add entries, replacing those with the same EntryIds.
+
+    Returns:
+      The number of entries added
+    '''
+    count = 0
+    self._lock.acquire()
+    try:
+      for entry in entries:
+        self._entries[entry.entry_id] = entry
+        count += 1
+      self._indexes.clear()
+    finally:
+      self._lock.release()
+    return count
+
+  def Remove(self, entry_id):
+    '''Remove the entry with an EntryId, if there is one.'''
+    self._lock.acquire()
+    try:
+      if self._entries.pop(str(entry_id), None) is not None:
+        self._indexes.clear()
+    finally:
+      self._lock.release()
+
+  def GetEntry(self, entry_id):
+    '''The wufoo.Entry with an EntryId, or None.'''
+    return self._entries.get(str(entry_id))
+
+  def Query(self, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
+    '''The entries that match filters, as GetEntriesForForm returns them.
+
+    Args:
+      filters: A wufoo.Filter or a list of them [optional]
+      match: 'AND' or 'OR', how to combine filters [optional]
+      sort_id: 
+        The field to sort by. Entries are in EntryId order otherwise.
+        [optional]
+      sort_direction: 'ASC' or 'DESC' [optional]
+      page_start: Number of matching entries to skip [optional]
+      page_size: Largest number of entries to return [optional]
+
+    Returns:
+      A list of wufoo.Entry instances
+    '''
+    self._lock.acquire()
+    try:
+      entries = [self._entries[x] for x in self._MatchAll(filters, match)]
+      if sort_id:
+        entries.sort(key=self._SortKey(sort_id),
+                     reverse=(sort_direction == 'DESC'))
+      else:
+        entries.sort(key=lambda entry: _FilterNumber(entry.entry_id))
+    finally:
+      self._lock.release()
+    start = page_start or 0
+    if page_size:
+      return entries[start:start + page_size]
+    return entries[start:]
+
+  def Count(self, filters=None, match='AND'):
+    '''The number of entries that match filters, see Query.'''
+    self._lock.acquire()
+    try:
+      return len(self._MatchAll(filters, match))
+    finally:
+      self._lock.release()
+
+  def _MatchAll(self, filters, match):
+    if filters is None:
+      return set(self._entries)
+    if isinstance(filters, Filter):
+      filters = [filters]
+    matches = [self._Match(f) for f in filters]
+    if not matches:
+      return set(self._entries)
+    if match == 'OR':
+      result = set()
+      for ids in matches:
+        result |= ids
+      return result
+    matches.sort(key=len)
+    result = set(matches[0])
+    for ids in matches[1:]:
+      result &= ids
+    return result
+
+  def _Match(self, filter):
+    field, op = filter.field_id, filter.operator
+    text = _FilterText(filter.value)
+    if op not in ('is_on', 'is_before', 'is_after', 'is_less_than', 'is_greater_than'):
+      postings = self._Index(field, 'postings')
+
+    if op == 'is_not_null':
+      return set(self._entries) - postings.get(u'', set())
+    if op == 'is_equal_to':
+      return set(postings.get(text, ()))
+    if op == 'is_not_equal_to':
+      return set(self._entries) - postings.get(text, set())
+    if op == 'begins_with':
+      values = self._Index(field, 'values')
+      return self._Union(postings, 
+                         itertools.takewhile(lambda v: v.startswith(text), 
+                                             values[bisect.bisect_left(values, text):]))
+    if op == 'contains':
+      return self._Union(postings, [v for v in postings if text in v])
+    if op == 'does_not_contain':
+      return self._Union(postings, [v for v in postings if text not in v])
+    if op == 'ends_with':
+      return self._Union(postings, [v for v in postings if v.endswith(text)])
+
+    if op in ('is_less_than', 'is_greater_than'):
+      number = _FilterNumber(filter.value)
+      if number is None:
+        postings = self._Index(field, 'postings')
+        # Compare as text, leaving out empty values
+        values = self._Index(field, 'values')
+        if op == 'is_less_than':
+          return self._Union(postings, values[bisect.bisect_right(values, u''):bisect.bisect_left(values, text)])
+        return self._Union(postings, values[bisect.bisect_right(values, text):])
+      keys, ids = self._Index(field, 'numbers')
+      if op == 'is_less_than':
+        return set(ids[:bisect.bisect_left(keys, number)])
+      return set(ids[bisect.bisect_right(keys, number):])
+
+    date = _FilterDate(filter.value)
+    if date is None:
+      raise ValueError('Not a date: %r' % (filter.value,))
+    keys, ids = self._Index(field, 'dates')
+    if op == 'is_before':
+      return set(ids[:bisect.bisect_left(keys, date)])
+    if op == 'is_after':
+      return set(ids[bisect.bisect_right(keys, date):])
+    day = datetime.datetime(date.year, date.month, date.day)
+    return set(ids[bisect.bisect_left(keys, day):
+                   bisect.bisect_left(keys, day + datetime.timedelta(1))])
+
+  def _Union(self, postings, values):
+    result = set()
+    for value in values:
+      result |= postings[value]
+    return result
+
+  def _Getter(self, field):
+    # A function that reads a field of an entry
+    if field in _SYSTEM_ATTRIBUTES:
+      return operator.attrgetter(_SYSTEM_ATTRIBUTES[field])
+    return lambda entry: (entry._fields or {}).get(field)
+
+  def _SortKey(self, field):
+    # Numbers sort before text
+    get = self._Getter(field)
+    def key(entry):
+      value = get(entry)
+      number = _FilterNumber(value)
+      if number is None:
+        return (1, _FilterText(value))
+      return (0, number)
+    return key
+
+  def _Index(self, field, kind):
+    index = self._indexes.get((field, kind))
+    if index is not None:
+      return index
+    
+    get = self._Getter(field)
+    if kind == 'postings':
+      index = {}
+      for id, entry in self._entries.iteritems():
+        index.setdefault(_FilterText(get(entry)), set()).add(id)
+    elif kind == 'values':
+      index = sorted(self._Index(field, 'postings'))
+    else:
+      parse = {'numbers': _FilterNumber, 'dates': _FilterDate}[kind]
+      # Each distinct value is only parsed once
+      parsed = {}
+      pairs = []
+      for id, entry in self._entries.iteritems():
+        value = get(entry)
+        if value not in parsed:
+          parsed[value] = parse(value)
+        if parsed[value] is not None:
+          pairs.append((parsed[value], id))
+      pairs.sort()
+      index = ([k for k, id in pairs], [id for k, id in pairs])
+    self._indexes[(field, kind)] = index
+    return index
+
+_WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+_SEARCH_PATTERN = re.compile(r'"([^"]*)"|(\S+)', re.UNICODE)
+
+def _Words(value):
+  # Lower case words, with byte strings read as UTF-8
+  if value is None:
+    return []
+  if isinstance(value, str):
+    value = value.decode('utf-8', 'replace')
+  elif not isinstance(value, unicode):
+    value = unicode(value)
+  return _WORD_PATTERN.findall(value.lower())
+
+class TextIndex(object):
+  '''Full-text search over entry field values and comments.
+
+  Field values and comment text are split into lower case words, and
+  each word keeps a posting list of the entries it occurs in along with
+  its positions there, so phrases are found without reading the text 
+  again. Adding or removing an entry or a comment only reindexes that
+  entry.
+
+  Queries are words and double quoted phrases, all of which must occur
+  in an entry. OR between them makes either side enough, and binds more
+  loosely than the implicit AND:
+
+    refund "credit card" OR chargeback
+  '''
+
+  def __init__(self, entries=None, comments=None):
+    '''Instantiate a new wufoo.TextIndex object.
+
+    Args:
+      entries: An iterable of wufoo.Entry instances to index [optional]
+      comments: An iterable of wufoo.Comment instances to index [optional]
+    '''
+    self._fields = {}
+    self._comments = {}
+    self._words = {}
+    self._postings = {}
+    self._lock = threading.Lock()
+    if entries is not None:
+      self.Extend(entries)
+    if comments is not None:
+      self.ExtendComments(comments)
+
+  def __len__(self):
+    return len(self._words)
+
+  def Add(self, entry):
+    '''Index the field values of an entry, replacing those indexed before.'''
+    self.Extend([entry])
+
+  def Extend(self, entries):
+    '''Index the field values of entries, see Add.
+
+    Returns:
+      The number of entries indexed
+    '''
+    count = 0
+    self._lock.acquire()
+    try:
+      changed = set()
+      for entry in entries:
+        fields = entry.fields or {}
+        self._fields[str(entry.entry_id)] = [fields[k] for k in sorted(fields)]
+        changed.add(str(entry.entry_id))
+        count += 1
+      for entry_id in changed:
+        self._Reindex(entry_id)
+    finally:
+      self._lock.release()
+    return count
+
+  def AddComment(self, comment):
+    '''Index a comment on an entry, replacing one with the same CommentId.'''
+    self.ExtendComments([comment])
+
+  def ExtendComments(self, comments):
+    '''Index comments, see AddComment.
+
+    Returns:
+      The number of comments indexed
+    '''
+    count = 0
+    self._lock.acquire()
+    try:
+      changed = set()
+      for comment in comments:
+        entry_id = str(comment.entry_id)
+        self._comments.setdefault(entry_id, {})[str(comment.comment_id)] = comment.text
+        changed.add(entry_id)
+        count += 1
+      for entry_id in changed:
+        self._Reindex(entry_id)
+    finally:
+      self._lock.release()
+    return count
+
+  def Remove(self, entry_id):
+    '''Remove an entry and its comments, if they are indexed.'''
+    self._lock.acquire()
+    try:
+      entry_id = str(entry_id)
+      self._fields.pop(entry_id, None)
+      self._comments.pop(entry_id, None)
+      self._Reindex(entry_id)
+    finally:
+      self._lock.release()
+
+  def RemoveComment(self, entry_id, comment_id):
+    '''Remove a comment on an entry, if it is indexed.'''
+    self._lock.acquire()
+    try:
+      entry_id = str(entry_id)
+      comments = self._comments.get(entry_id, {})
+      if comments.pop(str(comment_id), None) is not None:
+        if not comments:
+          del self._comments[entry_id]
+        self._Reindex(entry_id)
+    finally:
+      self._lock.release()
+
+  def Search(self, query, match='AND'):
+    '''The EntryIds of entries whose fields or comments match a query.
+
+    Args:
+      query: Words, "phrases" and OR, as described above
+      match: 
+        'AND' or 'OR', how to combine words and phrases not separated
+        by OR [optional]
+
+    Returns:
+      A list of EntryIds, in EntryId order
+    '''
+    groups = [[]]
+    for phrase, word in _SEARCH_PATTERN.findall(query):
+      if word == 'OR':
+        groups.append([])
+        continue
+      # A word like e-mail is read as a phrase of its parts
+      words = _Words(phrase or word)
+      if words:
+        groups[-1].append(words)
+    if match == 'OR':
+      groups = [[words] for group in groups for words in group]
+
+    self._lock.acquire()
+    try:
+      result = set()
+      for group in groups:
+        if not group:
+          continue
+        matches = [self._Phrase(words) for words in group]
+        matches.sort(key=len)
+        ids = matches[0]
+        for other in matches[1:]:
+          ids &= other
+        result |= ids
+    finally:
+      self._lock.release()
+    return sorted(result, key=_FilterNumber)
+
+  def _Phrase(self, words):
+    postings = [self._postings.get(word) for word in words]
+    if None in postings:
+      return set()
+    ids = set(min(postings, key=len))
+    for other in postings:
+      ids.intersection_update(other)
+    if len(words) == 1:
+      return ids
+    
+    result = set()
+    for entry_id in ids:
+      # Positions the phrase could start at, narrowed word by word
+      starts = set(postings[0][entry_id])
+      for offset in range(1, len(words)):
+        starts.intersection_update([p - offset for p in postings[offset][entry_id]])
+        if not starts:
+          break
+      if starts:
+        result.add(entry_id)
+    return result
+
+  def _Reindex(self, entry_id):
+    for word in self._words.pop(entry_id, ()):
+      postings = self._postings[word]
+      del postings[entry_id]
+      if not postings:
+        del self._postings[word]
+
+    comments = self._comments.get(entry_id, {})
+    texts = self._fields.get(entry_id, []) + [comments[k] for k in sorted(comments, key=_FilterNumber)]
+    words = set()
+    position = 0
+    for text in texts:
+      for word in _Words(text):
+        self._postings.setdefault(word, {}).setdefault(entry_id, []).append(position)
+        words.add(word)
+        position += 1
+      # Phrases don't run from one field or comment into the next
+      position += 1
+    if words:
+      self._words[entry_id] = words
+
+class QueryPlan(object):
+  '''How a wufoo.QueryPlanner answered an entry query.
+
+  Attributes:
+    hash: The form or report queried
+    strategy: 
+      'local' when answered from a fresh local copy, 'delta' when the
+      entries changed since the last sync were fetched first, or 
+      'server' when the query was sent to Wufoo
+    reason: Why the strategy was picked
+    age: Seconds since the local copy was synced, or None
+    delta_requests: Estimated requests to bring the local copy up to date
+    server_requests: Estimated requests to page through the matches on Wufoo
+  '''
+
+  LOCAL = 'local'
+  DELTA = 'delta'
+  SERVER = 'server'
+
+  def __init__(self, hash, strategy, reason, age=None):
+    self.hash = hash
+    self.strategy = strategy
+    self.reason = reason
+    self.age = age
+    self.delta_requests = None
+    self.server_requests = None
+
+  def __str__(self):
+    return '%s %s: %s' % (self.hash, self.strategy, self.reason)
+
+class QueryPlanner(object):
+  '''Answers entry queries from a local copy of a form or from Wufoo,
+  whichever costs fewer requests.
+
+  Forms are copied locally with Track. While a copy is younger than
+  max_age, queries on the form are answered from it. Once it is older,
+  the planner compares the pages of entries added or updated since the
+  last sync with the pages of the query's matches on Wufoo, estimating
+  those from how many local entries match. It then either syncs the 
+  delta and answers locally, or sends the query to Wufoo. Queries on 
+  untracked forms and on reports always go to Wufoo.
+
+  Entries deleted on Wufoo stay in the local copy until the form is
+  tracked again.
+
+  A planner can be shared between threads, unless it keeps its copies
+  in a wufoo.EntryStore: a store must only be used from the thread 
+  that created it, and so must its planner.
+  '''
+
+  def __init__(self, api, store=None, max_age=300):
+    '''Instantiate a new wufoo.QueryPlanner object.
+
+    Args:
+      api: The wufoo.Api to query and sync with
+      store: 
+        A wufoo.EntryStore to keep local copies in across runs, or
+        None to keep them in memory only. The planner is then bound to
+        the store's thread. [optional]
+      max_age: 
+        Seconds a local copy answers queries without syncing [optional]
+    '''
+    self._api = api
+    self._store = store
+    self._max_age = max_age
+    self._checkpoints = store or MemoryCheckpoints()
+    self._indexes = {}
+    self._synced = {}
+    self._sync_locks = {}
+    self._plan_hooks = []
+    # Guards the dicts above. Requests are made without it, so a slow 
+    # sync of one form doesn't hold up queries on the others.
+    self._lock = threading.Lock()
+    self._clock = time.time
+
+  def AddPlanHook(self, hook):
+    '''Call a function with the wufoo.QueryPlan of every query.'''
+    self._plan_hooks.append(hook)
+
+  def RemovePlanHook(self, hook):
+    self._plan_hooks.remove(hook)
+
+  def Track(self, form_hash):
+    '''Start keeping a local copy of a form, and sync it.
+
+    Entries already in the store are loaded, so only what changed since
+    the store was last synced is fetched.
+
+    Returns:
+      The number of entries fetched
+    '''
+    sync_lock = self._SyncLock(form_hash)
+    sync_lock.acquire()
+    try:
+      index = EntryIndex()
+      if self._store:
+        index.Extend(self._store.GetEntries(form_hash))
+      else:
+        # Nothing was kept, so sync from the first entry
+        self._checkpoints.Set(form_hash, None, None)
+      return self._Sync(form_hash, index, track=True)
+    finally:
+      sync_lock.release()
+
+  def Untrack(self, form_hash):
+    '''Stop answering queries on a form locally.'''
+    self._lock.acquire()
+    try:
+      self._indexes.pop(form_hash, None)
+      self._synced.pop(form_hash, None)
+    finally:
+      self._lock.release()
+
+  def Explain(self, form_hash, filters=None, match='AND', page_start=None, page_size=None):
+    '''The wufoo.QueryPlan GetEntriesForForm would follow now.
+
+    Finding the size of a stale copy's delta takes one request for the
+    count of the entries added or updated since the last sync.
+    '''
+    plan, index, synced = self._Plan(form_hash, filters, match, page_start, page_size)
+    return plan
+
+  def GetEntriesForForm(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
+    '''Fetch a form's entries, locally or from Wufoo.
+
+    Takes the same arguments as wufoo.Api.GetEntriesForForm. Local
+    copies are synced with system fields, so they answer either way.
+
+    Returns:
+      A list of wufoo.Entry instances
+    '''
+    plan, index, synced = self._Plan(hash, filters, match, page_start, page_size)
+    if plan.strategy == QueryPlan.DELTA:
+      sync_lock = self._SyncLock(hash)
+      sync_lock.acquire()
+      try:
+        # Unless another query synced the copy while this one waited
+        if self._Synced(hash, index) == synced:
+          self._Sync(hash, index)
+      finally:
+        sync_lock.release()
+
+    if plan.strategy == QueryPlan.SERVER:
+      entries = self._api.GetEntriesForForm(hash, system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
+    else:
+      entries = index.Query(filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
+    self._ReportPlan(plan)
+    return entries
+
+  def GetEntriesForReport(self, hash, system=False, filters=None, match='AND', sort_id=None, sort_direction='DESC', page_start=None, page_size=None):
+    '''Fetch a report's entries from Wufoo.
+
+    Reports apply filters of their own that are only known to Wufoo, so
+    they are never answered locally.
+    '''
+    entries = self._api.GetEntriesForReport(hash, system=system, filters=filters, match=match, sort_id=sort_id, sort_direction=sort_direction, page_start=page_start, page_size=page_size)
+    self._ReportPlan(QueryPlan(hash, QueryPlan.SERVER, 'reports are not kept locally'))
+    return entries
+
+  def _Plan(self, form_hash, filters, match, page_start, page_size):
+    # Returns the plan, and the local copy it was made for and when 
+    # that was synced
+    self._lock.acquire()
+    try:
+      index = self._indexes.get(form_hash)
+      synced = self._synced.get(form_hash)
+    finally:
+      self._lock.release()
+    if index is None:
+      return QueryPlan(form_hash, QueryPlan.SERVER, 'the form is not tracked'), None, None
+    
+    age = self._clock() - synced
+    if age <= self._max_age:
+      return QueryPlan(form_hash, QueryPlan.LOCAL, 'the local copy is fresh', age), index, synced
+
+    # Entries are paged 100 at a time either way, and even an empty
+    # answer costs a request
+    pages = lambda count: max(1, int(math.ceil(count / float(Api._MAX_PAGE_SIZE))))
+    delta = EntrySync(self._api, checkpoints=self._checkpoints).CountChanges(form_hash)
+    local = len(index)
+    # Updated entries are already kept, so this overestimates the total
+    total = local + delta
+    if local:
+      matches = total * index.Count(filters, match) / float(local)
+    else:
+      matches = total
+    matches = max(0, matches - (page_start or 0))
+    if page_size:
+      matches = min(matches, page_size)
+
+    plan = QueryPlan(form_hash, QueryPlan.DELTA, 'the delta is smaller than the matches', age)
+    plan.delta_requests = pages(delta)
+    plan.server_requests = pages(matches)
+    if plan.server_requests < plan.delta_requests:
+      plan.strategy = QueryPlan.SERVER
+      plan.reason = 'the matches are smaller than the delta'
+    return plan, index, synced
+
+  def _SyncLock(self, form_hash):
+    # Only one sync of a form runs at a time
+    self._lock.acquire()
+    try:
+      return self._sync_locks.setdefault(form_hash, threading.Lock())
+    finally:
+      self._lock.release()
+
+  def _Synced(self, form_hash, index):
+    # When the copy was last synced, or None if it was replaced
+    self._lock.acquire()
+    try:
+      if self._indexes.get(form_hash) is not index:
+        return None
+      return self._synced.get(form_hash)
+    finally:
+      self._lock.release()
+
+  def _Sync(self, form_hash, index, track=False):
+    # Called holding the form's sync lock. A copy untracked during the 
+    # sync stays untracked.
+    sync = EntrySync(self._api, checkpoints=self._checkpoints)
+    synced = self._clock()
+    # Fetched before the index is extended, as the index is locked 
+    # while it is and other queries count on it
+    entries = list(sync.SyncForm(form_hash, system=True))
+    if self._store:
+      for entry in entries:
+        self._store.SaveEntry(form_hash, entry)
+      self._store.Commit()
+    count = index.Extend(entries)
+    self._lock.acquire()
+    try:
+      if track or self._indexes.get(form_hash) is index:
+        self._indexes[form_hash] = index
+        self._synced[form_hash] = synced
+    finally:
+      self._lock.release()
+    return count
+
+  def _ReportPlan(self, plan):
+    for hook in self._plan_hooks:
+      hook(plan)
+
+# ----------------------------------------
+#
+# Columnar tables
+#
+# ----------------------------------------
+
+_NAN = float('nan')
+
+# Column types of form fields, by Field.type. Other fields are text.
+_FIELD_COLUMN_TYPES = {'number': 'number',
+                       'money': 'number',
+                       'rating': 'number',
+                       'date': 'date'}
+
+_COMPARISONS = {'==': operator.eq,
+                '!=': operator.ne,
+                '<': operator.lt,
+                '<=': operator.le,
+                '>': operator.gt,
+                '>=': operator.ge}
+
+def _NumberValue(value):
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return _NAN
+
+def _DateValue(value):
+  # Seconds since the epoch. Date fields come back as YYYYMMDD and 
+  # system dates as YYYY-MM-DD HH:MM:SS.
+  if not value:
+    return _NAN
+  try:
+    if len(value) == 8 and value.isdigit():
+      date = datetime.datetime(int(value[:4]), int(value[4:6]), int(value[6:]))
+    else:
+      date = _ParseDate(value)
+  except (TypeError, ValueError, OverflowError):
+    return _NAN
+  return float(calendar.timegm(date.utctimetuple()))
+
+def _FromSeconds(seconds):
+  if seconds != seconds:
+    return None
+  return datetime.datetime.utcfromtimestamp(seconds)
+
+class EntryTable(object):
+  '''Entries kept column by column, for filtering and aggregating many 
+  entries without an Entry object per row.
+
+  Every system field and FieldN value is a column. Number and date 
+  columns are arrays of floats, with dates as seconds since the epoch, 
+  and empty values are NaN. Text columns are lists of strings. When 
+  NumPy is installed, columns are handed out as NumPy arrays and 
+  filtering and aggregation run on them; otherwise they run over the
+  array.array and list columns.
+  '''
+
+  # The system columns and their types
+  SYSTEM_COLUMNS = (('EntryId', 'number'),
+                    ('DateCreated', 'date'),
+                    ('CreatedBy', 'text'),
+                    ('DateUpdated', 'date'),
+                    ('UpdatedBy', 'text'))
+
+  # The NumPy module, or None to use the array.array and list columns
+  _numpy = numpy
+
+  def __init__(self, entries=None, fields=None, types=None):
+    '''Instantiate a new wufoo.EntryTable object.
+
+    Args:
+      entries:
+        An iterable of wufoo.Entry instances, such as a page from 
+        GetEntriesForForm or the IterEntriesForForm iterator [optional]
+      fields:
+        The form's wufoo.Field list from GetFieldsForForm, which types
+        the columns of number and date fields [optional]
+      types:
+        A dict of column names to 'number', 'date' or 'text', for 
+        columns fields does not cover [optional]
+    '''
+    self._types = {}
+    self._names = []
+    self._columns = {}
+    self._arrays = {}
+    self._count = 0
     
+    self._declared = {}
+    for field in fields or []:
+      for subfield in field.subfields or [field]:
+        if subfield.id and subfield.id.startswith('Field'):
+          self._declared[subfield.id] = _FIELD_COLUMN_TYPES.get(field.type, 'text')
+    self._declared.update(types or {})
+
+    for name, type in EntryTable.SYSTEM_COLUMNS:
+      self._AddColumn(name, type)
+    for field in fields or []:
+      for subfield in field.subfields or [field]:
+        if subfield.id in self._declared and subfield.id not in self._types:
+          self._AddColumn(subfield.id, self._declared[subfield.id])
+    if entries is not None:
+      self.Extend(entries)
+
+  def __len__(self):
+    return self._count
+
+  def Extend(self, entries):
+    '''Add entries as rows.
+
+    Args:
+      entries: An iterable of wufoo.Entry instances
+
+    Returns:
+      The number of rows added
+    '''
+    self._arrays.clear()
+    columns = self._columns
+    types = self._types
+    system = len(EntryTable.SYSTEM_COLUMNS)
+    # Dates repeat a lot, so each distinct string is only parsed once
+    dates = {}
+    added = 0
+    for entry in entries:
+      fields = entry.fields or {}
+      for name in fields:
+        if name not in types:
+          self._AddColumn(name, self._declared.get(name, 'text'))
+      
+      values = [entry._entry_id, entry._date_created, entry._created_by,
+                entry._date_updated, entry._updated_by]
+      values.extend([fields.get(name) for name in self._names[system:]])
+      for name, value in zip(self._names, values):
+        type = types[name]
+        if type == 'number':
+          columns[name].append(_NumberValue(value))
+        elif type == 'date':
+          if value not in dates:
+            dates[value] = _DateValue(value)
+          columns[name].append(dates[value])
+        else:
+          columns[name].append(value or '')
+      self._count += 1
+      added += 1
+    return added
+
+  def GetColumnNames(self):
+    '''The names of the columns, system columns first.'''
+    return list(self._names)
+
+  def GetColumnType(self, name):
+    '''The type of a column, 'number', 'date' or 'text'.'''
+    return self._types[name]
+
+  def GetColumn(self, name):
+    '''The values of a column.
+
+    The values must not be changed.
+
+    Args:
+      name: The column, such as 'EntryId' or 'Field1'
+
+    Returns:
+      A NumPy array when NumPy is installed, and otherwise an 
+      array.array of floats for number and date columns or a list of
+      strings for text columns
+    '''
+    if not self._numpy:
+      return self._columns[name]
+    if name not in self._arrays:
+      column = self._columns[name]
+      if self._types[name] == 'text':
+        self._arrays[name] = self._numpy.array(column, dtype=object)
+      elif column:
+        self._arrays[name] = self._numpy.frombuffer(column, dtype=float).copy()
+      else:
+        self._arrays[name] = self._numpy.zeros(0)
+    return self._arrays[name]
+
+  def GetRow(self, index):
+    '''A dict of the values of a row.
+
+    Numbers are floats, dates are datetimes and empty numbers and dates
+    are None.
+    '''
+    row = {}
+    for name in self._names:
+      value = self._columns[name][index]
+      if self._types[name] == 'date':
+        value = _FromSeconds(value)
+      elif self._types[name] == 'number' and value != value:
+        value = None
+      row[name] = value
+    return row
+
+  def IterRows(self):
+    '''Iterate over the rows, as returned by GetRow.'''
+    for index in xrange(self._count):
+      yield self.GetRow(index)
+
+  def Where(self, name, op, value):
+    '''The rows where a column compares to a value.
+
+    Empty numbers and dates only match '!='.
+
+    Args:
+      name: The column to compare
+      op: 
+        One of '==', '!=', '<', '<=', '>', '>=', or 'in' to match any
+        of a collection of values
+      value: 
+        The value to compare with. Dates may be given as datetimes,
+        dates or strings.
+
+    Returns:
+      A new wufoo.EntryTable of the matching rows
+    '''
+    type = self._types[name]
+    if op == 'in':
+      value = set([self._ColumnValue(type, x) for x in value])
+    elif op in _COMPARISONS:
+      compare = _COMPARISONS[op]
+      value = self._ColumnValue(type, value)
+    else:
+      raise ValueError('Operator must be one of the following: ' + 
+                       ', '.join(sorted(_COMPARISONS.keys()) + ['in']))
+
+    if self._numpy:
+      column = self.GetColumn(name)
+      if op == 'in' and type == 'text':
+        mask = self._numpy.array([x in value for x in column], dtype=bool)
+      elif op == 'in':
+        mask = self._numpy.in1d(column, list(value))
+      else:
+        errors = self._numpy.seterr(invalid='ignore')
+        try:
+          mask = compare(column, value)
+        finally:
+          self._numpy.seterr(**errors)
+      return self._Take(self._numpy.flatnonzero(mask))
+
+    column = self._columns[name]
+    if op == 'in':
+      return self._Take([i for i, x in enumerate(column) if x in value])
+    return self._Take([i for i, x in enumerate(column) if compare(x, value)])
+
+  def Aggregate(self, name, func):
+    '''Aggregate the values of a column, skipping empty values.
+
+    Args:
+      name: The column to aggregate
+      func: 
+        One of 'count', 'sum', 'mean', 'min' or 'max'. Date columns 
+        can't be summed and text columns only support 'count', 'min' 
+        and 'max'.
+
+    Returns:
+      The aggregate, as a datetime for the mean, min or max of a date
+      column, or None when there are no values to average, min or max
+    '''
+    return self._Reduce(name, self._Present(name, None), func)
+
+  def GroupBy(self, key, name=None, func='count', bucket=None):
+    '''Aggregate a column for each distinct value of another.
+
+    Args:
+      key: The column to group by. Rows with no value are grouped under None.
+      name: The column to aggregate, or None to count rows [optional]
+      func: The aggregate, as for Aggregate [optional]
+      bucket:
+        'day' or 'month' to group a date column by day or month, with
+        datetime.date keys, rather than by exact time [optional]
+
+    Returns:
+      A dict of key values to aggregates
+    '''
+    groups = self._Groups(self._GroupKeys(key, bucket))
+    result = {}
+    for group, indices in groups:
+      if name is None:
+        result[group] = len(indices)
+      else:
+        result[group] = self._Reduce(name, self._Present(name, indices), func)
+    return result
+
+  def _AddColumn(self, name, type):
+    self._types[name] = type
+    self._names.append(name)
+    if type == 'text':
+      self._columns[name] = [''] * self._count
+    else:
+      self._columns[name] = array.array('d', [_NAN]) * self._count
+
+  def _ColumnValue(self, type, value):
+    # A value to compare with as it is kept in a column
+    if type == 'date' and isinstance(value, datetime.date):
+      return float(calendar.timegm(value.timetuple()))
+    if type == 'date':
+      return _DateValue(value)
+    if type == 'number':
+      return _NumberValue(value)
+    return value
+
+  def _Take(self, indices):
+    table = EntryTable()
+    table._numpy = self._numpy
+    table._types = dict(self._types)
+    table._names = list(self._names)
+    table._declared = self._declared
+    table._count = len(indices)
+    for name in self._names:
+      if self._numpy:
+        values = self.GetColumn(name)[indices]
+        table._arrays[name] = values
+        if self._types[name] == 'text':
+          table._columns[name] = list(values)
+        else:
+          table._columns[name] = array.array('d', values.tostring())
+      else:
+        column = self._columns[name]
+        values = [column[i] for i in indices]
+        if self._types[name] == 'text':
+          table._columns[name] = values
+        else:
+          table._columns[name] = array.array('d', values)
+    return table
+
+  def _Present(self, name, indices):
+    # The non-empty values of a column, at indices if given
+    type = self._types[name]
+    if self._numpy:
+      values = self.GetColumn(name)
+      if indices is not None:
+        values = values[indices]
+      if type == 'text':
+        return values[values != '']
+      return values[~self._numpy.isnan(values)]
+    column = self._columns[name]
+    if indices is None:
+      values = column
+    else:
+      values = [column[i] for i in indices]
+    if type == 'text':
+      return [x for x in values if x != '']
+    return [x for x in values if x == x]
+
+  def _Reduce(self, name, values, func):
+    type = self._types[name]
+    if func == 'count':
+      return len(values)
+    if (func not in ('sum', 'mean', 'min', 'max') or 
+        (type == 'text' and func in ('sum', 'mean')) or
+        (type == 'date' and func == 'sum')):
+      raise ValueError("Can't take the %s of a %s column" % (func, type))
+    if self._numpy and type != 'text':
+      total, smallest, largest = self._numpy.sum, self._numpy.min, self._numpy.max
+    else:
+      total, smallest, largest = sum, min, max
+    if func == 'sum':
+      return float(total(values))
+    if not len(values):
+      return None
+    if func == 'mean':
+      result = float(total(values)) / len(values)
+    elif func == 'min':
+      result = smallest(values)
+    else:
+      result = largest(values)
+    if type == 'date':
+      return _FromSeconds(result)
+    if type == 'number':
+      return float(result)
+    return result
+
+  def _GroupKeys(self, key, bucket):
+    type = self._types[key]
+    column = self._columns[key]
+    if type == 'text':
+      return [x or None for x in column]
+    if bucket not in (None, 'day', 'month') or (bucket and type != 'date'):
+      raise ValueError('Only date columns can be bucketed, by day or month')
+    keys = []
+    converted = {}
+    for value in column:
+      if value != value:
+        keys.append(None)
+        continue
+      if value not in converted:
+        if type == 'number':
+          converted[value] = value
+        elif bucket == 'day':
+          converted[value] = _FromSeconds(value).date()
+        elif bucket == 'month':
+          converted[value] = _FromSeconds(value).date().replace(day=1)
+        else:
+          converted[value] = _FromSeconds(value)
+      keys.append(converted[value])
+    return keys
+
+  def _Groups(self, keys):
+    # A list of (key, indices) pairs
+    codes = {}
+    groups = []
+    if not self._numpy:
+      for index, key in enumerate(keys):
+        if key not in codes:
+          codes[key] = len(groups)
+          groups.append((key, []))
+        groups[codes[key]][1].append(index)
+      return groups
+
+    # Sort the rows by group and split them where the group changes
+    np = self._numpy
+    numbered = np.array([codes.setdefault(k, len(codes)) for k in keys], dtype=int)
+    order = np.argsort(numbered, kind='mergesort')
+    splits = np.flatnonzero(np.diff(numbered[order])) + 1
+    names = dict([(code, key) for key, code in codes.items()])
+    for indices in np.split(order, splits):
+      if len(indices):
+        groups.append((names[numbered[indices[0]]], indices))
+    return groups
+
 if __name__ == "__main__":
   pass
\ No newline at end of file